@@ -0,0 +1,51 @@
+"""Per-request crew setup overhead: building PoemCrew/NewsCrew from scratch vs taking one from the pool.
+
+No LLM calls are made; only crew construction is timed. Run from the bakasura_flow folder:
+    python benchmarks/crew_setup_benchmark.py --requests 50
+"""
+import argparse
+import statistics
+import time
+
+from bakasura_flow.crews.crew_pool import CrewPool
+from bakasura_flow.crews.news_crew.news_crew import NewsCrew
+from bakasura_flow.crews.poem_crew.poem_crew import PoemCrew
+
+
+def timed(fn, n: int) -> list[float]:
+    latencies = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label: str, latencies: list[float]):
+    print(f"{label:<28} mean={statistics.mean(latencies) * 1000:8.2f}ms "
+          f"p50={statistics.median(latencies) * 1000:8.2f}ms max={max(latencies) * 1000:8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    for crew_class in (PoemCrew, NewsCrew):
+        name = crew_class.__name__
+        # Before: what every request used to do
+        report(f"{name} new per request", timed(lambda: crew_class(language="en", theme="cats").crew(), args.requests))
+
+        # After: checkout/checkin from a warm pool
+        pool = CrewPool(crew_class, size=4)
+        pool.warm()
+
+        def checkout():
+            with pool.acquire():
+                pass
+
+        report(f"{name} pooled", timed(checkout, args.requests))
+
+
+if __name__ == "__main__":
+    main()
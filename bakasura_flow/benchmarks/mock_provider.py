@@ -0,0 +1,130 @@
+"""OpenAI-style mock provider that enforces request and token limits, for exercising client-side throttling.
+
+POST /v1/chat/completions answers after --latency seconds with a canned completion
+and x-ratelimit-{limit,remaining,reset}-{requests,tokens} headers. Both budgets are
+token buckets refilled continuously over a minute; a request that does not fit gets
+a 429 with Retry-After and, like OpenAI, still uses up one request (down to one
+minute of debt; --free-rejections turns that off). Tokens are estimated like the
+client does: prompt characters / 4 plus max_tokens. Run standalone with:
+    python benchmarks/mock_provider.py --port 8090 --rpm 120 --tpm 60000
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Bucket:
+    def __init__(self, per_minute: float):
+        self.limit = per_minute
+        self.rate = per_minute / 60
+        self.remaining = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.remaining = min(self.limit, self.remaining + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (min(amount, self.limit) - self.remaining) / self.rate)
+
+    def reset_seconds(self) -> float:
+        return (self.limit - self.remaining) / self.rate
+
+
+class MockProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rpm: float, tpm: float, latency: float, charge_rejections: bool = True):
+        super().__init__(address, MockHandler)
+        self.charge_rejections = charge_rejections
+        self.requests = Bucket(rpm)
+        self.tokens = Bucket(tpm)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+
+    def admit(self, tokens: int) -> tuple[bool, dict]:
+        with self.lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.seconds_until(1), self.tokens.seconds_until(tokens))
+            admitted = wait == 0
+            if admitted:
+                self.requests.remaining -= 1
+                self.tokens.remaining -= min(tokens, self.tokens.limit)
+                self.served += 1
+            else:
+                self.rejected += 1
+                if self.charge_rejections:
+                    self.requests.remaining = max(-self.requests.limit, self.requests.remaining - 1)
+                    wait = max(self.requests.seconds_until(1), self.tokens.seconds_until(tokens))
+            headers = {
+                "x-ratelimit-limit-requests": str(int(self.requests.limit)),
+                "x-ratelimit-remaining-requests": str(max(0, int(self.requests.remaining))),
+                "x-ratelimit-reset-requests": f"{self.requests.reset_seconds():.3f}s",
+                "x-ratelimit-limit-tokens": str(int(self.tokens.limit)),
+                "x-ratelimit-remaining-tokens": str(max(0, int(self.tokens.remaining))),
+                "x-ratelimit-reset-tokens": f"{self.tokens.reset_seconds():.3f}s",
+            }
+            if not admitted:
+                headers["retry-after"] = f"{wait:.3f}"
+            return admitted, headers
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: MockProvider
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        admitted, headers = self.server.admit(len(prompt) // 4 + body.get("max_tokens", 0))
+        if admitted:
+            time.sleep(self.server.latency)
+            status, payload = 200, {
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": '["What is a mock?"]'},
+                             "finish_reason": "stop"}],
+            }
+        else:
+            status, payload = 429, {"error": {"type": "rate_limit_exceeded", "message": "Rate limit reached"}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int = 0, rpm: float = 120, tpm: float = 60000, latency: float = 0.05,
+          charge_rejections: bool = True) -> MockProvider:
+    """Start a mock provider on a background thread; port 0 picks a free port."""
+    server = MockProvider(("127.0.0.1", port), rpm, tpm, latency, charge_rejections)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--rpm", type=float, default=120)
+    parser.add_argument("--tpm", type=float, default=60000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--free-rejections", action="store_true", help="429s do not use up requests")
+    args = parser.parse_args()
+    server = MockProvider(("127.0.0.1", args.port), args.rpm, args.tpm, args.latency, not args.free_rejections)
+    print(f"Mock provider on http://127.0.0.1:{args.port}/v1 ({args.rpm:g} rpm, {args.tpm:g} tpm)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
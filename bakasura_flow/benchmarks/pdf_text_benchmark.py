@@ -0,0 +1,102 @@
+"""Text normalization and PDF layout throughput of PDFConversionTool on 10k+ line documents.
+
+Compares the old per-line clean_text and one multi_cell per line against whole-document
+normalization and one multi_cell per paragraph. Layout uses the core Helvetica font so
+no TTF file is needed. Run from the bakasura_flow folder:
+    python benchmarks/pdf_text_benchmark.py --lines 10000 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import fpdf
+
+from bakasura_flow.tools.txt_PDF_tool import LINE_HEIGHT, PARAGRAPH_GAP, PDFConversionTool, write_paragraphs
+
+WORDS = ("moon river quiet longing morning light whispers of the tide markets rally "
+         "council votes storm season harvest").split()
+
+
+def make_document(lines: int, seed: int = 0, messy: bool = True) -> str:
+    """Paragraphs of 3-8 lines with stray spacing and, when messy, mojibake apostrophes and non-breaking spaces."""
+    rng = random.Random(seed)
+    out = []
+    while len(out) < lines:
+        for _ in range(rng.randint(3, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(6, 14))]
+            if messy:
+                words[rng.randrange(len(words))] += rng.choice(["â€™s", "\u00a0", "  ", "?"])
+            out.append("  " + " ".join(words) + " ")
+        out.append("")
+    return "\n".join(out[:lines]) + "\n"
+
+
+def clean_text_legacy(text: str) -> str:
+    replacements = {
+        'â€™': "'",
+        '?': "'",
+        '\u00A0': ' '
+    }
+    for old, new in replacements.items():
+        text = text.replace(old, new)
+    text = text.strip()
+    text = ' '.join(text.split())
+    return text
+
+
+def new_pdf() -> fpdf.FPDF:
+    pdf = fpdf.FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Helvetica", size=10)
+    pdf.set_left_margin(10)
+    pdf.set_right_margin(10)
+    pdf.set_top_margin(10)
+    return pdf
+
+
+def layout_legacy(text: str, output_file: str):
+    pdf = new_pdf()
+    for line in text.splitlines():
+        clean_line = clean_text_legacy(line).encode("latin-1", "replace").decode("latin-1")
+        pdf.multi_cell(190, LINE_HEIGHT, txt=clean_line, align='L')
+        if clean_line.strip() == "":
+            pdf.ln(PARAGRAPH_GAP)
+    pdf.output(output_file)
+
+
+def layout_batched(tool: PDFConversionTool, text: str, output_file: str):
+    pdf = new_pdf()
+    write_paragraphs(pdf, tool.clean_text(text).encode("latin-1", "replace").decode("latin-1"))
+    pdf.output(output_file)
+
+
+def timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 50000])
+    args = parser.parse_args()
+
+    tool = PDFConversionTool("", "")
+    print(f"{'lines':>7} {'text':>5}  {'clean (per line)':>17} {'clean (document)':>17}  {'layout (per line)':>18} {'layout (paragraph)':>19}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for lines in args.lines:
+            for messy in (False, True):
+                text = make_document(lines, messy=messy)
+                clean_old = timed(lambda: [clean_text_legacy(line) for line in text.splitlines()])
+                clean_new = timed(tool.clean_text, text)
+                layout_old = timed(layout_legacy, text, os.path.join(tmp, "legacy.pdf"))
+                layout_new = timed(layout_batched, tool, text, os.path.join(tmp, "batched.pdf"))
+                print(f"{lines:>7} {'messy' if messy else 'plain':>5}  {lines / clean_old:>11.0f} l/s "
+                      f"{lines / clean_new:>11.0f} l/s  {lines / layout_old:>12.0f} l/s {lines / layout_new:>13.0f} l/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Throughput against a rate-limited provider: blind retries vs the shared client-side rate limiter.
+
+Starts benchmarks/mock_provider.py in-process, then runs --workers processes with
+--concurrency callers each, like a scaled-out gateway, for --seconds per mode:
+
+- blind: send, and on a 429 sleep 1s and retry up to twice (the old _get_model_response)
+- limited: ProviderRateLimiter.acquire() before each call and observe() after it,
+  with the state shared between the processes through one SQLite file
+
+Run from the bakasura_flow folder:
+    python benchmarks/rate_limit_benchmark.py --workers 4 --concurrency 8 --rpm 120
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from mock_provider import serve
+
+PROMPT = "Generate 5 alternative questions about the Sicilian Dragon. " * 20
+MAX_TOKENS = 1000
+
+
+def post(url: str) -> tuple[int, dict]:
+    body = json.dumps({"model": "gpt-4o-mini", "max_tokens": MAX_TOKENS,
+                       "messages": [{"role": "user", "content": PROMPT}]}).encode()
+    request = urllib.request.Request(url, body, {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            return response.status, dict(response.headers)
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers)
+
+
+async def blind_caller(url: str, deadline: float, counts: dict):
+    while time.monotonic() < deadline:
+        for attempt in range(3):
+            status, _ = await asyncio.to_thread(post, url)
+            counts["attempts"] += 1
+            if status != 429:
+                counts["completed"] += 1
+                break
+            counts["rate_limited"] += 1
+            if attempt < 2:
+                await asyncio.sleep(1)
+        else:
+            counts["failed"] += 1
+
+
+async def limited_caller(url: str, deadline: float, counts: dict, limiter):
+    from bakasura_flow.rate_limits import estimate_tokens
+    tokens = estimate_tokens(PROMPT, MAX_TOKENS)
+    while time.monotonic() < deadline:
+        for attempt in range(6):
+            try:
+                # Callers still queued at the deadline are left pending, not counted as failures
+                await asyncio.wait_for(limiter.acquire("openai", "benchmark-key", tokens), deadline - time.monotonic())
+            except (TimeoutError, ValueError):
+                return
+            status, headers = await asyncio.to_thread(post, url)
+            await asyncio.to_thread(limiter.observe, "openai", "benchmark-key", headers, status)
+            counts["attempts"] += 1
+            if status != 429:
+                counts["completed"] += 1
+                break
+            counts["rate_limited"] += 1
+        else:
+            counts["failed"] += 1
+
+
+def worker(mode: str, url: str, concurrency: int, seconds: float, db_path: str, results):
+    counts = {"attempts": 0, "completed": 0, "rate_limited": 0, "failed": 0}
+    deadline = time.monotonic() + seconds
+
+    async def run():
+        if mode == "blind":
+            callers = [blind_caller(url, deadline, counts) for _ in range(concurrency)]
+        else:
+            from bakasura_flow.rate_limits import ProviderRateLimiter
+            limiter = ProviderRateLimiter(path=db_path, max_wait=seconds + 60)
+            callers = [limited_caller(url, deadline, counts, limiter) for _ in range(concurrency)]
+        await asyncio.gather(*callers)
+
+    asyncio.run(run())
+    results.put(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers per worker")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--rpm", type=float, default=120)
+    parser.add_argument("--tpm", type=float, default=200000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--free-rejections", action="store_true", help="429s do not use up provider requests")
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.concurrency} callers, provider limit {args.rpm:g} rpm / {args.tpm:g} tpm")
+    print(f"{'mode':>8}  {'completed/s':>11} {'429s':>6} {'failed':>7} {'attempts':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("blind", "limited"):
+            server = serve(rpm=args.rpm, tpm=args.tpm, latency=args.latency, charge_rejections=not args.free_rejections)
+            url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+            results = multiprocessing.Queue()
+            processes = [
+                multiprocessing.Process(target=worker, args=(mode, url, args.concurrency, args.seconds,
+                                                             os.path.join(tmp, f"{mode}.db"), results))
+                for _ in range(args.workers)
+            ]
+            start = time.monotonic()
+            for process in processes:
+                process.start()
+            totals = {"attempts": 0, "completed": 0, "rate_limited": 0, "failed": 0}
+            for _ in processes:
+                for key, value in results.get().items():
+                    totals[key] += value
+            for process in processes:
+                process.join()
+            elapsed = time.monotonic() - start
+            server.shutdown()
+            print(f"{mode:>8}  {totals['completed'] / elapsed:>11.2f} {totals['rate_limited']:>6} "
+                  f"{totals['failed']:>7} {totals['attempts']:>9}")
+
+
+if __name__ == "__main__":
+    main()
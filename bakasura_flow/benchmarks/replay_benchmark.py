@@ -0,0 +1,155 @@
+"""End-to-end latency of /decompose and /generate-poem with recorded LLM responses instead of live calls.
+
+Record fixtures once against the real providers (needs network and API keys), then
+replay them on any machine: every provider and crew call is answered from the
+fixture file, so what is measured is the pipeline around the LLM (prompt building,
+parsing, validation, storage, PDF rendering) plus, with --speed 1, the recorded
+LLM latency. Inputs are seeded, so a replay asks exactly what was recorded.
+With --check the run also compares every /decompose response with the output saved
+when the fixtures were recorded (fixtures/expected_outputs.json) and fails on any
+difference, so a change to prompt building, parsing or cleaning that alters a result
+is caught offline. Fixtures for /decompose are committed; the poem crews' prompts come
+from crewai, so record those yourself before replaying them (poems are timed, not checked).
+The loop watchdog runs throughout; with --fail-on-block the run fails if any
+callback held the event loop longer than --block-ms, which guards against new
+blocking calls. Run from the bakasura_flow folder:
+    python benchmarks/replay_benchmark.py --speed 0 --rounds 1 --check
+    python benchmarks/replay_benchmark.py --record --model gpt-4-turbo --pipelines decompose poem
+    python benchmarks/replay_benchmark.py --speed 0 --rounds 20 --pipelines decompose poem
+    python benchmarks/replay_benchmark.py --speed 0 --fail-on-block --block-ms 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+QUERIES = [
+    "sicilian dragon",
+    "Explain the Queen's Gambit Declined",
+    "How do I play against the London System?",
+]
+POEMS = [("en", "moon"), ("en", None), ("fr", "sea")]
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def report(label: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    print(f"{label:<16} n={len(latencies):<4} mean={statistics.mean(latencies) * 1000:9.2f}ms "
+          f"p50={statistics.median(latencies) * 1000:9.2f}ms "
+          f"p95={latencies[int(0.95 * (len(latencies) - 1))] * 1000:9.2f}ms")
+
+
+def load_expected(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(expected: dict, outputs: dict) -> list[str]:
+    """One line per output that is missing from `expected` or differs from it."""
+    problems = []
+    for pipeline, results in outputs.items():
+        for name, output in results.items():
+            wanted = expected.get(pipeline, {}).get(name)
+            if wanted is None:
+                problems.append(f"{pipeline} {name!r}: no expected output recorded")
+            elif wanted != output:
+                problems.append(f"{pipeline} {name!r}:\n  expected {json.dumps(wanted)}\n  got      {json.dumps(output)}")
+    return problems
+
+
+async def run(args) -> tuple[dict[str, list[float]], dict, dict]:
+    # Imported after the environment is set: settings are read at import time
+    from bakasura_flow.llm_replay import llm_recorder
+    from bakasura_flow.loop_watchdog import loop_watchdog
+    from service.fastapi.query_decomposition import DecompositionRequest, LLMConfig, decompose_query
+    if "poem" in args.pipelines:
+        # Loads crewai; /decompose runs without it
+        from bakasura_flow.main import PoemRequest, generate_poem
+
+    loop_watchdog.threshold_ms = args.block_ms
+    loop_watchdog.start()
+    latencies: dict[str, list[float]] = {}
+    # Pipeline -> input -> what the endpoint returned, from the first round
+    outputs: dict[str, dict] = {}
+    for round_number in range(args.rounds):
+        if "decompose" in args.pipelines:
+            for query in QUERIES:
+                request = DecompositionRequest(query=query, config=LLMConfig(model=args.model, temperature=0.0))
+                start = time.perf_counter()
+                response = await decompose_query(request)
+                latencies.setdefault("decompose", []).append(time.perf_counter() - start)
+                outputs.setdefault("decompose", {}).setdefault(
+                    query, [q.model_dump() for q in response.decomposed_questions])
+        if "poem" in args.pipelines:
+            # Same seed, same sentence counts: the crews' prompts match the recorded ones
+            random.seed(args.seed)
+            for language, theme in POEMS:
+                start = time.perf_counter()
+                await generate_poem(PoemRequest(language=language, theme=theme, format="pdf"))
+                latencies.setdefault("poem (pdf)", []).append(time.perf_counter() - start)
+        if args.record:
+            break
+    print(llm_recorder.stats())
+    loop_watchdog.stop()
+    return latencies, loop_watchdog.stats(), outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--record", action="store_true", help="Call the providers and write fixtures")
+    parser.add_argument("--fixtures", default=os.path.join(FIXTURES, "llm_fixtures.jsonl.gz"))
+    parser.add_argument("--expected", default=os.path.join(FIXTURES, "expected_outputs.json"),
+                        help="Outputs the replayed pipelines must return; written by --record")
+    parser.add_argument("--check", action="store_true", help="Exit non-zero if an output differs from --expected")
+    parser.add_argument("--update-expected", action="store_true",
+                        help="Save this run's outputs to --expected, after an intended change")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replayed latency factor; 0 answers at once")
+    parser.add_argument("--model", default="gpt-4-turbo", help="Model for /decompose")
+    parser.add_argument("--pipelines", nargs="+", default=["decompose"], choices=["decompose", "poem"])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--block-ms", type=float, default=200, help="Longest a callback may hold the event loop")
+    parser.add_argument("--fail-on-block", action="store_true", help="Exit non-zero if the event loop was blocked")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["POEM_LLM_REPLAY_MODE"] = "record" if args.record else "replay"
+        os.environ["POEM_LLM_FIXTURES"] = os.path.abspath(args.fixtures)
+        os.environ["POEM_LLM_REPLAY_SPEED"] = str(args.speed)
+        os.environ["POEM_OUTPUT_DIR"] = tmp
+        latencies, loop, outputs = asyncio.run(run(args))
+    for label, values in latencies.items():
+        report(label, values)
+    print(f"\nevent loop lag p50={loop['lag_ms']['p50']}ms p99={loop['lag_ms']['p99']}ms max={loop['lag_ms']['max']}ms, "
+          f"{loop['blocks']} blocks over {args.block_ms:.0f}ms")
+    for site in loop["sites"]:
+        print(f"  {site['blocks']:>4}x up to {site['max_ms']:>7.1f}ms  {site['site']}")
+    failed = args.fail_on_block and loop["blocks"]
+    expected = load_expected(args.expected)
+    if args.record or args.update_expected:
+        for pipeline, results in outputs.items():
+            expected.setdefault(pipeline, {}).update(results)
+        with open(args.expected, "w", encoding="utf-8") as f:
+            json.dump(expected, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nSaved the outputs to {args.expected}")
+    elif args.check:
+        problems = compare(expected, outputs)
+        for problem in problems:
+            print(f"MISMATCH {problem}")
+        checked = sum(map(len, outputs.values()))
+        print(f"\n{checked - len(problems)}/{checked} outputs match {args.expected}")
+        failed = failed or bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Hit rate and lookup latency of the semantic decomposition cache.
+
+Fills the cache with --entries synthetic queries plus a handful of chess questions,
+then looks up rephrasings of those questions (should hit), unrelated openings and
+near-misses that ask something else about the same topic (should miss) and random
+queries, comparing the LSH index with an exact scan of
+every cached vector. Run from the bakasura_flow folder:
+    python benchmarks/semantic_cache_benchmark.py --entries 1000 10000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from bakasura_flow.semantic_cache import SemanticCache
+
+CACHED = [
+    "sicilian dragon",
+    "Explain the Queen's Gambit Declined",
+    "What is the Ruy Lopez Berlin defense?",
+    "How do I play against the London System?",
+    "Caro-Kann advance variation plans",
+]
+REPHRASED = [
+    "Dragon variation of the Sicilian",
+    "What is the sicilian dragon?",
+    "queens gambit declined explained",
+    "Berlin defence in the Ruy Lopez",
+    "london system how to play against",
+    "Caro Kann advance variation",
+]
+UNRELATED = ["French defense winawer", "Sicilian najdorf", "King's Indian Attack", "Scandinavian defense"]
+# Close in wording to a cached query but asking something else: another question word,
+# a negation, a swapped topic word
+NEAR_MISSES = [
+    ("What is the London System", "Who is the London System for"),
+    ("Explain the Ruy Lopez Berlin defence endgame", "Explain the Ruy Lopez Berlin defence middlegame"),
+    ("Should I play the Sicilian?", "Should I not play the Sicilian?"),
+]
+
+
+def synthetic_queries(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(4, 9))) for _ in range(3000)]
+    return [" ".join(rng.sample(vocab, 6)) for _ in range(count)]
+
+
+def exact_best(cache: SemanticCache, query: str) -> float:
+    vector = cache.vectorize([query])[0]
+    return float(cache.index.score(np.fromiter(cache._entries, dtype=np.int64), vector).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--threshold", type=float, default=0.8)
+    args = parser.parse_args()
+
+    print(f"{'entries':>8}  {'rephrased hits':>14} {'unrelated hits':>14} {'near-miss hits':>14}  {'recall vs exact':>15}  "
+          f"{'lsh lookup':>10} {'exact lookup':>12}")
+    for entries in args.entries:
+        cache = SemanticCache(threshold=args.threshold, max_entries=entries + len(CACHED) + len(NEAR_MISSES))
+        queries = synthetic_queries(entries)
+        cached = CACHED + [cached for cached, _ in NEAR_MISSES]
+        for query in queries + cached:
+            cache.put(query, query)
+        rephrased = sum(cache.get(query) is not None for query in REPHRASED)
+        unrelated = sum(cache.get(query) is not None for query in UNRELATED)
+        near_misses = sum(cache.get(probe) is not None for _, probe in NEAR_MISSES)
+
+        # Near-duplicates of cached synthetic queries: one word left out (a swapped word is a
+        # different question and is rejected by same_question())
+        rng = random.Random(1)
+        probes = [" ".join(word for i, word in enumerate(query.split()) if i != skip)
+                  for query, skip in ((query, rng.randrange(6)) for query in rng.sample(queries, 500))]
+        start = time.perf_counter()
+        found = sum(cache.get(probe) is not None for probe in probes)
+        lsh = (time.perf_counter() - start) / len(probes)
+        start = time.perf_counter()
+        expected = sum(exact_best(cache, probe) >= args.threshold for probe in probes)
+        exact = (time.perf_counter() - start) / len(probes)
+        print(f"{entries:>8}  {rephrased:>6}/{len(REPHRASED):<7} {unrelated:>6}/{len(UNRELATED):<7} "
+              f"{near_misses:>6}/{len(NEAR_MISSES):<7}  "
+              f"{found / max(expected, 1):>15.1%}  {lsh * 1000:>7.2f} ms {exact * 1000:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,56 @@ class Settings(BaseSettings):
     min_sentences: int = 1
     max_sentences: int = 5
     default_language: str = "en"
+    crew_pool_size: int = 4
+    output_retention_days: float = 90
+    output_max_items: int = 1_000_000  # per kind
+    news_fanout_angles: int = 4
+    news_fanout_concurrency: int = 4
+    news_plan_angles: bool = True  # one LLM call picks topic-specific angles; off uses generic ones
+    poem_cache_enabled: bool = False
+    poem_cache_variants: int = 3
+    poem_cache_ttl_seconds: int = 3600
+    poem_cache_sampling: str = "round_robin"  # or "random"
+    poem_cache_consume: bool = False  # serve each variant once, then regenerate
+    poem_cache_max_keys: int = 256  # (language, theme) keys kept, least recently used evicted
+    gateway_blocking_workers: int = 32  # threads for blocking crew kickoffs in the gateway
+    college_essay_src: str | None = None  # defaults to ../college_essay/src/college_essay
+    llm_max_concurrency: int = 8  # LLM calls in flight per process, across every service
+    llm_queue_timeout: float = 300  # seconds a call may wait for a slot
+    tenant_rate_per_minute: float = 60  # LLM calls per tenant, refilled continuously
+    tenant_burst: int = 20
+    scheduler_interactive_weight: float = 4  # fair-queuing share of interactive vs batch work
+    scheduler_batch_weight: float = 1
+    tenant_api_keys: dict[str, str] = {}  # API key -> tenant, sent as "Authorization: Bearer <key>" or X-API-Key
+    trusted_proxies: list[str] = []  # client addresses whose X-Tenant-ID and X-Forwarded-For are believed
+    tenant_max_priority: dict[str, str] = {}  # highest priority class a tenant may ask for
+    default_max_priority: str = "interactive"  # for tenants not listed in tenant_max_priority
+    rate_limit_db: str | None = None  # shared by all workers; defaults to <output_dir>/rate_limits.db
+    rate_limit_max_wait: float = 120  # seconds a call may wait for provider budget
+    rate_limit_max_retries: int = 5  # 429s retried after their Retry-After, on top of error retries
+    llm_replay_mode: str = "off"  # "record" LLM calls to fixtures, or "replay" them offline
+    llm_fixtures: str | None = None  # defaults to <output_dir>/llm_fixtures.jsonl.gz
+    llm_replay_speed: float = 1.0  # 1 replays recorded latencies, 0 answers at once
+    tracing_enabled: bool = True  # spans for requests, flows, crews, tools and rendering
+    trace_exporters: str = ""  # comma-separated: "json" (to trace_json_path), "otlp" (to trace_otlp_endpoint)
+    trace_json_path: str | None = None  # defaults to <output_dir>/traces.jsonl
+    trace_otlp_endpoint: str = "http://localhost:4318/v1/traces"  # OTLP/HTTP JSON collector
+    trace_buffer_traces: int = 200  # recent traces kept per process for /traces/slow
+    trace_service_name: str = "bakasura"
+    debug_endpoints_enabled: bool = False  # mount /debug/profiler, /debug/profiles and /debug/loop
+    debug_token: str | None = None  # admin token the /debug endpoints require, as X-Debug-Token
+    profiler_enabled: bool = False  # sample stacks of in-flight requests; switchable at /debug/profiler
+    profiler_threshold_ms: float = 1000  # requests slower than this keep their profile
+    profiler_interval_ms: float = 10  # sampling interval
+    profiler_buffer_size: int = 50  # slow-request profiles kept per process
+    profiler_max_in_flight: int = 64  # requests sampled at once; the rest are not profiled
+    loop_watchdog_enabled: bool = True  # measure event-loop lag and log what blocks the loop
+    loop_watchdog_interval_ms: float = 50  # heartbeat interval; lag is measured once per beat
+    loop_watchdog_threshold_ms: float = 200  # a callback holding the loop longer than this is logged with its stack
+    decompose_cache_enabled: bool = False  # reuse decompositions of near-duplicate queries
+    decompose_cache_threshold: float = 0.8  # cosine similarity needed for a hit
+    decompose_cache_max_entries: int = 10000
+    decompose_cache_embedder: str = "ngram"  # or a sentence-transformers model, e.g. "all-MiniLM-L6-v2"
     
     class Config:
         env_prefix = "POEM_"
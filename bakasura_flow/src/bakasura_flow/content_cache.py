@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Hashable
+
+logger = getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class ContentCache:
+    """
+    Keeps a few pre-generated variants per key and serves them without calling the LLM.
+
+    Variants are handed out round-robin or at random. When a key that has been
+    asked for more than once has fewer live variants than configured (because
+    entries expired, or were consumed in `consume` mode) a background task asks
+    `producer` for more; a one-off key is never refilled. At most `max_keys` keys
+    are kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        producer: Callable[[Hashable], Awaitable[Any]],
+        variants: int = 3,
+        ttl_seconds: float = 3600,
+        sampling: str = "round_robin",
+        consume: bool = False,
+        max_concurrent_refills: int = 2,
+        max_keys: int = 256,
+    ):
+        if sampling not in ("round_robin", "random"):
+            raise ValueError("sampling must be 'round_robin' or 'random'")
+        self.producer = producer
+        self.variants = variants
+        self.ttl_seconds = ttl_seconds
+        self.sampling = sampling
+        self.consume = consume
+        self.max_keys = max_keys
+        self._entries: OrderedDict[Hashable, list[CacheEntry]] = OrderedDict()
+        self._cursor: dict[Hashable, int] = {}
+        # Requests per recently asked key, bounded like the entries
+        self._requests: OrderedDict[Hashable, int] = OrderedDict()
+        self._refilling: dict[Hashable, asyncio.Task] = {}
+        self._refill_slots = asyncio.Semaphore(max_concurrent_refills)
+        self.hits = 0
+        self.misses = 0
+
+    def _live(self, key: Hashable) -> list[CacheEntry]:
+        """Unexpired variants of key; keys without any are dropped rather than stored empty."""
+        if key not in self._entries:
+            return []
+        cutoff = time.monotonic() - self.ttl_seconds
+        entries = [e for e in self._entries[key] if e.created_at >= cutoff]
+        if entries:
+            self._entries[key] = entries
+            self._entries.move_to_end(key)
+        else:
+            del self._entries[key]
+            self._cursor.pop(key, None)
+        return entries
+
+    def _count_request(self, key: Hashable) -> int:
+        count = self._requests.pop(key, 0) + 1
+        self._requests[key] = count
+        while len(self._requests) > self.max_keys:
+            self._requests.popitem(last=False)
+        return count
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return a cached variant for key, or None on a miss. Schedules a refill when low."""
+        requests = self._count_request(key)
+        entries = self._live(key)
+        value = None
+        if entries:
+            self.hits += 1
+            if self.sampling == "random":
+                index = random.randrange(len(entries))
+            else:
+                index = self._cursor.get(key, 0) % len(entries)
+                self._cursor[key] = index + 1
+            value = entries.pop(index).value if self.consume else entries[index].value
+            if not entries:
+                del self._entries[key]
+        else:
+            self.misses += 1
+        if requests > 1 and len(entries) < self.variants:
+            self._schedule_refill(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        entries = self._live(key)
+        if len(entries) >= self.variants:
+            return
+        entries.append(CacheEntry(value))
+        self._entries[key] = entries
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            evicted, _ = self._entries.popitem(last=False)
+            self._cursor.pop(evicted, None)
+
+    def _schedule_refill(self, key: Hashable):
+        if key in self._refilling:
+            return
+        task = asyncio.create_task(self._refill(key))
+        self._refilling[key] = task
+        task.add_done_callback(lambda _: self._refilling.pop(key, None))
+
+    async def _refill(self, key: Hashable):
+        while len(self._live(key)) < self.variants:
+            async with self._refill_slots:
+                try:
+                    value = await self.producer(key)
+                except Exception as e:
+                    logger.warning(f"Content cache refill failed for {key}: {e}")
+                    return
+            self.put(key, value)
+
+    async def prefill(self, keys: list[Hashable]):
+        """Fill the given keys up front, e.g. at startup."""
+        for key in keys:
+            self._schedule_refill(key)
+        await asyncio.gather(*list(self._refilling.values()), return_exceptions=True)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "keys": len(self._entries),
+            "max_keys": self.max_keys,
+            "entries": sum(len(v) for v in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,91 @@
+import queue
+import threading
+from contextlib import contextmanager
+from functools import partial
+
+from crewai import LLM, Crew
+
+from bakasura_flow.config import settings
+from bakasura_flow.llm_replay import crew_request, llm_recorder
+from bakasura_flow.scheduler import llm_scheduler
+from bakasura_flow.tracing import instrument_crewai, span
+
+# Flow steps, crew kickoffs, tasks, agents and tool calls show up as spans
+instrument_crewai()
+
+
+class ScheduledLLM(LLM):
+    """An agent's LLM whose every call first waits for a slot in the shared scheduler, and can be recorded or replayed."""
+
+    @classmethod
+    def wrap(cls, llm: LLM) -> "ScheduledLLM":
+        if isinstance(llm, cls):
+            return llm
+        # Same settings and client state as the agent's own LLM, only `call` differs
+        scheduled = cls.__new__(cls)
+        scheduled.__dict__.update(vars(llm))
+        return scheduled
+
+    def call(self, messages, *args, **kwargs):
+        with span("llm.call", model=self.model), llm_scheduler.slot():
+            return llm_recorder.call("crew", crew_request(self, messages),
+                                     partial(super().call, messages, *args, **kwargs))
+
+
+class CrewPool:
+    """
+    Keeps pre-built Crew objects around so a request only binds its inputs at kickoff.
+
+    The @CrewBase class is instantiated once to build a template; that is the only
+    time its agents.yaml/tasks.yaml are read and parsed. Pooled crews are copies of
+    the template, and crewai re-interpolates `{language}`, `{theme}` and
+    `{sentence_count}` from the original YAML text on every kickoff, so a crew can
+    be reused across requests as long as only one request uses it at a time.
+    """
+
+    def __init__(self, crew_class, size: int = settings.crew_pool_size):
+        self.crew_class = crew_class
+        self.size = size
+        self._template: Crew | None = None
+        self._idle: queue.LifoQueue[Crew] = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _build(self) -> Crew:
+        with self._lock:
+            if self._template is None:
+                template = self.crew_class().crew()
+                # Crew copies (shallow-)copy their agents' LLMs, so wrapping the template covers the pool
+                for crew_agent in template.agents:
+                    crew_agent.llm = ScheduledLLM.wrap(crew_agent.llm)
+                self._template = template
+        return self._template.copy()
+
+    @property
+    def model_name(self) -> str | None:
+        """Model used by the crew's first agent, for recording alongside outputs."""
+        if self._template is None:
+            self._build()
+        llm = self._template.agents[0].llm if self._template.agents else None
+        return getattr(llm, "model", llm)
+
+    def warm(self):
+        """Fill the pool up to its size; call at startup, off the event loop."""
+        while self._idle.qsize() < self.size:
+            self._idle.put(self._build())
+
+    @contextmanager
+    def acquire(self):
+        try:
+            crew = self._idle.get_nowait()
+        except queue.Empty:
+            # Pool exhausted: build an extra crew rather than make the request wait
+            crew = self._build()
+        try:
+            yield crew
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(crew)
+
+    def kickoff(self, inputs: dict):
+        with self.acquire() as crew:
+            return crew.kickoff(inputs=inputs)
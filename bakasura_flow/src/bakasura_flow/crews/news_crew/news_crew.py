@@ -1,6 +1,17 @@
+import contextvars
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 
+from bakasura_flow.config import settings
+from bakasura_flow.crews.crew_pool import CrewPool
+
+logger = getLogger(__name__)
+
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
 # https://docs.crewai.com/concepts/crews#example-crew-class-with-decorators
@@ -76,3 +87,149 @@ class NewsCrew:
             process=Process.sequential,
             verbose=True,
         )
+
+
+@CrewBase
+class NewsAngleCrew:
+    """Single researcher covering one angle of a topic, used by the fan-out mode"""
+
+    agents_config = "config/agents.yaml"
+    tasks_config = "config/angle_tasks.yaml"
+
+    @agent
+    def researcher(self) -> Agent:
+        return Agent(config=self.agents_config["researcher"])
+
+    @task
+    def angle_research_task(self) -> Task:
+        return Task(config=self.tasks_config["angle_research_task"])
+
+    @crew
+    def crew(self) -> Crew:
+        return Crew(
+            agents=self.agents,
+            tasks=self.tasks,
+            process=Process.sequential,
+            verbose=True,
+        )
+
+
+@CrewBase
+class NewsDigestCrew:
+    """Senior researcher merging the fan-out research into one digest"""
+
+    agents_config = "config/agents.yaml"
+    tasks_config = "config/digest_tasks.yaml"
+
+    @agent
+    def senior_researcher(self) -> Agent:
+        return Agent(config=self.agents_config["senior_researcher"])
+
+    @task
+    def aggregate_task(self) -> Task:
+        return Task(config=self.tasks_config["aggregate_task"])
+
+    @crew
+    def crew(self) -> Crew:
+        return Crew(
+            agents=self.agents,
+            tasks=self.tasks,
+            process=Process.sequential,
+            verbose=True,
+        )
+
+
+@CrewBase
+class NewsPlanCrew:
+    """Senior researcher splitting a topic into the angles the fan-out researches"""
+
+    agents_config = "config/agents.yaml"
+    tasks_config = "config/plan_tasks.yaml"
+
+    @agent
+    def senior_researcher(self) -> Agent:
+        return Agent(config=self.agents_config["senior_researcher"])
+
+    @task
+    def plan_task(self) -> Task:
+        return Task(config=self.tasks_config["plan_task"])
+
+    @crew
+    def crew(self) -> Crew:
+        return Crew(
+            agents=self.agents,
+            tasks=self.tasks,
+            process=Process.sequential,
+            verbose=True,
+        )
+
+
+# Generic angles, used when planning is off or fails, and to fill up a short plan
+NEWS_ANGLES = [
+    "latest developments",
+    "background and context",
+    "key people and organizations",
+    "impact and reactions",
+    "what to watch next",
+]
+
+# Shared pools of pre-built crews; per-request inputs are bound at kickoff
+news_crew_pool = CrewPool(NewsCrew)
+news_plan_pool = CrewPool(NewsPlanCrew)
+news_angle_pool = CrewPool(NewsAngleCrew, size=settings.news_fanout_concurrency)
+news_digest_pool = CrewPool(NewsDigestCrew)
+
+# One executor for every fan-out request, so the cap holds server-wide
+_research_executor = ThreadPoolExecutor(
+    max_workers=settings.news_fanout_concurrency,
+    thread_name_prefix="news-research",
+)
+
+
+def parse_angles(text: str, count: int) -> list[str]:
+    """The distinct angles in the plan's JSON array, at most `count`; [] if there is no array."""
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    try:
+        items = json.loads(match.group(0)) if match else []
+    except json.JSONDecodeError:
+        return []
+    angles = []
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, str) and item.strip() and item.strip().lower() not in map(str.lower, angles):
+            angles.append(item.strip())
+    return angles[:count]
+
+
+def split_topic(inputs: dict, angles: int) -> list[str]:
+    """
+    Angles to research; each one becomes a sub-query on the topic via angle_research_task.
+
+    One planning call asks for angles specific to the topic ("the ceasefire talks",
+    "oil prices" rather than "impact and reactions"), so the researchers don't all
+    cover the same ground. If the plan fails or comes up short, generic angles fill in.
+    """
+    count = max(1, min(angles, len(NEWS_ANGLES)))
+    planned = []
+    if settings.news_plan_angles:
+        try:
+            planned = parse_angles(news_plan_pool.kickoff({**inputs, "angles": count}).raw, count)
+        except Exception as e:
+            logger.warning(f"Planning news angles for {inputs.get('topic')!r} failed, using generic ones: {e}")
+    return planned + [angle for angle in NEWS_ANGLES if angle not in planned][:count - len(planned)]
+
+
+def fan_out_kickoff(inputs: dict, angles: int = settings.news_fanout_angles):
+    """
+    Plan the angles of the topic, research each one concurrently, then merge with one reviewer pass.
+    Wall-clock time is roughly the plan, the slowest angle and the review, not the sum of all angles.
+    """
+    sub_queries = split_topic(inputs, angles)
+    # Each angle runs in the caller's context, so its LLM calls are scheduled as the caller's tenant
+    futures = [
+        _research_executor.submit(contextvars.copy_context().run, news_angle_pool.kickoff, {**inputs, "angle": angle})
+        for angle in sub_queries
+    ]
+    research = "\n\n".join(
+        f"## {angle}\n{future.result().raw}" for angle, future in zip(sub_queries, futures)
+    )
+    return news_digest_pool.kickoff({**inputs, "research": research})
@@ -1,6 +1,8 @@
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 
+from bakasura_flow.crews.crew_pool import CrewPool
+
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
 # https://docs.crewai.com/concepts/crews#example-crew-class-with-decorators
@@ -58,3 +60,7 @@ class PoemCrew:
             process=Process.sequential,
             verbose=True,
         )
+
+
+# Shared pool of pre-built crews; per-request inputs are bound at kickoff
+poem_crew_pool = CrewPool(PoemCrew)
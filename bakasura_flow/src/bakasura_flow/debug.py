@@ -0,0 +1,39 @@
+"""
+The `/debug` endpoints of the profiler and the loop watchdog, mounted only when switched on.
+
+They show stack frames and route names, and `POST /debug/profiler` changes how the
+process runs, so they are off by default. With `POEM_DEBUG_ENDPOINTS_ENABLED=true`
+and an admin token in `POEM_DEBUG_TOKEN`, `include_debug_routers()` mounts them
+behind that token, sent as the `X-Debug-Token` header. Enabled without a token,
+they stay unmounted and a warning is logged.
+
+The profiler middleware and the watchdog itself run either way; this only decides
+whether they can be read or reconfigured over HTTP.
+"""
+import hmac
+from logging import getLogger
+
+from fastapi import Depends, HTTPException, Request
+
+from bakasura_flow import loop_watchdog, profiler
+from bakasura_flow.config import settings
+
+logger = getLogger(__name__)
+
+
+def require_debug_token(request: Request):
+    token = request.headers.get("x-debug-token", "")
+    if not hmac.compare_digest(token.encode(), (settings.debug_token or "").encode()):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Debug-Token")
+
+
+def include_debug_routers(app) -> bool:
+    """Mount the debug endpoints on `app` if they are enabled; returns whether they were."""
+    if not settings.debug_endpoints_enabled:
+        return False
+    if not settings.debug_token:
+        logger.warning("POEM_DEBUG_ENDPOINTS_ENABLED is set without POEM_DEBUG_TOKEN; not mounting /debug")
+        return False
+    for router in (profiler.router, loop_watchdog.debug_router):
+        app.include_router(router, dependencies=[Depends(require_debug_token)])
+    return True
@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from logging import getLogger
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from bakasura_flow.config import settings
+
+logger = getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+
+
+class FixtureMissing(LookupError):
+    """Replay mode was asked for a call that was never recorded."""
+
+
+def request_key(provider: str, request: dict) -> str:
+    """Stable digest of everything that determines a response: provider, model, prompt/messages, sampling."""
+    canonical = json.dumps({"provider": provider, **request}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+def crew_request(llm, messages) -> dict:
+    """The request of a crewai LLM.call(): its model, sampling settings and messages."""
+    return {"model": llm.model, "messages": messages, "temperature": getattr(llm, "temperature", None),
+            "stop": getattr(llm, "stop", None)}
+
+
+class LLMRecorder:
+    """
+    Records LLM request/response pairs to a fixture file and replays them offline.
+
+    In "record" mode every call goes to the provider and the response text, with
+    how long it took, is appended to a gzipped JSON-lines file. Each record is
+    written as its own gzip member in one O_APPEND write, so several worker
+    processes can record into the same file. In "replay" mode nothing leaves
+    the machine: a call is answered from the fixtures after sleeping the recorded
+    latency times `speed` (0 answers at once). Repeats of the same request get
+    the recorded responses in the order they were recorded, then start over.
+    """
+
+    def __init__(self, mode: str = settings.llm_replay_mode, path: str | None = settings.llm_fixtures,
+                 speed: float = settings.llm_replay_speed):
+        if mode not in MODES:
+            raise ValueError(f"llm_replay_mode must be one of {', '.join(MODES)}")
+        self.mode = mode
+        self.path = Path(path or Path(settings.output_dir) / "llm_fixtures.jsonl.gz")
+        self.speed = speed
+        self._fixtures: dict[str, list[dict]] | None = None
+        self._cursor: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.missing = 0
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> dict[str, list[dict]]:
+        if self._fixtures is None:
+            fixtures: dict[str, list[dict]] = {}
+            if self.path.exists():
+                with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        record = json.loads(line)
+                        fixtures.setdefault(record["key"], []).append(record)
+            logger.info(f"Loaded {sum(map(len, fixtures.values()))} LLM fixtures from {self.path}")
+            self._fixtures = fixtures
+        return self._fixtures
+
+    def _next(self, provider: str, request: dict) -> dict:
+        key = request_key(provider, request)
+        with self._lock:
+            records = self._load().get(key)
+            if not records:
+                self.missing += 1
+                raise FixtureMissing(f"No recorded {provider} response for {request.get('model')} (key {key}) in {self.path}")
+            cursor = self._cursor.get(key, 0)
+            self._cursor[key] = cursor + 1
+            self.replayed += 1
+            return records[cursor % len(records)]
+
+    def _save(self, provider: str, request: dict, response: Any, seconds: float):
+        if not isinstance(response, str):
+            # Tool calls and other structured results are not replayable as text
+            logger.warning(f"Not recording a {type(response).__name__} response from {provider}")
+            return
+        record = {"key": request_key(provider, request), "provider": provider, "request": request,
+                  "seconds": round(seconds, 4), "response": response}
+        member = gzip.compress((json.dumps(record, separators=(",", ":"), default=str) + "\n").encode())
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, member)
+            finally:
+                os.close(fd)
+            self.recorded += 1
+
+    def call(self, provider: str, request: dict, fn: Callable[[], Any]) -> Any:
+        """Run `fn()` for this request, recording or replaying it depending on the mode."""
+        if self.mode == "replay":
+            record = self._next(provider, request)
+            time.sleep(record["seconds"] * self.speed)
+            return record["response"]
+        if self.mode == "off":
+            return fn()
+        start = time.perf_counter()
+        response = fn()
+        self._save(provider, request, response, time.perf_counter() - start)
+        return response
+
+    async def acall(self, provider: str, request: dict, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async `call()`: `fn` returns an awaitable."""
+        if self.mode == "replay":
+            record = self._next(provider, request)
+            await asyncio.sleep(record["seconds"] * self.speed)
+            return record["response"]
+        if self.mode == "off":
+            return await fn()
+        start = time.perf_counter()
+        response = await fn()
+        await asyncio.to_thread(self._save, provider, request, response, time.perf_counter() - start)
+        return response
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "path": str(self.path), "recorded": self.recorded,
+                "replayed": self.replayed, "missing": self.missing}
+
+
+llm_recorder = LLMRecorder()
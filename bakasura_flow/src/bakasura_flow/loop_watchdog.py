@@ -0,0 +1,208 @@
+"""
+Event-loop lag watchdog: measures how late the loop runs its callbacks and catches
+whatever blocks it.
+
+A heartbeat task sleeps `interval_ms` at a time and records how much later than
+asked it woke up; that lag is the time every other coroutine waited too. A
+watchdog thread checks the heartbeat. When the loop has not run it for longer than
+`threshold_ms`, a single callback is holding the loop, and the thread logs the
+loop thread's stack at that moment (the blocking call and the coroutine it runs
+in, e.g. a sync Groq call, a crew `kickoff`, a PDF render or a file read) with the
+asyncio task's name. The block's full duration is filled in once the loop runs
+the heartbeat again.
+
+Blocking sites, keyed by the innermost frame of application code, are counted, so
+`GET /debug/loop` doubles as a regression guard: a new blocking call shows up as a
+new site. The endpoint also reports lag percentiles over the last `window`
+heartbeats. `router` starts the watchdog on the app's loop at startup; the endpoint is on
+`debug_router`, which `bakasura_flow.debug` mounts only when debug endpoints are enabled.
+
+State is per process: each gunicorn worker watches its own loop.
+"""
+import asyncio
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, deque
+from logging import getLogger
+
+from fastapi import APIRouter
+
+from bakasura_flow.config import settings
+
+logger = getLogger(__name__)
+
+# Frames from these directories are the interpreter's or a dependency's, not the code that blocked
+LIBRARY_PATHS = tuple({sysconfig.get_paths()["stdlib"], sysconfig.get_paths()["purelib"], sysconfig.get_paths()["platlib"]})
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f'File "{code.co_filename}", line {frame.f_lineno}, in {getattr(code, "co_qualname", code.co_name)}'
+
+
+def _loop_stack(frame) -> list:
+    """The frames of the running callback: the loop's own frames (run_forever, _run_once, Handle._run) are dropped."""
+    frames = []
+    while frame is not None:
+        if frame.f_code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            break
+        frames.append(frame)
+        frame = frame.f_back
+    return frames[::-1]
+
+
+def _blocking_site(frames: list) -> str:
+    """Innermost frame of application code, where it called into whatever blocked."""
+    for frame in reversed(frames):
+        if not frame.f_code.co_filename.startswith(LIBRARY_PATHS):
+            code = frame.f_code
+            return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+    return _format_frame(frames[-1]) if frames else "<unknown>"
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and logs the stack of any callback that holds the loop past a threshold."""
+
+    def __init__(self, threshold_ms: float = settings.loop_watchdog_threshold_ms,
+                 interval_ms: float = settings.loop_watchdog_interval_ms, window: int = 1000):
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.lags: deque[float] = deque(maxlen=window)
+        self.max_lag_ms = 0.0
+        self.blocks = 0
+        self.sites: Counter = Counter()
+        self.site_max_ms: dict[str, float] = {}
+        self.events: deque[dict] = deque(maxlen=20)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._last_beat = time.monotonic()
+        self._pending: dict | None = None
+        self._heartbeat: asyncio.Task | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat is not None and not self._heartbeat.done()
+
+    def start(self):
+        """Watch the running loop; a no-op if already watching it."""
+        loop = asyncio.get_running_loop()
+        if self.running and self._loop is loop:
+            return
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._heartbeat = loop.create_task(self._beat(), name="loop-watchdog-heartbeat")
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info(f"Loop watchdog started: blocks over {self.threshold_ms:.0f}ms are logged")
+
+    def stop(self):
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    async def _beat(self):
+        interval = self.interval_ms / 1000
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - expected) * 1000)
+            self._last_beat = now
+            self.lags.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            event, self._pending = self._pending, None
+            if event is not None:
+                event["duration_ms"] = round(lag_ms, 1)
+                self.site_max_ms[event["site"]] = max(self.site_max_ms.get(event["site"], 0.0), lag_ms)
+                logger.warning(f"Event loop was blocked for {lag_ms:.0f}ms at {event['site']}")
+
+    def _watch(self):
+        check = min(self.interval_ms, self.threshold_ms) / 2000
+        while not self._stopped.wait(check):
+            stalled_ms = (time.monotonic() - self._last_beat) * 1000 - self.interval_ms
+            if stalled_ms > self.threshold_ms and self._pending is None:
+                self._report(stalled_ms)
+
+    def _report(self, stalled_ms: float):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        frames = _loop_stack(frame)
+        task = asyncio.current_task(self._loop)
+        site = _blocking_site(frames)
+        stack = [_format_frame(f) for f in frames]
+        self._pending = event = {
+            "at": time.time(),
+            "task": task.get_name() if task else None,
+            "coroutine": getattr(task.get_coro(), "__qualname__", None) if task else None,
+            "site": site,
+            "duration_ms": None,
+            "stack": stack,
+        }
+        self.blocks += 1
+        self.sites[site] += 1
+        self.events.append(event)
+        logger.warning(
+            f"Event loop blocked for over {stalled_ms:.0f}ms by task {event['task']} ({event['coroutine']}) "
+            f"at {site}:\n  " + "\n  ".join(stack)
+        )
+
+    def stats(self, detail: bool = True) -> dict:
+        """Lag percentiles and block count; with `detail`, also the blocking sites and recent stacks."""
+        lags = sorted(self.lags)
+        stats = {
+            "running": self.running,
+            "threshold_ms": self.threshold_ms,
+            "interval_ms": self.interval_ms,
+            "lag_ms": {
+                "samples": len(lags),
+                "p50": round(_percentile(lags, 0.5), 2),
+                "p95": round(_percentile(lags, 0.95), 2),
+                "p99": round(_percentile(lags, 0.99), 2),
+                "max": round(self.max_lag_ms, 2),
+            },
+            "blocks": self.blocks,
+        }
+        if detail:
+            stats["sites"] = [{"site": site, "blocks": count, "max_ms": round(self.site_max_ms.get(site, 0.0), 1)}
+                              for site, count in self.sites.most_common()]
+            stats["recent"] = list(self.events)
+        return stats
+
+
+loop_watchdog = LoopWatchdog()
+
+router = APIRouter()
+debug_router = APIRouter(prefix="/debug")
+
+
+@router.on_event("startup")
+async def start_loop_watchdog():
+    if settings.loop_watchdog_enabled:
+        loop_watchdog.start()
+
+
+@router.on_event("shutdown")
+async def stop_loop_watchdog():
+    loop_watchdog.stop()
+
+
+@router.get("/loop/stats")
+async def loop_summary():
+    """Event-loop lag percentiles and how often the loop was blocked, without code locations."""
+    return loop_watchdog.stats(detail=False)
+
+
+@debug_router.get("/loop")
+async def loop_stats():
+    """Event-loop lag percentiles, and the callbacks that blocked the loop with where they blocked it."""
+    return loop_watchdog.stats()
@@ -4,17 +4,25 @@ from logging import getLogger
 import sys
 from datetime import datetime
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import asyncio
-import aiofiles
+import time
 import io
 from fastapi.middleware.cors import CORSMiddleware
 
 from crewai.flow import Flow, listen, start
-from bakasura_flow.crews.poem_crew.poem_crew import PoemCrew
+from bakasura_flow.crews.poem_crew.poem_crew import poem_crew_pool
 from bakasura_flow.config import settings
+from bakasura_flow.output_store import output_store
+from bakasura_flow.outputs import router as outputs_router
+from bakasura_flow.debug import include_debug_routers
+from bakasura_flow.loop_watchdog import router as loop_watchdog_router
+from bakasura_flow.profiler import ProfilerMiddleware
+from bakasura_flow.content_cache import ContentCache
+from bakasura_flow.scheduler import tenant_context
+from bakasura_flow.tracing import span
 from bakasura_flow.tools.txt_PDF_tool import PDFConversionTool
 
 app = FastAPI(
@@ -31,6 +39,10 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+app.add_middleware(ProfilerMiddleware)
+
+# Routes live on a router so the gateway can mount them next to the other services
+router = APIRouter()
 
 class PoemRequest(BaseModel):
     language: str = "en"
@@ -38,6 +50,7 @@ class PoemRequest(BaseModel):
     format: str = "txt"  # Add format option: 'txt' or 'pdf'
 
 class PoemResponse(BaseModel):
+    id: int | None = None
     poem: str
     created_at: datetime
     sentence_count: int
@@ -47,14 +60,46 @@ class PoemResponse(BaseModel):
 class PoemState(BaseModel):
     sentence_count: int = 1
     poem: str = ""
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=datetime.now)
     theme: str | None = None
     language: str = "en"
     filepath: Path | None = None  # Add this line
+    output_id: int | None = None
+    model: str | None = None
+    latency_ms: float | None = None
     
     class Config:
         arbitrary_types_allowed = True
 
+def poem_cache_key(language: str, theme: str | None) -> tuple[str, str]:
+    return (language.strip().lower(), (theme or "").strip().lower())
+
+async def produce_poem(key: tuple[str, str]) -> tuple[str, int]:
+    """Generate one cache variant for a (language, theme) key."""
+    language, theme = key
+    sentence_count = randint(25,50)
+    # Refills are background work: they queue behind interactive requests
+    with tenant_context("poem-cache", "batch"):
+        result = await asyncio.to_thread(
+            poem_crew_pool.kickoff,
+            inputs={
+                "sentence_count": sentence_count,
+                "language": language,
+                "theme": theme or None
+            }
+        )
+    return result.raw, sentence_count
+
+# Optional cache of generated poems; most requests are served without an LLM call
+poem_cache = ContentCache(
+    produce_poem,
+    variants=settings.poem_cache_variants,
+    ttl_seconds=settings.poem_cache_ttl_seconds,
+    sampling=settings.poem_cache_sampling,
+    consume=settings.poem_cache_consume,
+    max_keys=settings.poem_cache_max_keys,
+) if settings.poem_cache_enabled else None
+
 class PoemFlow(Flow[PoemState]):
     def __init__(self, language="en", theme=None):
         super().__init__()
@@ -67,12 +112,16 @@ class PoemFlow(Flow[PoemState]):
 
     @listen(generate_sentence_count)
     async def generate_poem(self):
-        crew = PoemCrew(
-            language=self.state.language,
-            theme=self.state.theme
-        )
+        started = time.perf_counter()
+        self.state.model = await asyncio.to_thread(lambda: poem_crew_pool.model_name)
+        key = poem_cache_key(self.state.language, self.state.theme)
+        if poem_cache is not None:
+            cached = poem_cache.get(key)
+            if cached is not None:
+                self.state.poem, self.state.sentence_count = cached
+                return
         result = await asyncio.to_thread(
-            crew.crew().kickoff,
+            poem_crew_pool.kickoff,
             inputs={
                 "sentence_count": self.state.sentence_count,
                 "language": self.state.language,
@@ -80,20 +129,31 @@ class PoemFlow(Flow[PoemState]):
             }
         )
         self.state.poem = result.raw
+        self.state.latency_ms = (time.perf_counter() - started) * 1000
+        if poem_cache is not None and not poem_cache.consume:
+            poem_cache.put(key, (self.state.poem, self.state.sentence_count))
 
     @listen(generate_poem)
     async def save_poem(self):
-        output_dir = Path(settings.output_dir)
-        output_dir.mkdir(exist_ok=True)
-        
-        timestamp = self.state.created_at.strftime("%Y%m%d_%H%M%S")
-        filename = f"poem_{timestamp}.txt"
-        self.state.filepath = output_dir / filename  # Update this line
-        
-        async with aiofiles.open(self.state.filepath, "w", encoding="utf-8") as f:
-            await f.write(self.state.poem)
+        # Indexed, content-addressed storage: concurrent requests never share a file name
+        record = await asyncio.to_thread(
+            output_store.save,
+            "poem",
+            self.state.poem,
+            theme=self.state.theme,
+            language=self.state.language,
+            sentence_count=self.state.sentence_count,
+            model=self.state.model,
+            latency_ms=self.state.latency_ms
+        )
+        self.state.output_id = record.id
+        self.state.filepath = output_store.blob_path(record.blob)
+
+@router.on_event("startup")
+async def warm_crew_pool():
+    await asyncio.to_thread(poem_crew_pool.warm)
 
-@app.post("/generate-poem")
+@router.post("/generate-poem")
 async def generate_poem(request: PoemRequest):
     try:
         poem_flow = PoemFlow(language=request.language, theme=request.theme)
@@ -106,7 +166,8 @@ async def generate_poem(request: PoemRequest):
                 input_file_path=str(poem_flow.state.filepath),
                 output_file_path=str(poem_flow.state.filepath.with_suffix('.pdf'))
             )
-            converter._run()
+            with span("pdf.convert"):
+                converter._run()
             
             # Read the PDF file into memory
             with open(poem_flow.state.filepath.with_suffix('.pdf'), 'rb') as pdf_file:
@@ -123,6 +184,7 @@ async def generate_poem(request: PoemRequest):
         
         # Return JSON response for txt format
         return PoemResponse(
+            id=poem_flow.state.output_id,
             poem=poem_flow.state.poem,
             created_at=poem_flow.state.created_at,
             sentence_count=poem_flow.state.sentence_count,
@@ -132,6 +194,17 @@ async def generate_poem(request: PoemRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/cache/stats")
+async def cache_stats():
+    if poem_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **poem_cache.stats()}
+
+app.include_router(router)
+app.include_router(outputs_router)
+app.include_router(loop_watchdog_router)
+include_debug_routers(app)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
@@ -4,17 +4,22 @@ from logging import getLogger
 import sys
 from datetime import datetime
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, FastAPI, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import asyncio
-import aiofiles
+import time
 import io
 from fastapi.middleware.cors import CORSMiddleware
 
 from crewai.flow import Flow, listen, start
-from bakasura_flow.crews.news_crew.news_crew import NewsCrew
+from bakasura_flow.crews.news_crew.news_crew import fan_out_kickoff, news_crew_pool
 from bakasura_flow.config import settings
+from bakasura_flow.output_store import output_store
+from bakasura_flow.outputs import router as outputs_router
+from bakasura_flow.debug import include_debug_routers
+from bakasura_flow.loop_watchdog import router as loop_watchdog_router
+from bakasura_flow.profiler import ProfilerMiddleware
 from bakasura_flow.tools.txt_PDF_tool import PDFConversionTool
 
 app = FastAPI(
@@ -31,13 +36,20 @@ app.add_middleware(
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
 )
+app.add_middleware(ProfilerMiddleware)
+
+# Routes live on a router so the gateway can mount them next to the other services
+router = APIRouter()
 
 class NewsRequest(BaseModel):
     language: str = "en"
     topic: str | None = None  # Change theme to topic for consistency
     format: str = "txt"
+    fan_out: bool = False  # Research several angles of the topic in parallel
+    angles: int = settings.news_fanout_angles
 
 class NewsResponse(BaseModel):
+    id: int | None = None
     news: str  # Fix the field name to match the state
     created_at: datetime
     sentence_count: int
@@ -47,19 +59,26 @@ class NewsResponse(BaseModel):
 class NewsState(BaseModel):
     sentence_count: int = 1
     news: str = ""
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=datetime.now)
     topic: str | None = None  # Change theme to topic
     language: str = "en"
     filepath: Path | None = None
+    output_id: int | None = None
+    model: str | None = None
+    latency_ms: float | None = None
+    fan_out: bool = False
+    angles: int = settings.news_fanout_angles
     
     class Config:
         arbitrary_types_allowed = True
 
 class NewsFlow(Flow[NewsState]):
-    def __init__(self, language="en", topic=None):  # Change theme to topic
+    def __init__(self, language="en", topic=None, fan_out=False, angles=settings.news_fanout_angles):  # Change theme to topic
         super().__init__()
         self.state.language = language
         self.state.topic = topic  # Change theme to topic
+        self.state.fan_out = fan_out
+        self.state.angles = angles
 
     @start()
     async def generate_sentence_count(self):
@@ -67,37 +86,50 @@ class NewsFlow(Flow[NewsState]):
 
     @listen(generate_sentence_count)
     async def generate_news(self):
-        crew = NewsCrew(
-            language=self.state.language,
-            theme=self.state.topic  # Use topic as theme for crew
-        )
-        result = await asyncio.to_thread(
-            crew.crew().kickoff,
-            inputs={
-                "sentence_count": self.state.sentence_count,
-                "language": self.state.language,
-                "topic": self.state.topic,  # Add this line
-                "theme": self.state.topic  # Keep this for backward compatibility
-            }
-        )
+        started = time.perf_counter()
+        self.state.model = await asyncio.to_thread(lambda: news_crew_pool.model_name)
+        inputs = {
+            "sentence_count": self.state.sentence_count,
+            "language": self.state.language,
+            "topic": self.state.topic,  # Add this line
+            "theme": self.state.topic  # Keep this for backward compatibility
+        }
+        if self.state.fan_out and self.state.topic:
+            result = await asyncio.to_thread(fan_out_kickoff, inputs, self.state.angles)
+        else:
+            result = await asyncio.to_thread(news_crew_pool.kickoff, inputs=inputs)
         self.state.news = result.raw
+        self.state.latency_ms = (time.perf_counter() - started) * 1000
 
     @listen(generate_news)
     async def save_news(self):
-        output_dir = Path(settings.output_dir)
-        output_dir.mkdir(exist_ok=True)
-        
-        timestamp = self.state.created_at.strftime("%Y%m%d_%H%M%S")
-        filename = f"news{timestamp}.txt"
-        self.state.filepath = output_dir / filename  # Update this line
-        
-        async with aiofiles.open(self.state.filepath, "w", encoding="utf-8") as f:
-            await f.write(self.state.news)
+        # Indexed, content-addressed storage: concurrent requests never share a file name
+        record = await asyncio.to_thread(
+            output_store.save,
+            "news",
+            self.state.news,
+            theme=self.state.topic,
+            language=self.state.language,
+            sentence_count=self.state.sentence_count,
+            model=self.state.model,
+            latency_ms=self.state.latency_ms
+        )
+        self.state.output_id = record.id
+        self.state.filepath = output_store.blob_path(record.blob)
+
+@router.on_event("startup")
+async def warm_crew_pool():
+    await asyncio.to_thread(news_crew_pool.warm)
 
-@app.post("/generate-news")
+@router.post("/generate-news")
 async def generate_news(request: NewsRequest):
     try:
-        news_flow = NewsFlow(language=request.language, topic=request.topic)  # Change theme to topic
+        news_flow = NewsFlow(
+            language=request.language,
+            topic=request.topic,  # Change theme to topic
+            fan_out=request.fan_out,
+            angles=request.angles
+        )
         await news_flow.kickoff_async()
         
         if request.format == "pdf":
@@ -124,6 +156,7 @@ async def generate_news(request: NewsRequest):
         
         # Return JSON response for txt format
         return NewsResponse(
+            id=news_flow.state.output_id,
             news=news_flow.state.news,
             created_at=news_flow.state.created_at,
             sentence_count=news_flow.state.sentence_count,
@@ -133,6 +166,11 @@ async def generate_news(request: NewsRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+app.include_router(router)
+app.include_router(outputs_router)
+app.include_router(loop_watchdog_router)
+include_debug_routers(app)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
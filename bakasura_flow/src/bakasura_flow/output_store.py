@@ -0,0 +1,175 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from bakasura_flow.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    theme TEXT,
+    language TEXT,
+    sentence_count INTEGER,
+    model TEXT,
+    latency_ms REAL,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_kind_created ON outputs (kind, created_at, id);
+CREATE INDEX IF NOT EXISTS outputs_kind_theme_created ON outputs (kind, theme, created_at, id);
+CREATE INDEX IF NOT EXISTS outputs_kind_language_created ON outputs (kind, language, created_at, id);
+CREATE INDEX IF NOT EXISTS outputs_created ON outputs (created_at);
+CREATE INDEX IF NOT EXISTS outputs_blob ON outputs (blob);
+"""
+
+
+@dataclass
+class OutputRecord:
+    id: int
+    kind: str
+    created_at: float
+    theme: str | None
+    language: str | None
+    sentence_count: int | None
+    model: str | None
+    latency_ms: float | None
+    blob: str
+    size: int
+
+
+class OutputStore:
+    """
+    Index of generated poems and news: metadata in SQLite, content in content-addressed blobs.
+
+    Every listing is a keyset-paginated range scan over an index, so paging and
+    filtering stay O(log n) however large the archive grows. Identical content is
+    stored once, and concurrent saves never collide on a file name.
+    """
+
+    def __init__(self, root: str = settings.output_dir, retention_days: float = settings.output_retention_days,
+                 max_items: int = settings.output_max_items):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.retention_days = retention_days
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Opened lazily and per process: a SQLite connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.root / "outputs.db", check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest[2:4] / f"{digest}.txt"
+
+    def _write_blob(self, content: str) -> tuple[str, int]:
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # atomic, so readers never see a partial blob
+        return digest, len(data)
+
+    def save(self, kind: str, content: str, *, theme: str | None = None, language: str | None = None,
+             sentence_count: int | None = None, model: str | None = None,
+             latency_ms: float | None = None) -> OutputRecord:
+        """Store content and its metadata; returns the new record."""
+        digest, size = self._write_blob(content)
+        created_at = time.time()
+        theme = theme.strip().lower() if theme else None
+        with self._lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO outputs (kind, created_at, theme, language, sentence_count, model, latency_ms, blob, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, created_at, theme, language, sentence_count, model, latency_ms, digest, size),
+            )
+        return OutputRecord(cursor.lastrowid, kind, created_at, theme, language, sentence_count, model,
+                            latency_ms, digest, size)
+
+    def get(self, output_id: int) -> OutputRecord | None:
+        with self._lock:
+            row = self.db.execute("SELECT * FROM outputs WHERE id = ?", (output_id,)).fetchone()
+        return OutputRecord(**dict(row)) if row else None
+
+    def read(self, record: OutputRecord) -> str:
+        return self.blob_path(record.blob).read_text(encoding="utf-8")
+
+    def list(self, kind: str, theme: str | None = None, language: str | None = None,
+             cursor: str | None = None, limit: int = 20) -> tuple[list[OutputRecord], str | None]:
+        """
+        Newest-first page of outputs. `cursor` is the `next_cursor` of the previous
+        page; it encodes the last (created_at, id) seen, so no OFFSET scan is needed.
+        """
+        clauses, params = ["kind = ?"], [kind]
+        if theme:
+            clauses.append("theme = ?")
+            params.append(theme.strip().lower())
+        if language:
+            clauses.append("language = ?")
+            params.append(language)
+        if cursor:
+            created_at, last_id = cursor.split(":")
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend([float(created_at), int(last_id)])
+        query = (f"SELECT * FROM outputs WHERE {' AND '.join(clauses)}"
+                 " ORDER BY created_at DESC, id DESC LIMIT ?")
+        with self._lock:
+            rows = self.db.execute(query, [*params, limit + 1]).fetchall()
+        records = [OutputRecord(**dict(row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = records[-1]
+            next_cursor = f"{last.created_at!r}:{last.id}"
+        return records, next_cursor
+
+    def apply_retention(self) -> int:
+        """Delete outputs older than the retention period or beyond max_items per kind. Returns rows removed."""
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock, self.db:
+            expired = self.db.execute(
+                "SELECT id, blob FROM outputs WHERE created_at < ?", (cutoff,)
+            ).fetchall()
+            for (kind,) in self.db.execute("SELECT DISTINCT kind FROM outputs").fetchall():
+                expired += self.db.execute(
+                    "SELECT id, blob FROM outputs WHERE kind = ? ORDER BY created_at DESC, id DESC LIMIT -1 OFFSET ?",
+                    (kind, self.max_items),
+                ).fetchall()
+            ids = {row["id"] for row in expired}
+            self.db.executemany("DELETE FROM outputs WHERE id = ?", [(i,) for i in ids])
+            blobs = {row["blob"] for row in expired}
+            orphaned = [
+                b for b in blobs
+                if self.db.execute("SELECT 1 FROM outputs WHERE blob = ? LIMIT 1", (b,)).fetchone() is None
+            ]
+        for digest in orphaned:
+            path = self.blob_path(digest)
+            path.unlink(missing_ok=True)
+            path.with_suffix(".pdf").unlink(missing_ok=True)
+        return len(ids)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+output_store = OutputStore()
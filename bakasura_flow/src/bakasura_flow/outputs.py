@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime
+from logging import getLogger
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+from bakasura_flow.output_store import OutputRecord, output_store
+
+logger = getLogger(__name__)
+
+RETENTION_INTERVAL_SECONDS = 3600
+
+router = APIRouter()
+
+
+class OutputSummary(BaseModel):
+    id: int
+    kind: str
+    created_at: datetime
+    theme: str | None
+    language: str | None
+    sentence_count: int | None
+    model: str | None
+    latency_ms: float | None
+    size: int
+
+
+class OutputDetail(OutputSummary):
+    content: str
+
+
+class OutputPage(BaseModel):
+    items: list[OutputSummary]
+    next_cursor: str | None
+
+
+def _summary(record: OutputRecord) -> dict:
+    data = record.__dict__.copy()
+    data.pop("blob")
+    data["created_at"] = datetime.fromtimestamp(record.created_at)
+    return data
+
+
+async def _retention_loop():
+    while True:
+        try:
+            removed = await asyncio.to_thread(output_store.apply_retention)
+            if removed:
+                logger.info(f"Output retention removed {removed} outputs")
+        except Exception as e:
+            logger.warning(f"Output retention failed: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+@router.on_event("startup")
+async def start_retention():
+    router.retention_task = asyncio.create_task(_retention_loop())
+
+
+@router.on_event("shutdown")
+async def stop_retention():
+    task = getattr(router, "retention_task", None)
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+@router.get("/outputs", response_model=OutputPage)
+async def list_outputs(
+    kind: str = Query("poem", description="'poem' or 'news'"),
+    theme: str | None = Query(None, description="Theme (poems) or topic (news) to filter on"),
+    language: str | None = Query(None),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=200)):
+    """List past outputs, newest first, with cursor pagination."""
+    try:
+        records, next_cursor = await asyncio.to_thread(output_store.list, kind, theme, language, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return OutputPage(items=[_summary(r) for r in records], next_cursor=next_cursor)
+
+
+@router.get("/outputs/{output_id}", response_model=OutputDetail)
+async def get_output(output_id: int):
+    record = await asyncio.to_thread(output_store.get, output_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Output not found")
+    content = await asyncio.to_thread(output_store.read, record)
+    return OutputDetail(**_summary(record), content=content)
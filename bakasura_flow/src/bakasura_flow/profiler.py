@@ -0,0 +1,327 @@
+"""
+Sampling profiler for slow requests, shared by every FastAPI app in the repo.
+
+While it is switched on and a request is in flight, a background thread samples
+the stack of every thread (`sys._current_frames()`) every `interval_ms`. Each
+request collects the samples taken while it ran; one that took longer than
+`threshold_ms` keeps its profile in a ring buffer of the last `capacity` slow
+requests. A profile records the route template and the names of its query and path
+parameters, never their values, headers or body.
+
+Samples of the event loop thread are labelled with the asyncio task that held the
+loop, so a stall caused by a synchronous `kickoff`, `PDFConversionTool._run` or
+`shutil.copyfileobj` shows up with its coroutine and line, even in the profile of
+another request that was stuck behind it. Idle threads (waiting on a lock, a queue
+or the selector) are left out, except the loop thread, whose idle time is counted
+as `<idle>`.
+
+`ProfilerMiddleware` goes on each app and `router` holds the debug endpoints, which
+`bakasura_flow.debug` mounts only when they are enabled:
+
+- `GET /debug/profiler`, `POST /debug/profiler` show and change the settings at runtime
+- `GET /debug/profiles` lists the captured profiles
+- `GET /debug/profiles/{id}` downloads one as folded stacks (flamegraph.pl,
+  speedscope), or as JSON with `format=json`
+
+State is per process: with several gunicorn workers, each one profiles and keeps
+the requests it served.
+"""
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from logging import getLogger
+from urllib.parse import parse_qsl
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from bakasura_flow.config import settings
+
+logger = getLogger(__name__)
+
+REDACTED = "<redacted>"
+# Stacks whose innermost frame is in one of these modules are threads waiting for work
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+
+@dataclass
+class SlowRequestProfile:
+    id: int
+    method: str
+    route: str
+    params: dict[str, str]
+    task: str | None
+    started_at: float
+    duration_ms: float
+    status: int | None
+    interval_ms: float
+    stacks: Counter = field(default_factory=Counter)
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def summary(self, top: int = 5) -> dict:
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "params": self.params,
+            "task": self.task,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "samples": self.samples,
+            "interval_ms": self.interval_ms,
+            "top_frames": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(top)],
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+@dataclass
+class _InFlight:
+    started: float
+    task: str | None
+    stacks: Counter = field(default_factory=Counter)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _task_label(task: asyncio.Task | None) -> str | None:
+    if task is None:
+        return None
+    coro = task.get_coro()
+    return f"{task.get_name()} {getattr(coro, '__qualname__', type(coro).__name__)}"
+
+
+class RequestProfiler:
+    """Samples all threads while requests are in flight and keeps the profiles of the slow ones."""
+
+    def __init__(self, enabled: bool = settings.profiler_enabled, threshold_ms: float = settings.profiler_threshold_ms,
+                 interval_ms: float = settings.profiler_interval_ms, capacity: int = settings.profiler_buffer_size,
+                 max_in_flight: int = settings.profiler_max_in_flight):
+        self.enabled = enabled
+        self.threshold_ms = threshold_ms
+        self.interval_ms = interval_ms
+        self.max_in_flight = max_in_flight
+        self.profiles: deque[SlowRequestProfile] = deque(maxlen=capacity)
+        self._in_flight: dict[int, _InFlight] = {}
+        self._loops: dict[int, asyncio.AbstractEventLoop] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler_pid: int | None = None
+        self.captured = 0
+        self.skipped = 0
+
+    def configure(self, enabled: bool | None = None, threshold_ms: float | None = None,
+                  interval_ms: float | None = None, capacity: int | None = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if threshold_ms is not None:
+            self.threshold_ms = threshold_ms
+        if interval_ms is not None:
+            if interval_ms <= 0:
+                raise ValueError("interval_ms must be positive")
+            self.interval_ms = interval_ms
+        if capacity is not None:
+            with self._lock:
+                self.profiles = deque(self.profiles, maxlen=capacity)
+
+    def begin(self) -> int | None:
+        """Start collecting samples for the current request; None if it is not profiled."""
+        if not self.enabled:
+            return None
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if len(self._in_flight) >= self.max_in_flight:
+                self.skipped += 1
+                return None
+            request_id = next(self._ids)
+            self._in_flight[request_id] = _InFlight(time.perf_counter(), _task_label(asyncio.current_task()))
+            self._loops[threading.get_ident()] = loop
+        self._ensure_sampler()
+        self._wake.set()
+        return request_id
+
+    def end(self, request_id: int, method: str, route: str, params: dict[str, str], status: int | None):
+        """Stop sampling a request and keep its profile if it was slow."""
+        with self._lock:
+            request = self._in_flight.pop(request_id, None)
+        if request is None:
+            return
+        duration_ms = (time.perf_counter() - request.started) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        profile = SlowRequestProfile(
+            id=request_id, method=method, route=route, params=params, task=request.task,
+            started_at=time.time() - duration_ms / 1000, duration_ms=duration_ms, status=status,
+            interval_ms=self.interval_ms, stacks=request.stacks,
+        )
+        with self._lock:
+            self.profiles.append(profile)
+            self.captured += 1
+        logger.info(f"Profiled slow request {method} {route}: {duration_ms:.0f}ms, {profile.samples} samples")
+
+    def get(self, profile_id: int) -> SlowRequestProfile | None:
+        with self._lock:
+            return next((p for p in self.profiles if p.id == profile_id), None)
+
+    def summaries(self) -> list[dict]:
+        with self._lock:
+            profiles = list(self.profiles)
+        return [p.summary() for p in reversed(profiles)]
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "interval_ms": self.interval_ms,
+            "capacity": self.profiles.maxlen,
+            "in_flight": len(self._in_flight),
+            "captured": self.captured,
+            "skipped": self.skipped,
+            "buffered": len(self.profiles),
+        }
+
+    # Sampling
+
+    def _ensure_sampler(self):
+        # Started lazily and per process: a thread does not survive a fork
+        if self._sampler_pid != os.getpid():
+            with self._lock:
+                if self._sampler_pid != os.getpid():
+                    self._sampler_pid = os.getpid()
+                    threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True).start()
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while True:
+            if not self._in_flight:
+                # Nothing to profile: sleep until a request begins
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            stacks = self._sample(me)
+            with self._lock:
+                for request in self._in_flight.values():
+                    request.stacks.update(stacks)
+            time.sleep(self.interval_ms / 1000)
+
+    def _sample(self, sampler_thread: int) -> list[str]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == sampler_thread:
+                continue
+            loop = self._loops.get(thread_id)
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            idle = os.path.basename(frames[0].f_code.co_filename) in IDLE_MODULES
+            if loop is None:
+                if idle:
+                    continue
+                root = [names.get(thread_id, f"thread-{thread_id}")]
+            else:
+                if idle:
+                    stacks.append("event-loop;<idle>")
+                    continue
+                task = _task_label(asyncio.current_task(loop))
+                root = ["event-loop", f"task {task}" if task else "<callback>"]
+            stacks.append(";".join(root + [_frame_label(f).replace(";", ",") for f in reversed(frames)]))
+        return stacks
+
+
+class ProfilerMiddleware:
+    """ASGI middleware: profile each HTTP request while the profiler is on."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not request_profiler.enabled:
+            return await self.app(scope, receive, send)
+        request_id = request_profiler.begin()
+        if request_id is None:
+            return await self.app(scope, receive, send)
+        status = None
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            return await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            # Only parameter names are kept: values may be names, file paths or API keys
+            params = {name: REDACTED for name, _ in parse_qsl(scope.get("query_string", b"").decode("latin-1"),
+                                                             keep_blank_values=True)}
+            params.update({name: REDACTED for name in scope.get("path_params", {})})
+            request_profiler.end(request_id, scope["method"], route, params, status)
+
+
+request_profiler = RequestProfiler()
+
+router = APIRouter(prefix="/debug")
+
+
+class ProfilerConfig(BaseModel):
+    enabled: bool | None = None
+    threshold_ms: float | None = None
+    interval_ms: float | None = None
+    capacity: int | None = None
+
+
+@router.get("/profiler")
+async def profiler_status():
+    """Whether the slow-request profiler is on, its settings and counters."""
+    return request_profiler.stats()
+
+
+@router.post("/profiler")
+async def configure_profiler(config: ProfilerConfig):
+    """Switch the profiler on or off, or change its threshold, sampling interval or buffer size."""
+    try:
+        request_profiler.configure(**config.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return request_profiler.stats()
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Captured slow requests, newest first, with their most sampled frames."""
+    return {"profiler": request_profiler.stats(), "profiles": request_profiler.summaries()}
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: int, format: str = "folded"):
+    """One profile as folded stacks ("thread;frame;...;frame samples"), or as JSON with format=json."""
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found or evicted")
+    if format == "json":
+        return {**profile.summary(), "stacks": dict(profile.stacks.most_common())}
+    return PlainTextResponse(
+        profile.folded(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
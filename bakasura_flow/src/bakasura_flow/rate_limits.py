@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from bakasura_flow.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0,
+    request_limit REAL,
+    request_remaining REAL,
+    request_rate REAL,
+    token_limit REAL,
+    token_remaining REAL,
+    token_rate REAL
+);
+"""
+
+# Header names per provider family: (limit, remaining, reset) for requests, then for tokens.
+# OpenAI and Groq send reset as a duration ("6m0s", "20ms"), Anthropic as an RFC 3339 time.
+HEADERS = {
+    "x-ratelimit": (
+        ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests"),
+        ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens"),
+    ),
+    "anthropic": (
+        ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset"),
+        ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset"),
+    ),
+}
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value: str | None, now: float) -> float | None:
+    """Seconds until a limit resets, from "1m30.5s", "20ms", "12" or an RFC 3339 timestamp."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if parts:
+        return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        return max(0.0, datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() - now)
+    except ValueError:
+        return None
+
+
+def _number(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def limit_key(provider: str, api_key: str | None) -> str:
+    """Limits are per provider and API key; only a digest of the key is stored."""
+    digest = hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+    return f"{provider}:{digest}"
+
+
+def estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Providers count prompt tokens plus the requested completion budget against the token limit."""
+    return len(prompt) // 4 + max_tokens
+
+
+@dataclass
+class LimitState:
+    updated_at: float
+    blocked_until: float = 0.0
+    request_limit: float | None = None
+    request_remaining: float | None = None
+    request_rate: float | None = None
+    token_limit: float | None = None
+    token_remaining: float | None = None
+    token_rate: float | None = None
+
+    def refill(self, now: float):
+        """Both budgets refill continuously towards their limits at the rate the headers implied."""
+        elapsed = max(0.0, now - self.updated_at)
+        for kind in ("request", "token"):
+            limit, remaining = getattr(self, f"{kind}_limit"), getattr(self, f"{kind}_remaining")
+            if limit is not None and remaining is not None:
+                setattr(self, f"{kind}_remaining", min(limit, remaining + self._rate(kind) * elapsed))
+        self.updated_at = now
+
+    def _rate(self, kind: str) -> float:
+        rate = getattr(self, f"{kind}_rate")
+        # Until a partial window has been seen, assume the limit is per minute
+        return rate if rate else getattr(self, f"{kind}_limit") / 60
+
+    def wait(self, tokens: float, now: float) -> float:
+        """Seconds until one request of `tokens` fits; 0 when it fits now."""
+        waits = [self.blocked_until - now]
+        if self.request_remaining is not None and self.request_remaining < 1:
+            waits.append((1 - self.request_remaining) / self._rate("request"))
+        if self.token_remaining is not None and tokens:
+            # A request larger than the whole budget is let through once the bucket is full
+            needed = min(tokens, self.token_limit)
+            if self.token_remaining < needed:
+                waits.append((needed - self.token_remaining) / self._rate("token"))
+        return max(0.0, *waits)
+
+    def take(self, tokens: float):
+        if self.request_remaining is not None:
+            self.request_remaining -= 1
+        if self.token_remaining is not None:
+            self.token_remaining -= min(tokens, self.token_limit)
+
+
+def _state(row: sqlite3.Row, now: float) -> LimitState:
+    state = LimitState(**{name: row[name] for name in row.keys() if name != "key"})
+    state.refill(now)
+    return state
+
+
+class ProviderRateLimiter:
+    """
+    Client-side throttling from the providers' own rate-limit headers, shared by all worker processes.
+
+    Each (provider, API key) has a request budget and a token budget. `observe()`
+    records what the response headers say is left and how fast it comes back;
+    `acquire()` reserves one request and its estimated tokens, sleeping until the
+    budgets allow it. A 429 blocks the key until its Retry-After has passed.
+    State lives in one SQLite file and each reservation is a BEGIN IMMEDIATE
+    transaction, so every gunicorn worker draws from the same budget. Keys never
+    seen with headers are not throttled.
+    """
+
+    def __init__(self, path: str | None = settings.rate_limit_db, max_wait: float = settings.rate_limit_max_wait):
+        self.path = Path(path or Path(settings.output_dir) / "rate_limits.db")
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # Opened lazily and per process: a SQLite connection must not cross a fork
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _load(self, db: sqlite3.Connection, key: str, now: float) -> LimitState | None:
+        row = db.execute("SELECT * FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return _state(row, now) if row is not None else None
+
+    def _store(self, db: sqlite3.Connection, key: str, state: LimitState):
+        db.execute(
+            "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, state.updated_at, state.blocked_until, state.request_limit, state.request_remaining,
+             state.request_rate, state.token_limit, state.token_remaining, state.token_rate),
+        )
+
+    def reserve(self, provider: str, api_key: str | None, tokens: int = 0) -> float:
+        """Take one request and `tokens` from the budget if they fit; otherwise the seconds to wait."""
+        key, now = limit_key(provider, api_key), time.time()
+        with self._transaction() as db:
+            state = self._load(db, key, now)
+            if state is None:
+                return 0.0
+            wait = state.wait(tokens, now)
+            if wait == 0:
+                state.take(tokens)
+                self._store(db, key, state)
+            return wait
+
+    async def acquire(self, provider: str, api_key: str | None, tokens: int = 0):
+        """Wait until the provider's budgets have room for one request of `tokens`, then reserve it."""
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = await asyncio.to_thread(self.reserve, provider, api_key, tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise TimeoutError(f"{provider} rate limit: no budget within {self.max_wait}s")
+            # Jitter so workers woken by the same reset do not all retry at once
+            await asyncio.sleep(wait + random.uniform(0, 0.05))
+
+    def observe(self, provider: str, api_key: str | None, headers, status: int = 200):
+        """Record the budgets a response reports; a 429 blocks the key until Retry-After."""
+        now = time.time()
+        headers = {name.lower(): value for name, value in headers.items()}
+        found = {}
+        for family in HEADERS.values():
+            for kind, (limit_name, remaining_name, reset_name) in zip(("request", "token"), family):
+                limit, remaining = _number(headers.get(limit_name)), _number(headers.get(remaining_name))
+                if limit is not None and remaining is not None:
+                    found[kind] = (limit, remaining, parse_reset(headers.get(reset_name), now))
+        if not found and status != 429:
+            return
+        key = limit_key(provider, api_key)
+        with self._transaction() as db:
+            state = self._load(db, key, now) or LimitState(updated_at=now)
+            for kind, (limit, remaining, reset) in found.items():
+                # The provider's count predates requests other workers still have in flight, so
+                # requests never go up from our own count. Tokens take the provider's word: it
+                # settles our estimates (max_tokens is reserved, fewer are usually used)
+                local = state.request_remaining if kind == "request" else None
+                setattr(state, f"{kind}_limit", limit)
+                setattr(state, f"{kind}_remaining", remaining if local is None else min(local, remaining))
+                if reset and remaining < limit:
+                    setattr(state, f"{kind}_rate", (limit - remaining) / reset)
+            if status == 429:
+                retry_after = parse_reset(headers.get("retry-after-ms"), now)
+                retry_after = retry_after / 1000 if retry_after is not None else parse_reset(headers.get("retry-after"), now)
+                if retry_after is None:
+                    resets = [reset for limit, remaining, reset in found.values() if remaining < 1 and reset]
+                    retry_after = max(resets, default=1.0)
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+                if state.request_remaining is not None and state.request_remaining < 1:
+                    # Refilling during the block would release a burst when it ends: exactly one
+                    # request fits once Retry-After has passed, the rest follow at the refill rate
+                    state.request_remaining = 1 - state._rate("request") * (state.blocked_until - now)
+            self._store(db, key, state)
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            rows = self.db.execute("SELECT * FROM rate_limits").fetchall()
+        stats = {}
+        for row in rows:
+            state = _state(row, now)
+            stats[row["key"]] = {
+                "requests_remaining": state.request_remaining,
+                "requests_limit": state.request_limit,
+                "tokens_remaining": state.token_remaining,
+                "tokens_limit": state.token_limit,
+                "blocked_seconds": max(0.0, state.blocked_until - now),
+            }
+        return stats
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+rate_limiter = ProviderRateLimiter()
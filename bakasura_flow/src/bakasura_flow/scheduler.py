@@ -0,0 +1,390 @@
+"""
+One scheduler in front of every LLM call in the process.
+
+`/decompose`, `/generate-poem`, `/generate-news` and `/stream_college_essay` share the
+provider rate limits, so every call waits here for one of `max_concurrency` slots:
+
+- each tenant has a token bucket (`rate_per_minute`, `burst`); a tenant without a
+  token waits and does not hold up anybody else
+- among the requests that may go, weighted fair queuing picks the next one. Every
+  (tenant, priority) pair is a flow whose weight is its priority class weight, so
+  interactive work overtakes batch work without starving it, and a tenant with a
+  deep queue gets its share rather than the whole provider
+- queue wait times are recorded per priority and per tenant, see `stats()`
+
+The tenant and priority come from context variables that `TenantMiddleware` sets for
+each request. The tenant is the one its API key belongs to, else the client address;
+`X-Tenant-ID` and `X-Forwarded-For` count only from a trusted proxy. `X-Priority`
+may lower a request's priority, but not raise it above its tenant's cap. Context variables follow
+`asyncio.to_thread` into crew kickoffs, so the crew LLMs see the same values.
+Works from both threads (`slot()`) and coroutines (`aslot()`); the state is per
+process, so with several gunicorn workers each one schedules its own share.
+"""
+import asyncio
+import hmac
+import itertools
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Callable
+
+from bakasura_flow.config import settings
+
+logger = getLogger(__name__)
+
+PRIORITIES = ("interactive", "batch")
+DEFAULT_TENANT = "anonymous"
+
+current_tenant: ContextVar[str] = ContextVar("current_tenant", default=DEFAULT_TENANT)
+current_priority: ContextVar[str] = ContextVar("current_priority", default="interactive")
+
+
+@contextmanager
+def tenant_context(tenant: str | None = None, priority: str | None = None):
+    """Run a block (and the threads it starts with asyncio.to_thread) as tenant/priority."""
+    tokens = []
+    if tenant is not None:
+        tokens.append((current_tenant, current_tenant.set(tenant)))
+    if priority is not None:
+        tokens.append((current_priority, current_priority.set(_check_priority(priority))))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def _check_priority(priority: str) -> str:
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of {PRIORITIES}")
+    return priority
+
+
+@dataclass
+class TokenBucket:
+    rate: float  # tokens per second
+    capacity: float
+    tokens: float
+    updated: float = field(default_factory=time.monotonic)
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until_token(self) -> float:
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+@dataclass
+class _Waiter:
+    tenant: str
+    priority: str
+    start_tag: float
+    finish_tag: float
+    seq: int
+    wake: Callable[[], None]
+    enqueued: float = field(default_factory=time.monotonic)
+    granted: bool = False
+
+
+class WaitStats:
+    """Queue wait times for one priority class or tenant; keeps recent samples for percentiles."""
+
+    def __init__(self, samples: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent: deque[float] = deque(maxlen=samples)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+        if len(recent) >= 2:
+            cuts = statistics.quantiles(recent, n=100, method="inclusive")
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = recent[0] if recent else None
+        return {
+            "requests": self.count,
+            "wait_seconds_total": self.total,
+            "wait_seconds_mean": self.total / self.count if self.count else None,
+            "wait_seconds_max": self.max,
+            "wait_seconds_p50": p50,
+            "wait_seconds_p95": p95,
+            "wait_seconds_p99": p99,
+        }
+
+
+class LLMScheduler:
+    """Concurrency slots handed out by per-tenant token buckets and weighted fair queuing."""
+
+    # Tenants idle for this long (with full buckets) are forgotten
+    IDLE_TENANT_SECONDS = 600
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.llm_max_concurrency,
+        rate_per_minute: float = settings.tenant_rate_per_minute,
+        burst: int = settings.tenant_burst,
+        weights: dict[str, float] | None = None,
+        queue_timeout: float = settings.llm_queue_timeout,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.weights = weights or {
+            "interactive": settings.scheduler_interactive_weight,
+            "batch": settings.scheduler_batch_weight,
+        }
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._waiting: list[_Waiter] = []
+        self._in_flight = 0
+        self._virtual_time = 0.0
+        self._last_finish: dict[tuple[str, str], float] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._seq = itertools.count()
+        self._timer: threading.Timer | None = None
+        self._timer_due = float("inf")
+        self._waits = {priority: WaitStats() for priority in PRIORITIES}
+        self._tenant_waits: dict[str, WaitStats] = {}
+        self._tenant_seen: dict[str, float] = {}
+
+    def _bucket(self, tenant: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(tenant)
+        if bucket is None:
+            bucket = self._buckets[tenant] = TokenBucket(self.rate, self.burst, self.burst, now)
+        else:
+            bucket.refill(now)
+        return bucket
+
+    def _enqueue(self, wake: Callable[[], None]) -> _Waiter:
+        tenant, priority = current_tenant.get(), current_priority.get()
+        flow = (tenant, priority)
+        with self._lock:
+            # Start-time fair queuing: a flow that was idle starts at the current virtual time
+            start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+            finish = start + 1 / self.weights[priority]
+            self._last_finish[flow] = finish
+            waiter = _Waiter(tenant, priority, start, finish, next(self._seq), wake)
+            self._waiting.append(waiter)
+            self._dispatch()
+        return waiter
+
+    def _dispatch(self):
+        """Grant free slots to the eligible waiters with the smallest finish tags. Holds self._lock."""
+        now = time.monotonic()
+        while self._waiting and self._in_flight < self.max_concurrency:
+            eligible = [w for w in self._waiting if self._bucket(w.tenant, now).tokens >= 1]
+            if not eligible:
+                delay = min(self._bucket(w.tenant, now).seconds_until_token() for w in self._waiting)
+                self._wake_later(now, delay)
+                return
+            waiter = min(eligible, key=lambda w: (w.finish_tag, w.seq))
+            self._waiting.remove(waiter)
+            self._buckets[waiter.tenant].tokens -= 1
+            self._in_flight += 1
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            waiter.granted = True
+            waited = now - waiter.enqueued
+            self._waits[waiter.priority].add(waited)
+            self._tenant_waits.setdefault(waiter.tenant, WaitStats(samples=128)).add(waited)
+            self._tenant_seen[waiter.tenant] = now
+            waiter.wake()
+        self._forget_idle(now)
+
+    def _wake_later(self, now: float, delay: float):
+        due = now + delay
+        if self._timer is not None and self._timer_due <= due:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_due = due
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._timer_due = float("inf")
+            self._dispatch()
+
+    def _forget_idle(self, now: float):
+        if len(self._tenant_seen) < 1024:
+            return
+        busy = {w.tenant for w in self._waiting}
+        for tenant, seen in list(self._tenant_seen.items()):
+            if tenant not in busy and now - seen > self.IDLE_TENANT_SECONDS:
+                del self._tenant_seen[tenant]
+                self._buckets.pop(tenant, None)
+                self._tenant_waits.pop(tenant, None)
+                for priority in PRIORITIES:
+                    self._last_finish.pop((tenant, priority), None)
+
+    def _cancel(self, waiter: _Waiter) -> bool:
+        """Withdraw a waiter; returns True when it had been granted a slot in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiting.remove(waiter)
+            return False
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, timeout: float | None = None):
+        """Hold one LLM call slot from a worker thread."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        granted = threading.Event()
+        waiter = self._enqueue(granted.set)
+        if not granted.wait(timeout) and not self._cancel(waiter):
+            raise TimeoutError(f"No LLM slot for tenant {waiter.tenant!r} after {timeout}s")
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, timeout: float | None = None):
+        """Hold one LLM call slot from a coroutine, without blocking the event loop."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(wake)
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout)
+        except asyncio.TimeoutError:
+            if not self._cancel(waiter):
+                raise TimeoutError(f"No LLM slot for tenant {waiter.tenant!r} after {timeout}s")
+        except BaseException:
+            # Cancelled while queued: give the slot back if it was granted meanwhile
+            if self._cancel(waiter):
+                self._release()
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queued": {
+                    priority: sum(w.priority == priority for w in self._waiting) for priority in PRIORITIES
+                },
+                "wait": {priority: stats.snapshot() for priority, stats in self._waits.items()},
+                "tenants": {
+                    tenant: {
+                        **stats.snapshot(),
+                        "tokens": round(self._bucket(tenant, now).tokens, 2),
+                        "queued": sum(w.tenant == tenant for w in self._waiting),
+                    }
+                    for tenant, stats in self._tenant_waits.items()
+                },
+            }
+
+
+class TenantMiddleware:
+    """
+    ASGI middleware: put the tenant and priority of each HTTP request into the context.
+
+    Client headers are not trusted to name a tenant, or a caller could spend another
+    tenant's budget or jump the queue. A request with an API key from `api_keys` is
+    that key's tenant (an unknown key gets a 401); any other request is its client
+    address. Only a proxy in `trusted_proxies` may name the tenant with X-Tenant-ID or
+    pass the client address on in X-Forwarded-For. X-Priority is capped at the
+    tenant's entry in `max_priority`, or `default_max_priority`.
+    """
+
+    def __init__(self, app, api_keys: dict[str, str] | None = None, trusted_proxies: list[str] | None = None,
+                 max_priority: dict[str, str] | None = None,
+                 default_max_priority: str = settings.default_max_priority):
+        self.app = app
+        self.api_keys = settings.tenant_api_keys if api_keys is None else api_keys
+        self.trusted_proxies = set(settings.trusted_proxies if trusted_proxies is None else trusted_proxies)
+        self.max_priority = {
+            tenant: _check_priority(priority)
+            for tenant, priority in (settings.tenant_max_priority if max_priority is None else max_priority).items()
+        }
+        self.default_max_priority = _check_priority(default_max_priority)
+
+    def _api_key(self, headers: dict) -> str:
+        authorization = headers.get(b"authorization", b"").decode("latin-1").strip()
+        if authorization[:7].lower() == "bearer ":
+            return authorization[7:].strip()
+        return headers.get(b"x-api-key", b"").decode("latin-1").strip()
+
+    def _authenticated(self, key: str) -> str | None:
+        # Compare every key in constant time, so response times don't reveal a valid prefix
+        tenant = None
+        for known, name in self.api_keys.items():
+            if hmac.compare_digest(known.encode(), key.encode()):
+                tenant = name
+        return tenant
+
+    def _client_address(self, scope, headers: dict) -> str | None:
+        address = scope["client"][0] if scope.get("client") else None
+        if address in self.trusted_proxies:
+            # The nearest hop the proxies did not add themselves is the real client
+            forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1").split(",")
+            for hop in reversed([hop.strip() for hop in forwarded if hop.strip()]):
+                if hop not in self.trusted_proxies:
+                    return hop
+        return address
+
+    def tenant(self, scope, headers: dict) -> str | None:
+        """The tenant of a request; None when it carries an API key nobody was given."""
+        key = self._api_key(headers)
+        if key and self.api_keys:
+            return self._authenticated(key)
+        client = scope["client"][0] if scope.get("client") else None
+        if client in self.trusted_proxies:
+            claimed = headers.get(b"x-tenant-id", b"").decode("latin-1").strip()
+            if claimed:
+                return claimed
+        return self._client_address(scope, headers) or DEFAULT_TENANT
+
+    def priority(self, tenant: str, headers: dict) -> str:
+        priority = headers.get(b"x-priority", b"interactive").decode("latin-1").strip().lower()
+        if priority not in PRIORITIES:
+            priority = "interactive"
+        cap = self.max_priority.get(tenant, self.default_max_priority)
+        # PRIORITIES runs from the highest class down
+        return max(priority, cap, key=PRIORITIES.index)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        tenant = self.tenant(scope, headers)
+        if tenant is None:
+            await send({"type": "http.response.start", "status": 401,
+                        "headers": [(b"content-type", b"text/plain"), (b"www-authenticate", b"Bearer")]})
+            await send({"type": "http.response.body", "body": b"Unknown API key"})
+            return
+        with tenant_context(tenant, self.priority(tenant, headers)):
+            return await self.app(scope, receive, send)
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,286 @@
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Hashable
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+WORD = re.compile(r"[a-z0-9]+")
+# Words that change the phrasing of a question but not what it is about
+STOPWORDS = frozenset(
+    "a an and are can could do does for i in is it me of on or should tell the to was "
+    "will with would about explain".split()
+)
+# Words that change what is asked: two queries must agree on them to share a result
+INTERROGATIVES = frozenset("what when where which who whom whose why how".split())
+NEGATIONS = frozenset("not no never without nor cannot dont doesnt isnt shouldnt avoid against".split())
+# Left out of the vectors; same_question() compares them word for word instead
+IGNORED = STOPWORDS | INTERROGATIVES
+
+
+def _content_words(text: str) -> set[str]:
+    return {w for w in WORD.findall(text.lower().replace("'", "").replace("’", ""))
+            if len(w) > 1 and w not in STOPWORDS}
+
+
+def _matches(word: str, words: set[str]) -> bool:
+    # Same stem, roughly: "queens"/"queen", "defence"/"defense", "played"/"play"
+    return any(word[:4] == other[:4] for other in words)
+
+
+def same_question(a: str, b: str) -> bool:
+    """
+    Word-level check on top of the vector similarity: both queries ask the same kind of
+    question, with the same negations, and neither swaps a topic word for another.
+    "What is the London System" / "Who is the London System for", "Should I play the
+    Sicilian" / "Should I not play the Sicilian" and "Berlin endgame" / "Berlin
+    middlegame" all fail it; "sicilian dragon" / "Dragon variation of the Sicilian" passes.
+    """
+    words_a, words_b = _content_words(a), _content_words(b)
+    asked_a, asked_b = words_a & INTERROGATIVES, words_b & INTERROGATIVES
+    if asked_a and asked_b and asked_a != asked_b:
+        return False
+    if (len(words_a & NEGATIONS) + len(words_b & NEGATIONS)) % 2:
+        return False
+    topic_a, topic_b = words_a - INTERROGATIVES - NEGATIONS, words_b - INTERROGATIVES - NEGATIONS
+    # Extra words on one side are a rephrasing; unmatched words on both sides are a substitution
+    only_a = [w for w in topic_a if not _matches(w, topic_b)]
+    only_b = [w for w in topic_b if not _matches(w, topic_a)]
+    return not (only_a and only_b)
+
+
+class NgramVectorizer:
+    """
+    Hashed character n-grams of each word, signed and L2-normalized.
+
+    Words are padded ("<dragon>") so prefixes and suffixes count, stopwords are
+    dropped and word order does not matter, which is what makes "sicilian dragon"
+    and "Dragon variation of the Sicilian" close. No model, no fitting, CPU only.
+    """
+
+    def __init__(self, dim: int = 4096, ngram_range: tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> list[str]:
+        words = [w for w in WORD.findall(text.lower()) if w not in IGNORED] or WORD.findall(text.lower())
+        features = []
+        low, high = self.ngram_range
+        for word in words:
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 is stable across processes, unlike hash()
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(vectors)
+
+
+class SentenceTransformerVectorizer:
+    """A small local embedding model (e.g. all-MiniLM-L6-v2) run on the CPU; needs sentence-transformers."""
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                f"Embedder {model_name!r} needs sentence-transformers; install it or use the 'ngram' embedder"
+            ) from e
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        return _normalize(self.model.encode(texts, convert_to_numpy=True).astype(np.float32))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def make_vectorizer(embedder: str):
+    return NgramVectorizer() if embedder == "ngram" else SentenceTransformerVectorizer(embedder)
+
+
+class LSHIndex:
+    """
+    Approximate nearest neighbours for unit vectors: random-hyperplane LSH over several tables.
+
+    Each table hashes a vector to the signs of `bits` random projections; vectors
+    with a high cosine similarity agree on most signs, so they share a bucket in at
+    least one table with high probability. Only those candidates are scored exactly.
+    Vectors are kept sparse, as the indices and values of their non-zero entries per
+    slot: an n-gram vector has a few dozen of its 4096 dimensions set.
+    """
+
+    def __init__(self, dim: int, capacity: int, tables: int = 20, bits: int = 10, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.tables = tables
+        self.planes = rng.standard_normal((dim, tables * bits)).astype(np.float32)
+        self.powers = 1 << np.arange(bits, dtype=np.int64)
+        self.bits = bits
+        self.index_dtype = np.int16 if dim <= np.iinfo(np.int16).max else np.int32
+        self.vectors: list[tuple[np.ndarray, np.ndarray] | None] = [None] * capacity
+        self.buckets: list[dict[int, set[int]]] = [{} for _ in range(tables)]
+        self.codes = np.zeros((capacity, tables), dtype=np.int64)
+
+    def _codes(self, vector: np.ndarray) -> np.ndarray:
+        signs = (vector @ self.planes > 0).reshape(self.tables, self.bits)
+        return signs @ self.powers
+
+    def add(self, slot: int, vector: np.ndarray):
+        indices = np.flatnonzero(vector)
+        self.vectors[slot] = (indices.astype(self.index_dtype), vector[indices])
+        self.codes[slot] = self._codes(vector)
+        for table, code in zip(self.buckets, self.codes[slot]):
+            table.setdefault(int(code), set()).add(slot)
+
+    def remove(self, slot: int):
+        for table, code in zip(self.buckets, self.codes[slot]):
+            members = table.get(int(code))
+            if members is not None:
+                members.discard(slot)
+                if not members:
+                    del table[int(code)]
+        self.vectors[slot] = None
+
+    def score(self, slots: np.ndarray, vector: np.ndarray) -> np.ndarray:
+        """Cosine similarities of the vectors in `slots` to `vector`."""
+        stored = [self.vectors[slot] for slot in slots.tolist()]
+        lengths = np.fromiter((len(indices) for indices, _ in stored), dtype=np.int64, count=len(stored))
+        if not lengths.sum():
+            return np.zeros(len(stored), dtype=np.float32)
+        indices = np.concatenate([indices for indices, _ in stored])
+        products = np.concatenate([values for _, values in stored]) * vector[indices]
+        # Sum each slot's run of products; empty runs (all-zero vectors) score 0
+        sums = np.add.reduceat(products, np.concatenate(([0], np.cumsum(lengths)[:-1])))
+        return np.where(lengths > 0, sums, 0).astype(np.float32)
+
+    def query(self, vector: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Candidate slots and their cosine similarities to `vector`."""
+        candidates = set()
+        for table, code in zip(self.buckets, self._codes(vector).tolist()):
+            candidates.update(table.get(code, ()))
+        if not candidates:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        slots = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        return slots, self.score(slots, vector)
+
+
+@dataclass
+class SemanticEntry:
+    query: str
+    namespace: Hashable
+    value: Any
+    slot: int
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class SemanticCache:
+    """
+    Serves a cached result for a query that is phrased differently but means the same.
+
+    `get()` embeds the query, looks up its nearest cached neighbours in the LSH index
+    and returns the best one's value when its cosine similarity reaches `threshold`,
+    it was stored under the same namespace (e.g. the model) and `same_question()`
+    finds no question word, negation or topic word that tells the two apart. Entries are evicted
+    least recently used once `max_entries` is reached, or after `ttl_seconds`.
+    Safe to call from several threads; queries are embedded outside the lock.
+    """
+
+    def __init__(self, embedder: str = "ngram", threshold: float = 0.8, max_entries: int = 10000,
+                 ttl_seconds: float | None = None):
+        self.vectorize = make_vectorizer(embedder)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.index = LSHIndex(self.vectorize.dim, max_entries)
+        self._entries: OrderedDict[int, SemanticEntry] = OrderedDict()
+        self._slots: dict[tuple[Hashable, str], int] = {}
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.evictions = 0
+        self.hit_similarity_total = 0.0
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: SemanticEntry) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _evict(self, slot: int):
+        entry = self._entries.pop(slot)
+        del self._slots[entry.namespace, entry.query]
+        self.index.remove(slot)
+        self._free.append(slot)
+
+    def get(self, query: str, namespace: Hashable = None) -> Any | None:
+        """The cached value of the most similar past query, or None on a miss."""
+        vector = self.vectorize([query])[0]
+        with self._lock:
+            return self._get(query, namespace, vector)
+
+    def _get(self, query: str, namespace: Hashable, vector) -> Any | None:
+        slots, similarities = self.index.query(vector)
+        best, best_similarity = None, 0.0
+        above = similarities >= self.threshold
+        for slot, similarity in sorted(zip(slots[above].tolist(), similarities[above].tolist()),
+                                       key=lambda pair: -pair[1]):
+            entry = self._entries[slot]
+            if entry.namespace != namespace or self._expired(entry):
+                continue
+            if not same_question(query, entry.query):
+                self.rejected += 1
+                continue
+            best, best_similarity = entry, similarity
+            break
+        if best is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(best.slot)
+        self.hits += 1
+        self.exact_hits += best.query == query
+        self.hit_similarity_total += best_similarity
+        logger.info(f"Semantic cache hit ({best_similarity:.2f}): {query!r} ~ {best.query!r}")
+        return best.value
+
+    def put(self, query: str, value: Any, namespace: Hashable = None):
+        vector = self.vectorize([query])[0]
+        with self._lock:
+            if (namespace, query) in self._slots:
+                self._evict(self._slots[namespace, query])
+            if not self._free:
+                self._evict(next(iter(self._entries)))
+                self.evictions += 1
+            slot = self._free.pop()
+            self._entries[slot] = SemanticEntry(query, namespace, value, slot)
+            self._slots[namespace, query] = slot
+            self.index.add(slot, vector)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "rejected": self.rejected,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "mean_hit_similarity": self.hit_similarity_total / self.hits if self.hits else None,
+        }
@@ -1,6 +1,54 @@
 #pdf.add_font('DejaVu', '', '/usr/share/fonts/dejavu-sans-fonts/DejaVuSans.ttf', uni=True)
+import re
+
 import fpdf
 
+LINE_HEIGHT = 5  # Reduced line height to 5
+PARAGRAPH_GAP = 2  # Minimal spacing between paragraphs
+
+# UTF-8 text that was decoded as cp1252 ("\u00e2\u20ac\u2122" for "\u2019"): a lead byte character
+# followed by as many continuation byte characters as that lead byte announces
+_CONTINUATION = (
+    "[\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u02c6\u02dc"
+    "\u2013\u2014\u2018-\u201a\u201c-\u201e\u2020-\u2022\u2026\u2030\u2039\u203a\u20ac\u2122]"
+)
+MOJIBAKE = re.compile(
+    f"[\u00c2-\u00df]{_CONTINUATION}|[\u00e0-\u00ef]{_CONTINUATION}{{2}}|[\u00f0-\u00f4]{_CONTINUATION}{{3}}"
+)
+# Unusual spaces become plain spaces and invisible characters are dropped. A chain of
+# str.replace calls guarded by `in` beats str.translate here: translate maps one character
+# at a time through a dict as soon as the text is not pure Latin-1
+REPLACEMENTS = (
+    ("\u00a0", " "), ("\u2007", " "), ("\u2009", " "), ("\u200a", " "), ("\u202f", " "),
+    ("\t", " "), ("\f", " "), ("\v", " "),
+    ("\u200b", ""), ("\u200c", ""), ("\u200d", ""), ("\u00ad", ""), ("\ufeff", ""), ("\r", ""),
+)
+# The bytes cp1252 leaves undefined. Decoders that let them through keep each as the
+# code point of the same value, so "\u00e2\u20ac\u009d" is the mojibake of "\u201d"
+_UNDEFINED_CP1252 = {chr(b): bytes([b]) for b in (0x81, 0x8d, 0x8f, 0x90, 0x9d)}
+SPACE_RUNS = re.compile("  +")
+BLANK_LINES = re.compile(r"\n{2,}")
+
+
+def _repair_mojibake(match: re.Match) -> str:
+    try:
+        return b"".join(_UNDEFINED_CP1252.get(c) or c.encode("cp1252") for c in match.group()).decode("utf-8")
+    except UnicodeError:
+        return match.group()  # not actually mojibake, e.g. "Ã" followed by "©" on purpose
+
+
+def write_paragraphs(pdf: fpdf.FPDF, text: str, width: float = 190):
+    """Lay out normalized text with one multi_cell per paragraph; blank lines become vertical space."""
+    position = 0
+    for match in BLANK_LINES.finditer(text):
+        if match.start() > position:
+            pdf.multi_cell(width, LINE_HEIGHT, txt=text[position:match.start()], align='L')
+        pdf.ln((len(match.group()) - 1) * (LINE_HEIGHT + PARAGRAPH_GAP))
+        position = match.end()
+    if position < len(text):
+        pdf.multi_cell(width, LINE_HEIGHT, txt=text[position:], align='L')
+
+
 class PDFConversionTool:
     name = "PDF Conversion Tool"
     description = "Converts a text file to a PDF file"
@@ -17,18 +65,18 @@ class PDFConversionTool:
         return self._run()
 
     def clean_text(self, text: str) -> str:
-        replacements = {
-            'â€™': "'",
-            '?': "'",
-            '\u00A0': ' '  # Replace non-breaking spaces with regular spaces
-        }
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        
-        # Remove extra spaces and newlines
-        text = text.strip()  # Remove leading and trailing spaces
-        text = ' '.join(text.split())  # Replace multiple spaces/newlines with a single space
-        return text
+        """
+        Normalize a whole document in a few passes: repair mojibake, map odd spaces and
+        drop invisible characters, then collapse runs of spaces. Line breaks are kept.
+        """
+        if not text.isascii():
+            text = MOJIBAKE.sub(_repair_mojibake, text)
+        for old, new in REPLACEMENTS:
+            if old in text:
+                text = text.replace(old, new)
+        text = SPACE_RUNS.sub(" ", text)
+        # Runs are single spaces now, so trimming line edges is two plain replaces
+        return text.replace(" \n", "\n").replace("\n ", "\n").strip()
 
     def text_to_pdf(self):
         pdf = fpdf.FPDF()
@@ -45,12 +93,6 @@ class PDFConversionTool:
         pdf.set_top_margin(10)
 
         with open(self.input_file_path, "r", encoding='utf-8') as file:
-            for line in file:
-                clean_line = self.clean_text(line.rstrip('\n'))
-                pdf.multi_cell(190, 5, txt=clean_line, align='L')  # Reduced line height to 5
-                
-                # Add minimal spacing between paragraphs
-                if clean_line.strip() == "":
-                    pdf.ln(2)
+            write_paragraphs(pdf, self.clean_text(file.read()))
 
         pdf.output(self.output_file_path)
@@ -0,0 +1,465 @@
+"""
+Spans for everything a poem, news, decomposition or essay request spends its time on.
+
+A span is a named, timed unit of work with a parent, in the OpenTelemetry data model
+(trace id, span id, parent span id, start and end in Unix nanoseconds, attributes,
+status):
+
+- `TracingMiddleware` opens one root span per HTTP request
+- `span()` and `traced()` wrap our own work: LLM calls, file conversion, crew memory,
+  PDF rendering; `record_span()` adds spans timed elsewhere, e.g. in a worker process
+- `instrument_crewai()` turns crewai's events into spans for flow steps, crew
+  kickoffs, task and agent execution and tool calls
+
+The current span is a context variable, so children find their parent across
+`asyncio.to_thread`, tasks and `contextvars.copy_context().run`. Finished spans go to
+a bounded in-memory buffer of recent traces, which `slow_traces()` folds into
+flame-graph summaries, and to the exporters named in `settings.trace_exporters`:
+"json" appends OTLP-shaped spans to a JSON-lines file, "otlp" posts them to a local
+collector over OTLP/HTTP JSON. Exports are batched on a background thread and never
+block a request. The buffer is per process: with several gunicorn workers each one
+summarizes the requests it served.
+"""
+import asyncio
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging import getLogger
+from pathlib import Path
+from typing import Any
+
+from bakasura_flow.config import settings
+
+logger = getLogger(__name__)
+
+EXPORTERS = ("json", "otlp")
+MAX_SPANS_PER_TRACE = 5000
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def duration_ms(self, now_ns: int | None = None) -> float:
+        return ((self.end_ns or now_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def otlp(self) -> dict:
+        """The span as an OTLP/JSON span object."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Creates spans, keeps the recent traces of this process and hands finished spans to the exporters."""
+
+    def __init__(self, enabled: bool = settings.tracing_enabled, exporters: str = settings.trace_exporters,
+                 json_path: str | None = settings.trace_json_path, otlp_endpoint: str = settings.trace_otlp_endpoint,
+                 max_traces: int = settings.trace_buffer_traces, service_name: str = settings.trace_service_name):
+        self.enabled = enabled
+        self.exporters = [name.strip() for name in exporters.split(",") if name.strip()]
+        unknown = set(self.exporters) - set(EXPORTERS)
+        if unknown:
+            raise ValueError(f"Unknown trace exporters {', '.join(sorted(unknown))}; use {', '.join(EXPORTERS)}")
+        self.json_path = Path(json_path or Path(settings.output_dir) / "traces.jsonl")
+        self.otlp_endpoint = otlp_endpoint
+        self.max_traces = max_traces
+        self.service_name = service_name
+        self._traces: OrderedDict[str, list[Span]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Oldest spans are dropped if the exporters cannot keep up
+        self._pending: deque[Span] = deque(maxlen=10000)
+        self._wake = threading.Event()
+        self._exporter_pid: int | None = None
+        self._last_export_error = 0.0
+        self.exported = 0
+
+    def start(self, name: str, parent: Span | None = None, **attributes) -> Span:
+        """A new span, a child of `parent` or else of the current span; it is not made current."""
+        parent = parent or current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+
+    def end(self, span: Span, error: str | None = None):
+        span.end_ns = time.time_ns()
+        if error:
+            span.error = error
+        self._finish(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, parent: Span | None = None, **attributes) -> Span | None:
+        """Add a span that was timed elsewhere, e.g. a phase of work done in another process."""
+        if not self.enabled:
+            return None
+        span = self.start(name, parent, **attributes)
+        span.start_ns, span.end_ns = start_ns, end_ns
+        self._finish(span)
+        return span
+
+    def _finish(self, span: Span):
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            if len(spans) < MAX_SPANS_PER_TRACE:
+                spans.append(span)
+        if self.exporters:
+            self._pending.append(span)
+            self._ensure_exporter()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Run the block in a new child span of the current one; yields the span (None when tracing is off)."""
+        if not self.enabled:
+            yield None
+            return
+        span = self.start(name, **attributes)
+        token = current_span.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            current_span.reset(token)
+            self.end(span, error)
+
+    def traced(self, name: str | None = None):
+        """Decorator: run every call of a function or coroutine function in a span named `name`."""
+        def decorator(fn):
+            span_name = name or fn.__qualname__
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # Exporting
+
+    def _ensure_exporter(self):
+        # Started lazily and per process: a thread does not survive a fork
+        if self._exporter_pid != os.getpid():
+            with self._lock:
+                if self._exporter_pid != os.getpid():
+                    self._exporter_pid = os.getpid()
+                    threading.Thread(target=self._export_loop, name="trace-exporter", daemon=True).start()
+        if len(self._pending) >= 512:
+            self._wake.set()
+
+    def _export_loop(self):
+        while True:
+            self._wake.wait(timeout=1.0)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Export every pending span now."""
+        batch = []
+        while self._pending:
+            try:
+                batch.append(self._pending.popleft())
+            except IndexError:
+                break
+        if not batch:
+            return
+        try:
+            if "json" in self.exporters:
+                self._export_json(batch)
+            if "otlp" in self.exporters:
+                self._export_otlp(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            # A missing collector must not flood the log: report at most once a minute
+            if time.monotonic() - self._last_export_error > 60:
+                self._last_export_error = time.monotonic()
+                logger.warning(f"Dropped {len(batch)} spans: export failed: {e}")
+
+    def _resource(self) -> dict:
+        return {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}},
+                               {"key": "process.pid", "value": {"intValue": str(os.getpid())}}]}
+
+    def _export_json(self, batch: list[Span]):
+        lines = "".join(json.dumps({"service": self.service_name, **span.otlp()}, default=str) + "\n" for span in batch)
+        self.json_path.parent.mkdir(parents=True, exist_ok=True)
+        # One O_APPEND write per batch, so workers appending to the same file do not interleave
+        fd = os.open(self.json_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, lines.encode())
+        finally:
+            os.close(fd)
+
+    def _export_otlp(self, batch: list[Span]):
+        body = json.dumps({"resourceSpans": [{
+            "resource": self._resource(),
+            "scopeSpans": [{"scope": {"name": "bakasura_flow"}, "spans": [span.otlp() for span in batch]}],
+        }]}, default=str).encode()
+        request = urllib.request.Request(self.otlp_endpoint, body, {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+    # Summaries
+
+    def trace(self, trace_id: str) -> list[dict] | None:
+        """Every buffered span of one trace, OTLP-shaped, in start order."""
+        with self._lock:
+            spans = list(self._traces.get(trace_id, ()))
+        if not spans:
+            return None
+        return [span.otlp() for span in sorted(spans, key=lambda s: s.start_ns)]
+
+    def slow_traces(self, min_ms: float = 0, limit: int = 10) -> list[dict]:
+        """The slowest finished traces in the buffer, longest first, each with its flame-graph tree."""
+        with self._lock:
+            traces = [list(spans) for spans in self._traces.values()]
+        summaries = []
+        for spans in traces:
+            roots = _roots(spans)
+            if not roots or any(root.end_ns is None for root in roots):
+                continue
+            root = max(roots, key=lambda s: s.duration_ms())
+            if root.duration_ms() >= min_ms:
+                summaries.append((root, spans))
+        summaries.sort(key=lambda pair: pair[0].duration_ms(), reverse=True)
+        return [
+            {
+                "trace_id": root.trace_id,
+                "name": root.name,
+                "start": root.start_ns / 1e9,
+                "duration_ms": root.duration_ms(),
+                "error": root.error,
+                "spans": len(spans),
+                "flame": flame_tree(spans),
+            }
+            for root, spans in summaries[:limit]
+        ]
+
+    def folded(self, min_ms: float = 0, limit: int = 10) -> str:
+        """The slowest traces as folded stacks ("root;child;leaf self_ms"), for flamegraph.pl or speedscope."""
+        lines: dict[str, float] = {}
+        for summary in self.slow_traces(min_ms, limit):
+            _fold(summary["flame"], [], lines)
+        return "".join(f"{stack} {round(ms)}\n" for stack, ms in lines.items() if round(ms) > 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            traces, spans = len(self._traces), sum(map(len, self._traces.values()))
+        return {"enabled": self.enabled, "exporters": self.exporters, "traces": traces, "spans": spans,
+                "pending_export": len(self._pending), "exported": self.exported}
+
+
+def _roots(spans: list[Span]) -> list[Span]:
+    """Spans whose parent is not in the trace: the root, and orphans whose parent was not kept."""
+    ids = {span.span_id for span in spans}
+    return [span for span in spans if span.parent_id not in ids]
+
+
+def flame_tree(spans: list[Span]) -> list[dict]:
+    """
+    Spans merged into a flame-graph tree: siblings with the same name become one node
+    with a call count, total and self time (total minus children, floored at 0 when
+    children ran in parallel).
+    """
+    now = time.time_ns()
+    children: dict[str | None, list[Span]] = {}
+    ids = {span.span_id for span in spans}
+    for span in spans:
+        children.setdefault(span.parent_id if span.parent_id in ids else None, []).append(span)
+
+    def build(group: list[Span]) -> list[dict]:
+        by_name: dict[str, list[Span]] = {}
+        for span in group:
+            by_name.setdefault(span.name, []).append(span)
+        nodes = []
+        for name, same in by_name.items():
+            kids = build([child for span in same for child in children.get(span.span_id, ())])
+            total = sum(span.duration_ms(now) for span in same)
+            nodes.append({
+                "name": name,
+                "count": len(same),
+                "total_ms": round(total, 3),
+                "self_ms": round(max(0.0, total - sum(kid["total_ms"] for kid in kids)), 3),
+                "errors": sum(span.error is not None for span in same),
+                "children": kids,
+            })
+        return sorted(nodes, key=lambda node: node["total_ms"], reverse=True)
+
+    return build(children.get(None, []))
+
+
+def _fold(nodes: list[dict], stack: list[str], lines: dict[str, float]):
+    for node in nodes:
+        path = stack + [node["name"].replace(";", ",").replace(" ", "_")]
+        key = ";".join(path)
+        lines[key] = lines.get(key, 0.0) + node["self_ms"]
+        _fold(node["children"], path, lines)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: run each HTTP request in a root span, renamed to its route once
+    routing has matched. The trace id is returned in an X-Trace-ID header, for /traces/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            return await self.app(scope, receive, send)
+        with tracer.span(f"{scope['method']} {scope['path']}", **{
+            "http.method": scope["method"], "http.target": scope["path"]
+        }) as span:
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set(**{"http.status_code": message["status"]})
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"x-trace-id", span.trace_id.encode())]}
+                    if message["status"] >= 500:
+                        span.error = f"HTTP {message['status']}"
+                await send(message)
+
+            try:
+                return await self.app(scope, receive, send_with_status)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.name = f"{scope['method']} {route}"
+
+
+_crewai_instrumented = False
+
+
+def instrument_crewai():
+    """
+    Open and close spans on crewai's events: flows and their steps, crew kickoffs,
+    tasks, agent executions and tool calls. crewai emits these synchronously on the
+    thread doing the work, so each span becomes the current one until its finishing
+    event and the LLM calls made meanwhile nest under it. Safe to call more than once;
+    a crewai without the event bus is left untraced.
+    """
+    global _crewai_instrumented
+    if _crewai_instrumented or not tracer.enabled:
+        return
+    try:
+        from crewai.utilities.events import (
+            AgentExecutionCompletedEvent, AgentExecutionStartedEvent, CrewKickoffCompletedEvent,
+            CrewKickoffFailedEvent, CrewKickoffStartedEvent, FlowFinishedEvent, FlowStartedEvent,
+            MethodExecutionFailedEvent, MethodExecutionFinishedEvent, MethodExecutionStartedEvent,
+            TaskCompletedEvent, TaskFailedEvent, TaskStartedEvent, ToolUsageErrorEvent,
+            ToolUsageFinishedEvent, ToolUsageStartedEvent, crewai_event_bus,
+        )
+    except ImportError:
+        logger.info("crewai has no event bus; flows, crews, tasks and tools are not traced")
+        return
+    _crewai_instrumented = True
+    opened: dict[tuple, tuple[Span, Any, Span | None]] = {}
+    lock = threading.Lock()
+
+    def open_span(key: tuple, name: str, **attributes):
+        span = tracer.start(name, **attributes)
+        previous = current_span.get()
+        with lock:
+            opened[key] = (span, current_span.set(span), previous)
+
+    def close_span(key: tuple, error=None):
+        with lock:
+            entry = opened.pop(key, None)
+        if entry is None:
+            return
+        span, token, previous = entry
+        try:
+            current_span.reset(token)
+        except ValueError:
+            # Finished in another context than it started in
+            current_span.set(previous)
+        tracer.end(span, f"{error}" if error else None)
+
+    def task_name(task) -> str:
+        return getattr(task, "name", None) or (getattr(task, "description", "") or "task")[:60]
+
+    on = crewai_event_bus.on
+    on(FlowStartedEvent)(lambda source, event: open_span(("flow", id(source)), f"flow {event.flow_name}"))
+    on(FlowFinishedEvent)(lambda source, event: close_span(("flow", id(source))))
+    on(MethodExecutionStartedEvent)(lambda source, event: open_span(
+        ("step", id(source), event.method_name), f"{event.flow_name}.{event.method_name}"))
+    on(MethodExecutionFinishedEvent)(lambda source, event: close_span(("step", id(source), event.method_name)))
+    on(MethodExecutionFailedEvent)(lambda source, event: close_span(
+        ("step", id(source), event.method_name), getattr(event, "error", "failed")))
+    on(CrewKickoffStartedEvent)(lambda source, event: open_span(
+        ("crew", id(source)), f"crew {getattr(event, 'crew_name', None) or type(source).__name__}"))
+    on(CrewKickoffCompletedEvent)(lambda source, event: close_span(("crew", id(source))))
+    on(CrewKickoffFailedEvent)(lambda source, event: close_span(("crew", id(source)), getattr(event, "error", "failed")))
+    on(TaskStartedEvent)(lambda source, event: open_span(("task", id(source)), f"task {task_name(source)}"))
+    on(TaskCompletedEvent)(lambda source, event: close_span(("task", id(source))))
+    on(TaskFailedEvent)(lambda source, event: close_span(("task", id(source)), getattr(event, "error", "failed")))
+    on(AgentExecutionStartedEvent)(lambda source, event: open_span(
+        ("agent", id(event.agent), id(event.task)), f"agent {event.agent.role.strip()}"))
+    on(AgentExecutionCompletedEvent)(lambda source, event: close_span(("agent", id(event.agent), id(event.task))))
+    on(ToolUsageStartedEvent)(lambda source, event: open_span(
+        ("tool", threading.get_ident(), event.tool_name), f"tool {event.tool_name}"))
+    on(ToolUsageFinishedEvent)(lambda source, event: close_span(("tool", threading.get_ident(), event.tool_name)))
+    on(ToolUsageErrorEvent)(lambda source, event: close_span(
+        ("tool", threading.get_ident(), event.tool_name), getattr(event, "error", "failed")))
+
+
+tracer = Tracer()
+span = tracer.span
+traced = tracer.traced
+record_span = tracer.record
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import APIRouter, FastAPI, HTTPException, Depends
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import json
@@ -7,12 +7,20 @@ from enum import Enum
 import logging
 import re
 import asyncio
-import aiohttp
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
-from groq import Groq
+import threading
 from fastapi.middleware.cors import CORSMiddleware
-from instructor import patch
+
+from bakasura_flow.config import settings
+from bakasura_flow.llm_replay import FixtureMissing, llm_recorder
+from bakasura_flow.debug import include_debug_routers
+from bakasura_flow.loop_watchdog import router as loop_watchdog_router
+from bakasura_flow.profiler import ProfilerMiddleware
+from bakasura_flow.rate_limits import estimate_tokens, rate_limiter
+from bakasura_flow.scheduler import TenantMiddleware, llm_scheduler
+from bakasura_flow.tracing import TracingMiddleware, span
+
+# Provider SDKs (openai, anthropic, groq, instructor, aiohttp) are imported on first
+# use in ProviderClients so the service starts serving without loading all of them
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +43,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TenantMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(TracingMiddleware)
+
+# Routes live on a router so the gateway can mount them next to the other services
+router = APIRouter()
 
 class ModelType(Enum):
     GROQ = "groq"
@@ -69,6 +83,79 @@ class ModelConfig:
         "ollama": ["llama2", "mistral"]
     }
 
+class ProviderClients:
+    """Shares provider SDK clients and the Ollama HTTP session across requests."""
+
+    def __init__(self):
+        self._clients: Dict[Any, Any] = {}
+        self._session = None
+
+    def get(self, model_type: ModelType, api_key: Optional[str]):
+        key = (model_type, api_key)
+        if key not in self._clients:
+            # Every response's rate-limit headers feed the shared limiter. The SDKs' own
+            # retries are off: a 429 goes back to _get_model_response, which waits out
+            # Retry-After through the limiter instead of retrying blind
+            hook = self._rate_limit_hook(model_type, api_key)
+            if model_type == ModelType.GROQ:
+                from groq import AsyncGroq, DefaultAsyncHttpxClient
+                client = AsyncGroq(api_key=api_key, max_retries=0,
+                                   http_client=DefaultAsyncHttpxClient(event_hooks={"response": [hook]}))
+            elif model_type == ModelType.OPENAI:
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+                client = AsyncOpenAI(api_key=api_key, max_retries=0,
+                                     http_client=DefaultAsyncHttpxClient(event_hooks={"response": [hook]}))
+            elif model_type == ModelType.CLAUDE:
+                from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+                client = AsyncAnthropic(api_key=api_key, max_retries=0,
+                                        http_client=DefaultAsyncHttpxClient(event_hooks={"response": [hook]}))
+            else:
+                raise ValueError(f"No SDK client for {model_type.value}")
+            from instructor import patch
+            self._clients[key] = patch(client)
+        return self._clients[key]
+
+    @staticmethod
+    def _rate_limit_hook(model_type: ModelType, api_key: Optional[str]):
+        """An httpx response hook recording rate-limit headers for this provider and key."""
+        async def observe(response):
+            # The limiter writes to SQLite, so it runs off the event loop
+            await asyncio.to_thread(rate_limiter.observe, model_type.value, api_key,
+                                    response.headers, response.status_code)
+
+        return observe
+
+    def session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            import aiohttp
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._clients.clear()
+
+provider_clients = ProviderClients()
+
+_decompose_cache = None
+_decompose_cache_lock = threading.Lock()
+
+def get_decompose_cache():
+    """The semantic cache of past decompositions, or None when POEM_DECOMPOSE_CACHE_ENABLED is off."""
+    global _decompose_cache
+    with _decompose_cache_lock:
+        if _decompose_cache is None and settings.decompose_cache_enabled:
+            # Imported here so NumPy is only loaded when the cache is on
+            from bakasura_flow.semantic_cache import SemanticCache
+            _decompose_cache = SemanticCache(
+                embedder=settings.decompose_cache_embedder,
+                threshold=settings.decompose_cache_threshold,
+                max_entries=settings.decompose_cache_max_entries,
+            )
+        return _decompose_cache
+
 class QueryDecomposer:
     def __init__(self, model: str, temperature: float = 0.7, api_key: Optional[str] = None):
         self.model = model
@@ -104,7 +191,8 @@ class QueryDecomposer:
                 }
                 env_var = env_var_map[self.model_type]
                 self.api_key = os.getenv(env_var)
-                if not self.api_key:
+                # Replayed fixtures need no key: nothing is sent to the provider
+                if not self.api_key and not llm_recorder.replaying:
                     raise ValueError(f"{env_var} must be provided")
 
     def _build_prompt(self, query: str) -> str:
@@ -176,69 +264,32 @@ Return a JSON array of strings, with each string being a properly formatted ques
         """Get response from the selected model with proper async handling and retries"""
         max_retries = 2
         retry_count = 0
+        rate_limited = 0
         
         while retry_count <= max_retries:
+            if self.model_type != ModelType.OLLAMA and not llm_recorder.replaying:
+                # Wait for room under the provider's limits (shared by all workers) before sending
+                try:
+                    await rate_limiter.acquire(self.model_type.value, self.api_key, estimate_tokens(prompt, 1000))
+                except TimeoutError as e:
+                    raise HTTPException(status_code=503, detail=str(e))
             try:
-                if self.model_type == ModelType.GROQ:
-                    client = patch(Groq(api_key=self.api_key))
-                    chat_completion = client.chat.completions.create(
-                        messages=[{
-                            "role": "user",
-                            "content": prompt
-                        }],
-                        model="llama-3.3-70b-versatile",
-                        max_retries=3,
-                        temperature=self.temperature,
-                        max_tokens=1000,
-                        top_p=0.9
-                    )
-                    response = chat_completion.choices[0].message.content
-                    logger.info(f"Raw Groq response: {response}")
-                    return response
-
-                elif self.model_type == ModelType.OPENAI:
-                    client = patch(AsyncOpenAI(api_key=self.api_key))
-                    response = await client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_retries=3,
-                        temperature=self.temperature,
-                        max_tokens=1000
-                    )
-                    return response.choices[0].message.content
-
-                elif self.model_type == ModelType.CLAUDE:
-                    client = patch(AsyncAnthropic(api_key=self.api_key))
-                    response = await client.messages.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        temperature=self.temperature,
-                        max_retries=3,
-                        max_tokens=1000
-                    )
-                    return response.content[0].text
-
-                else:  # OLLAMA
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(
-                            "http://localhost:11434/api/generate",
-                            json={
-                                "model": self.model,
-                                "prompt": prompt,
-                                "temperature": self.temperature
-                            },
-                            timeout=30.0
-                        ) as response:
-                            if response.status != 200:
-                                text = await response.text()
-                                raise HTTPException(
-                                    status_code=response.status,
-                                    detail=f"Ollama API error: {text}"
-                                )
-                            data = await response.json()
-                            return data["response"]
-
+                # Each attempt waits its turn in the scheduler shared with the crews
+                with span("llm.call", provider=self.model_type.value, model=self.model):
+                    async with llm_scheduler.aslot():
+                        # Recorded (or replayed) as a fixture when POEM_LLM_REPLAY_MODE is set
+                        return await llm_recorder.acall(
+                            self.model_type.value, self._replay_request(prompt), lambda: self._provider_response(prompt)
+                        )
+
+            except FixtureMissing:
+                raise
             except Exception as e:
+                if getattr(e, "status_code", None) == 429 and rate_limited < settings.rate_limit_max_retries:
+                    # The response hook blocked this key until Retry-After; acquire() waits it out
+                    rate_limited += 1
+                    logger.warning(f"Rate limited by {self.model_type.value} ({rate_limited}), waiting for budget")
+                    continue
                 retry_count += 1
                 if retry_count <= max_retries:
                     logger.warning(f"Retry {retry_count} after error: {str(e)}")
@@ -250,6 +301,71 @@ Return a JSON array of strings, with each string being a properly formatted ques
                     detail=f"Error getting model response: {str(e)}"
                 )
 
+    def _replay_request(self, prompt: str) -> Dict[str, Any]:
+        """What identifies this call among the recorded fixtures"""
+        return {"model": self.model, "prompt": prompt, "temperature": self.temperature}
+
+    async def _provider_response(self, prompt: str) -> str:
+        """One request to the selected provider"""
+        if self.model_type == ModelType.GROQ:
+            client = provider_clients.get(ModelType.GROQ, self.api_key)
+            chat_completion = await client.chat.completions.create(
+                messages=[{
+                    "role": "user",
+                    "content": prompt
+                }],
+                model="llama-3.3-70b-versatile",
+                max_retries=3,
+                temperature=self.temperature,
+                max_tokens=1000,
+                top_p=0.9
+            )
+            response = chat_completion.choices[0].message.content
+            logger.info(f"Raw Groq response: {response}")
+            return response
+
+        elif self.model_type == ModelType.OPENAI:
+            client = provider_clients.get(ModelType.OPENAI, self.api_key)
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_retries=3,
+                temperature=self.temperature,
+                max_tokens=1000
+            )
+            return response.choices[0].message.content
+
+        elif self.model_type == ModelType.CLAUDE:
+            client = provider_clients.get(ModelType.CLAUDE, self.api_key)
+            response = await client.messages.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=self.temperature,
+                max_retries=3,
+                max_tokens=1000
+            )
+            return response.content[0].text
+
+        else:  # OLLAMA
+            session = provider_clients.session()
+            async with session.post(
+                "http://localhost:11434/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": prompt,
+                    "temperature": self.temperature
+                },
+                timeout=30.0
+            ) as response:
+                if response.status != 200:
+                    text = await response.text()
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"Ollama API error: {text}"
+                    )
+                data = await response.json()
+                return data["response"]
+
     def _clean_question(self, question: str) -> str:
         """Clean and validate a question with more lenient validation"""
         if not question:
@@ -295,20 +411,30 @@ Return a JSON array of strings, with each string being a properly formatted ques
             'analysis': ['analysis', 'evaluation', 'engine', 'computer', 'theory']
         }
         
-        found_topics = set()
+        # A list in the order above, not a set: the same question always gets the same topics
+        found_topics = []
         question_lower = question.lower()
         
         for main_topic, subtopics in chess_topics.items():
             if any(subtopic in question_lower for subtopic in subtopics):
-                found_topics.add(main_topic)
+                found_topics.append(main_topic)
                 
-        return list(found_topics)[:3]
+        return found_topics[:3]
 
     async def decompose(self, query: str) -> List[DecomposedQuestion]:
         """Main method to decompose a query into multiple questions"""
         if not query.strip():
             raise HTTPException(status_code=400, detail="Query cannot be empty")
 
+        # Rephrasings of a query already decomposed by this model at this temperature get the
+        # same questions. Building the cache loads its embedder, and lookups embed the query
+        cache = await asyncio.to_thread(get_decompose_cache)
+        namespace = (self.model, self.temperature)
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, query, namespace=namespace)
+            if cached is not None:
+                return list(cached)
+
         try:
             prompt = self._build_prompt(query)
             response_text = await self._get_model_response(prompt)
@@ -325,7 +451,9 @@ Return a JSON array of strings, with each string being a properly formatted ques
             
             if not decomposed_questions:
                 raise ValueError("No valid questions generated")
-                
+
+            if cache is not None:
+                await asyncio.to_thread(cache.put, query, decomposed_questions, namespace=namespace)
             return decomposed_questions
 
         except Exception as e:
@@ -335,7 +463,7 @@ Return a JSON array of strings, with each string being a properly formatted ques
                 detail=f"Failed to decompose query: {str(e)}"
             )
 
-@app.post("/decompose", response_model=DecompositionResponse)
+@router.post("/decompose", response_model=DecompositionResponse)
 async def decompose_query(request: DecompositionRequest):
     """Endpoint to decompose a query into multiple questions"""
     try:
@@ -362,11 +490,25 @@ async def decompose_query(request: DecompositionRequest):
             detail=str(e)
         )
 
-@app.get("/models")
+@router.on_event("shutdown")
+async def close_provider_clients():
+    await provider_clients.aclose()
+
+@router.get("/decompose/cache/stats")
+async def decompose_cache_stats():
+    """Hit rate and size of the semantic decomposition cache"""
+    cache = await asyncio.to_thread(get_decompose_cache)
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@router.get("/models")
 async def list_supported_models():
     """List all supported model types"""
     return {"supported_models": ModelConfig.SUPPORTED_MODELS}
 
+app.include_router(router)
+app.include_router(loop_watchdog_router)
+include_debug_routers(app)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
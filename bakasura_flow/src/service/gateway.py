@@ -0,0 +1,165 @@
+"""
+Single FastAPI process serving the poem, news, query decomposition and college essay APIs.
+
+Run from bakasura_flow/src. For several workers, preload the app so the heavy
+imports (crewai, provider SDKs, WeasyPrint) happen once before forking:
+
+    gunicorn -c service/gunicorn_conf.py service.gateway:app
+"""
+import asyncio
+import inspect
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.middleware.cors import CORSMiddleware
+
+from bakasura_flow.config import settings
+from bakasura_flow import main as poem_service
+from bakasura_flow import news as news_service
+from bakasura_flow import loop_watchdog
+from bakasura_flow.debug import include_debug_routers
+from bakasura_flow import outputs
+from bakasura_flow import profiler
+from bakasura_flow.rate_limits import rate_limiter
+from bakasura_flow.scheduler import TenantMiddleware, llm_scheduler
+from bakasura_flow.tracing import TracingMiddleware, tracer
+from service.fastapi import query_decomposition
+
+logger = logging.getLogger(__name__)
+
+COLLEGE_ESSAY_SRC = Path(settings.college_essay_src or Path(__file__).resolve().parents[3] / "college_essay" / "src" / "college_essay")
+
+# The college essay service is a separate project using flat imports (`from crew import ...`)
+sys.path.append(str(COLLEGE_ESSAY_SRC))
+try:
+    import college_essay_streaming as essay_service
+except ImportError as e:
+    logger.warning(f"College essay service not mounted: {e}")
+    essay_service = None
+
+ROUTERS = [poem_service.router, news_service.router, outputs.router, query_decomposition.router]
+if essay_service is not None:
+    ROUTERS.append(essay_service.router)
+
+
+async def _run_handlers(handlers):
+    for handler in handlers:
+        result = handler()
+        if inspect.isawaitable(result):
+            await result
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the resources every mounted service shares, once per worker process."""
+    # asyncio.to_thread() (used for every crew kickoff) runs on the loop's default executor
+    blocking_executor = ThreadPoolExecutor(
+        max_workers=settings.gateway_blocking_workers,
+        thread_name_prefix="gateway-blocking",
+    )
+    asyncio.get_running_loop().set_default_executor(blocking_executor)
+
+    app.state.blocking_executor = blocking_executor
+    app.state.provider_clients = query_decomposition.provider_clients
+    app.state.poem_cache = poem_service.poem_cache
+    app.state.output_store = outputs.output_store
+    app.state.llm_scheduler = llm_scheduler
+    app.state.rate_limiter = rate_limiter
+    app.state.tracer = tracer
+    app.state.loop_watchdog = loop_watchdog.loop_watchdog
+    app.state.crew_pools = {
+        "poem": poem_service.poem_crew_pool,
+        "news": news_service.news_crew_pool,
+    }
+    if essay_service is not None:
+        app.state.essay_renderer = essay_service.renderer
+        app.state.essay_jobs = essay_service.job_store
+
+    # A custom lifespan replaces the default one, so run the routers' own startup hooks
+    # (crew pool warm-up, renderer warm-up) here
+    await _run_handlers(app.router.on_startup)
+    try:
+        yield
+    finally:
+        await _run_handlers(app.router.on_shutdown)
+        outputs.output_store.close()
+        rate_limiter.close()
+        tracer.flush()
+        blocking_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(
+    title="Bakasura Gateway",
+    description="Poem, news, query decomposition and college essay APIs in one process",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["http://localhost:3000"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges"],
+)
+# The API key (or client address) and X-Priority decide each request's share of the LLM scheduler
+app.add_middleware(TenantMiddleware)
+# Samples the stacks of slow requests while switched on (POEM_PROFILER_ENABLED or POST /debug/profiler)
+app.add_middleware(profiler.ProfilerMiddleware)
+# Outermost, so each request's root span covers the other middleware too
+app.add_middleware(TracingMiddleware)
+
+for router in ROUTERS:
+    app.include_router(router)
+app.include_router(loop_watchdog.router)
+include_debug_routers(app)
+
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "services": len(ROUTERS)}
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Slots in use, queue depth and queue wait times per priority class and tenant."""
+    return llm_scheduler.stats()
+
+
+@app.get("/rate-limits/stats")
+async def rate_limit_stats():
+    """What each provider and API key (by digest) has left, as last reported by its headers."""
+    return await asyncio.to_thread(rate_limiter.stats)
+
+
+
+@app.get("/traces/slow")
+async def slow_traces(min_ms: float = 1000, limit: int = 10, format: str = "json"):
+    """
+    The slowest recent requests of this worker as flame-graph trees: time per span name
+    (flow step, crew, task, agent, tool, LLM call, rendering), merged across repeats.
+    format=folded gives folded stacks for flamegraph.pl or speedscope.
+    """
+    if format == "folded":
+        return PlainTextResponse(tracer.folded(min_ms, limit))
+    return {"stats": tracer.stats(), "traces": tracer.slow_traces(min_ms, limit)}
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Every span of one buffered trace, OTLP-shaped."""
+    spans = tracer.trace(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace not found or no longer buffered")
+    return {"trace_id": trace_id, "spans": spans}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,17 @@
+# Gunicorn settings for the gateway: gunicorn -c service/gunicorn_conf.py service.gateway:app
+import os
+
+bind = os.getenv("GATEWAY_BIND", "0.0.0.0:8000")
+# Always one worker: the college essay service keeps artifact ids, job ownership and
+# running pipelines in process memory, and gunicorn workers accept from one shared
+# socket, so nothing can route a client back to the worker that holds its job. To scale
+# out, run several single-worker gateways on different GATEWAY_BIND ports behind a
+# proxy with sticky sessions.
+workers = 1
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app (crewai, SDKs, WeasyPrint) once in the master, then fork; per-worker
+# resources such as thread pools, HTTP sessions and the renderer pool are created in the lifespan
+preload_app = True
+# Essay generation streams for minutes; don't let the arbiter kill busy workers
+timeout = int(os.getenv("GATEWAY_TIMEOUT", "600"))
+graceful_timeout = 30
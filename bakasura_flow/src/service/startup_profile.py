@@ -0,0 +1,83 @@
+"""
+Import-time report for a service entry point, checked against a startup budget.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter, so the
+numbers match a cold replica, and lists the slowest imports. Exits with status 1
+when the total import time exceeds the budget, so it can run in CI. From bakasura_flow/src:
+
+    python -m service.startup_profile service.fastapi.query_decomposition --budget-ms 500
+    python -m service.startup_profile college_essay_streaming --path ../../college_essay/src/college_essay
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from dataclasses import dataclass
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile_imports(module: str, path: str | None = None) -> list[ImportRecord]:
+    """Import `module` in a fresh interpreter and parse its -X importtime output."""
+    env = dict(os.environ)
+    if path:
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.path.abspath(path), env.get("PYTHONPATH")]))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=path or None,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    records = []
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(ImportRecord(name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return records
+
+
+def report(records: list[ImportRecord], top: int) -> int:
+    """Print the slowest imports and return the total import time in microseconds."""
+    total_us = sum(r.self_us for r in records)
+    print(f"{len(records)} modules imported in {total_us / 1000:.1f}ms")
+    print(f"\nTop {top} by cumulative time (top-level packages):")
+    top_level = [r for r in records if r.depth == 0]
+    for r in sorted(top_level, key=lambda r: r.cumulative_us, reverse=True)[:top]:
+        print(f"  {r.cumulative_us / 1000:9.1f}ms  {r.module}")
+    print(f"\nTop {top} by self time:")
+    for r in sorted(records, key=lambda r: r.self_us, reverse=True)[:top]:
+        print(f"  {r.self_us / 1000:9.1f}ms  {r.module}")
+    return total_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("module", help="Module to import, e.g. service.gateway")
+    parser.add_argument("--path", help="Directory to import from (added to PYTHONPATH and used as cwd)")
+    parser.add_argument("--budget-ms", type=float, default=800.0, help="Fail when imports take longer than this")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total_us = report(profile_imports(args.module, args.path), args.top)
+    total_ms = total_us / 1000
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: {total_ms:.1f}ms exceeds the {args.budget_ms:.0f}ms startup budget")
+        sys.exit(1)
+    print(f"\nOK: {total_ms:.1f}ms within the {args.budget_ms:.0f}ms startup budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Time and peak memory of JSON-to-markdown conversion: json.load plus string building vs the streaming converter.
+
+Generates a multi-megabyte JSON document (nested objects, lists of records, long
+strings) and converts it both ways, measuring peak Python allocations with tracemalloc.
+
+Run from the college_essay folder:
+    python benchmarks/json_md_benchmark.py --mb 4 8 16
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "college_essay"))
+
+from tools.json_stream import convert_file
+
+WORDS = ("admissions curiosity robotics volunteer community research leadership summer "
+         "project family challenge music growth resilience science mentor team").split()
+
+
+def write_document(path: str, target_bytes: int, seed: int = 0):
+    """Write a JSON object of roughly target_bytes, record by record, without holding it in memory."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"applicants": [')
+        written, i = 0, 0
+        while written < target_bytes:
+            record = {
+                "name": f"Student {i}",
+                "program": rng.choice(["Business", "Engineering", "Biology", "History"]),
+                "gpa": round(rng.uniform(2.5, 4.0), 2),
+                "activities": [" ".join(rng.choice(WORDS) for _ in range(8)) for _ in range(4)],
+                "essay": {
+                    "heading": " ".join(rng.choice(WORDS) for _ in range(6)),
+                    "paragraphs": [" ".join(rng.choice(WORDS) for _ in range(60)) for _ in range(3)],
+                    "review": {"score": rng.randint(1, 10), "approved": rng.random() > 0.5, "notes": None},
+                },
+            }
+            text = ("," if i else "") + json.dumps(record)
+            f.write(text)
+            written += len(text)
+            i += 1
+        f.write('], "generated": true}')
+
+
+def convert_legacy(json_file: str, output_md: str):
+    """The previous tool body: load everything, then build the markdown by concatenation."""
+    with open(json_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    md_content = "# Converted JSON to Markdown\n\n"
+
+    def parse_json(data, indent=0):
+        md = ""
+        for key, value in data.items():
+            prefix = "#" * (indent + 2)
+            if isinstance(value, dict):
+                md += f"\n{prefix} {key}\n"
+                md += parse_json(value, indent + 1)
+            elif isinstance(value, list):
+                md += f"\n{prefix} {key}\n"
+                for item in value:
+                    if isinstance(item, dict):
+                        md += parse_json(item, indent + 1)
+                    else:
+                        md += f"- {item}\n"
+            else:
+                md += f"**{key}:** {value}\n\n"
+        return md
+
+    md_content += parse_json(data)
+    with open(output_md, "w", encoding="utf-8") as md_file:
+        md_file.write(md_content)
+
+
+def measure(fn, *args) -> tuple[float, float]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=float, nargs="+", default=[4, 8, 16], help="Document sizes in megabytes")
+    args = parser.parse_args()
+
+    print(f"{'size':>8}  {'legacy time':>12} {'legacy peak':>12}  {'stream time':>12} {'stream peak':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mb in args.mb:
+            json_file = os.path.join(tmp, "input.json")
+            write_document(json_file, int(mb * 1024 * 1024))
+            legacy_time, legacy_peak = measure(convert_legacy, json_file, os.path.join(tmp, "legacy.md"))
+            stream_time, stream_peak = measure(convert_file, json_file, os.path.join(tmp, "stream.md"))
+            print(f"{mb:>6.1f}MB  {legacy_time:>11.2f}s {legacy_peak:>10.1f}MB  "
+                  f"{stream_time:>11.2f}s {stream_peak:>10.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Per-run overhead of the crew memory modes: off, ephemeral, persistent (unbatched and batched).
+
+Replays the memory traffic crewai generates for the two-task essay crew (a context
+lookup in short-term, entity and long-term memory before each task; the task output
+and its extracted entities saved after it) without calling an LLM. Persistent modes
+use the shared local embedder in a temporary directory.
+
+Run from the college_essay folder:
+    python benchmarks/memory_benchmark.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ESSAY_MEMORY_DIR", tempfile.mkdtemp(prefix="essay_memory_bench_"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "college_essay"))
+
+from essay_memory import BatchedEmbeddingStorage, EphemeralLTMStorage, EphemeralStorage, shared_embedder
+
+TASKS = [
+    "Write a college essay for the student based on their resume, program and college.",
+    "Review the essay and return an improved version that meets the structure rules.",
+]
+ENTITIES_PER_TASK = 5
+
+
+class Counting:
+    """Counts embedding calls (one per add/query) and embedded texts on a chroma collection."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.calls = 0
+        self.texts = 0
+
+    def add(self, **kwargs):
+        self.calls += 1
+        self.texts += len(kwargs["documents"])
+        return self._collection.add(**kwargs)
+
+    def query(self, **kwargs):
+        self.calls += 1
+        self.texts += len(kwargs["query_texts"])
+        return self._collection.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+def task_output(run: int, task: int) -> str:
+    return (f"Essay draft {task} for student {run}: robotics club leadership, a summer research project, "
+            f"volunteering at the community food bank, and growing resilience through music. ") * 6
+
+
+def simulate_run(run: int, short_term, entities, long_term):
+    for t, description in enumerate(TASKS):
+        short_term.search(description, limit=3)
+        entities.search(description, limit=3)
+        long_term.load(description, 2)
+        output = task_output(run, t)
+        short_term.save(output, {"agent": "essay_generator", "observation": description})
+        long_term.save(description, {"suggestions": ["Keep paragraphs focused."], "quality": 8},
+                       str(time.time()), 8)
+        for e in range(ENTITIES_PER_TASK):
+            entities.save(f"Entity {e} (topic): detail about activity {e} of student {run}", {"relationships": []})
+    for storage in (short_term, entities):
+        if hasattr(storage, "flush"):
+            storage.flush()
+
+
+def bench(label: str, runs: int, make_storages) -> dict:
+    latencies, calls, texts = [], 0, 0
+    for run in range(runs):
+        short_term, entities, long_term = make_storages(run)
+        start = time.perf_counter()
+        simulate_run(run, short_term, entities, long_term)
+        latencies.append(time.perf_counter() - start)
+        for storage in (short_term, entities):
+            if isinstance(getattr(storage, "collection", None), Counting):
+                calls += storage.collection.calls
+                texts += storage.collection.texts
+    return {
+        "label": label,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "embed_calls": calls / runs,
+        "embed_texts": texts / runs,
+        # crewai's TaskEvaluator extracts entities and scores each task with one LLM call
+        "llm_calls": 0 if label == "off" else len(TASKS),
+    }
+
+
+def persistent(batch_size: int):
+    def make(run):
+        short_term = BatchedEmbeddingStorage("bench_short_term", {"run": str(run)}, batch_size=batch_size)
+        entities = BatchedEmbeddingStorage("bench_entities", {"student": str(run)}, batch_size=batch_size)
+        short_term.collection = Counting(short_term.collection)
+        entities.collection = Counting(entities.collection)
+        return short_term, entities, EphemeralLTMStorage()
+    return make
+
+
+class Off:
+    def search(self, *args, **kwargs):
+        return []
+
+    def load(self, *args, **kwargs):
+        return []
+
+    def save(self, *args, **kwargs):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    shared_embedder()([task_output(0, 0)])  # load the local model once, outside the timings
+
+    results = [
+        bench("off", args.runs, lambda run: (Off(), Off(), Off())),
+        bench("ephemeral", args.runs, lambda run: (EphemeralStorage(), EphemeralStorage(), EphemeralLTMStorage())),
+        bench("persistent (batch 1)", args.runs, persistent(1)),
+        bench(f"persistent (batch {args.batch_size})", args.runs, persistent(args.batch_size)),
+    ]
+    print(f"{'mode':<24}{'mean':>10}{'p50':>10}{'embed calls':>13}{'texts':>8}{'LLM calls':>11}  per run")
+    for r in results:
+        print(f"{r['label']:<24}{r['mean_ms']:>8.1f}ms{r['p50_ms']:>8.1f}ms{r['embed_calls']:>13.1f}"
+              f"{r['embed_texts']:>8.1f}{r['llm_calls']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Render latency for 400-word essays: cold WeasyPrint setup vs the warm RendererService.
+
+Run from the college_essay folder:
+    python benchmarks/render_benchmark.py --essays 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "college_essay"))
+
+import markdown
+from weasyprint import CSS, HTML
+
+from renderer import ESSAY_CSS, HTML_TEMPLATE, PDFRenderer, RendererService
+
+WORDS = ("admissions curiosity robotics volunteer community research leadership summer "
+         "project family challenge music growth resilience science mentor team").split()
+
+
+def make_essay(words: int = 400, seed: int = 0) -> str:
+    """Heading plus five paragraphs totalling roughly `words` words."""
+    rng = random.Random(seed)
+    paragraphs = []
+    per_paragraph = words // 5
+    for _ in range(5):
+        sentences = []
+        remaining = per_paragraph
+        while remaining > 0:
+            length = min(remaining, rng.randint(8, 20))
+            sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+            sentences.append(sentence.capitalize() + ".")
+            remaining -= length
+        paragraphs.append(" ".join(sentences))
+    return "# A Journey Of Curiosity And Growth\n\n" + "\n\n".join(paragraphs)
+
+
+def render_cold(text: str, output_file: str):
+    """What convert_to_pdf used to do: parse markdown and CSS from scratch every time."""
+    html = HTML_TEMPLATE.format(body=markdown.markdown(text, extensions=["extra"]))
+    HTML(string=html).write_pdf(output_file, stylesheets=[CSS(string=ESSAY_CSS)])
+
+
+def report(label: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<22} n={len(latencies):<4} mean={statistics.mean(latencies) * 1000:7.1f}ms "
+          f"p50={statistics.median(latencies) * 1000:7.1f}ms p95={p95 * 1000:7.1f}ms")
+
+
+async def run_pool(essay_files: list[str], out_dir: str, workers: int) -> tuple[list[float], float]:
+    service = RendererService(workers=workers)
+    await service.warm_up()
+    latencies = []
+
+    async def one(i, path):
+        start = time.perf_counter()
+        await service.render_file(path, os.path.join(out_dir, f"pool-{i}.pdf"))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i, path) for i, path in enumerate(essay_files)])
+    wall = time.perf_counter() - start
+    service.shutdown()
+    return latencies, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--essays", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    essays = [make_essay(seed=i) for i in range(args.essays)]
+    with tempfile.TemporaryDirectory() as out_dir:
+        cold = []
+        for i, text in enumerate(essays):
+            start = time.perf_counter()
+            render_cold(text, os.path.join(out_dir, f"cold-{i}.pdf"))
+            cold.append(time.perf_counter() - start)
+
+        renderer = PDFRenderer()
+        renderer.render(essays[0], os.path.join(out_dir, "warmup.pdf"))
+        warm = []
+        for i, text in enumerate(essays):
+            start = time.perf_counter()
+            renderer.render(text, os.path.join(out_dir, f"warm-{i}.pdf"))
+            warm.append(time.perf_counter() - start)
+
+        essay_files = []
+        for i, text in enumerate(essays):
+            path = os.path.join(out_dir, f"essay-{i}.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            essay_files.append(path)
+        pooled, wall = asyncio.run(run_pool(essay_files, out_dir, args.workers))
+
+    report("cold (per essay)", cold)
+    report("warm (in process)", warm)
+    report(f"pool ({args.workers} workers)", pooled)
+    print(f"pool throughput: {len(essays) / wall:.1f} essays/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -48,66 +48,39 @@ const MessageDisplay = ({ messages }) => (
   </div>
 );
 
-// With this improved version:
-const PDFViewer = ({ content }) => {
-  const [pdfUrl, setPdfUrl] = useState("");
+// The PDF is served by the backend from /artifacts/<id>, so the viewer just points at it
+const PDFViewer = ({ artifactId }) => {
   const [loadError, setLoadError] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
+  const pdfUrl = artifactId ? `${API_BASE_URL}/artifacts/${encodeURIComponent(artifactId)}` : "";
 
   useEffect(() => {
-    if (!content) {
-      setIsLoading(false);
-      return;
-    }
-
-    try {
-      // Validate base64 content
-      if (!/^[A-Za-z0-9+/=]+$/.test(content)) {
-        throw new Error('Invalid base64 content');
-      }
-
-      // Decode base64 string and create a Blob URL
-      const binaryStr = atob(content);
-      const bytes = new Uint8Array(binaryStr.length);
-      for (let i = 0; i < binaryStr.length; i++) {
-        bytes[i] = binaryStr.charCodeAt(i);
-      }
-      
-      // Create blob with proper PDF MIME type
-      const blob = new Blob([bytes], { type: 'application/pdf' });
-      const url = URL.createObjectURL(blob);
-      
-      setPdfUrl(url);
-      setLoadError(null);
-      setIsLoading(false);
-
-      // Cleanup
-      return () => {
-        if (url) URL.revokeObjectURL(url);
-      };
-    } catch (err) {
-      console.error('PDF loading error:', err);
-      setLoadError(`Failed to load PDF: ${err.message}`);
-      setIsLoading(false);
-      setPdfUrl("");
-    }
-  }, [content]);
+    setLoadError(null);
+    setIsLoading(Boolean(artifactId));
+  }, [artifactId]);
 
   return (
     <div className="mb-4">
       <h4 className="text-lg font-semibold mb-2">Generated PDF:</h4>
-      {isLoading ? (
-        <div className="flex items-center justify-center p-4">Loading PDF...</div>
-      ) : loadError ? (
+      {loadError ? (
         <div className="text-red-500 p-4 border border-red-300 rounded bg-red-50">
           {loadError}
         </div>
       ) : pdfUrl ? (
-        <iframe
-          src={pdfUrl}
-          className="w-full h-[500px] border border-gray-300 rounded"
-          title="Generated Essay PDF"
-        />
+        <>
+          {isLoading && <div className="flex items-center justify-center p-4">Loading PDF...</div>}
+          <iframe
+            src={pdfUrl}
+            className="w-full h-[500px] border border-gray-300 rounded"
+            title="Generated Essay PDF"
+            onLoad={() => setIsLoading(false)}
+            onError={() => {
+              setLoadError('Failed to load PDF');
+              setIsLoading(false);
+            }}
+          />
+          <a href={pdfUrl} download className="text-sky-600 underline">Download PDF</a>
+        </>
       ) : (
         <div className="text-gray-500 p-4">No PDF content available</div>
       )}
@@ -136,7 +109,7 @@ const CollegeEssayStreamer = () => {
     messages, addMessage, setMessages,
     isStreaming, setIsStreaming,
     error, setError,
-    pdfContent, setPdfContent,
+    pdfArtifactId, setPdfArtifactId,
     clearAll
   } = useEssayStore();
 
@@ -161,7 +134,7 @@ const CollegeEssayStreamer = () => {
     setIsStreaming(true);
     setMessages([]);
     setError(null);
-    setPdfContent(null);
+    setPdfArtifactId(null);
 
     const formData = new FormData();
     formData.append('file', resumeFile);
@@ -190,15 +163,28 @@ const CollegeEssayStreamer = () => {
 
       eventSourceRef.current.onmessage = (event) => {
         const data = event.data.replace(/^data: /, '').trim();
-        if (data.startsWith('PDF_CONTENT:')) {
-          const base64Content = data.replace('PDF_CONTENT:', '');
-          setPdfContent(base64Content);
+        if (data.startsWith('PDF_ARTIFACT:')) {
+          setPdfArtifactId(data.replace('PDF_ARTIFACT:', ''));
+        } else if (data === 'Streaming completed') {
+          addMessage({ text: data, type: 'bot' });
+          eventSourceRef.current.close();
+          setIsStreaming(false);
+        } else if (data.startsWith('Error:')) {
+          // A failed job resumes from its last completed stage when the request is retried
+          setError(data);
+          eventSourceRef.current.close();
+          setIsStreaming(false);
         } else if (data) {
           addMessage({ text: data, type: 'bot' });
         }
       };
 
       eventSourceRef.current.onerror = (error) => {
+        // The essay keeps running on the server; EventSource reconnects on its own and
+        // its Last-Event-ID header replays only the events missed in between
+        if (eventSourceRef.current.readyState === EventSource.CONNECTING) {
+          return;
+        }
         console.error('EventSource failed:', error);
         setError('Failed to connect to the streaming service. Please check the server status.');
         setIsStreaming(false);
@@ -214,7 +200,7 @@ const CollegeEssayStreamer = () => {
       setError(`Failed to start essay generation: ${err.message}`);
       setIsStreaming(false);
     }
-  }, [program, student, college, resumeFile, selectedModel, setIsStreaming, setMessages, setError, setPdfContent, addMessage]);
+  }, [program, student, college, resumeFile, selectedModel, setIsStreaming, setMessages, setError, setPdfArtifactId, addMessage]);
 
   const handleClear = useCallback(() => {
     if (eventSourceRef.current) {
@@ -243,7 +229,7 @@ const CollegeEssayStreamer = () => {
       
       <MessageDisplay messages={messages} />
       
-      {pdfContent && <PDFViewer content={pdfContent} />}
+      {pdfArtifactId && <PDFViewer artifactId={pdfArtifactId} />}
       
       <div className="flex space-x-2">
         <Button
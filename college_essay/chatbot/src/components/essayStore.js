@@ -15,7 +15,7 @@ const useEssayStore = create((set, get) => ({
   messages: [],
   isStreaming: false,
   error: null,
-  pdfContent: null,
+  pdfArtifactId: null,
 
   // Basic setters
   setProgram: (program) => set({ program }),
@@ -46,7 +46,7 @@ const useEssayStore = create((set, get) => ({
   })),
   setIsStreaming: (isStreaming) => set({ isStreaming }),
   setError: (error) => set({ error }),
-  setPdfContent: (pdfContent) => set({ pdfContent }),
+  setPdfArtifactId: (pdfArtifactId) => set({ pdfArtifactId }),
 
   // Field validation
   validateFields: () => {
@@ -77,7 +77,7 @@ const useEssayStore = create((set, get) => ({
     messages: [],
     isStreaming: false,
     error: null,
-    pdfContent: null,
+    pdfArtifactId: null,
   }),
 }));
 
@@ -0,0 +1,253 @@
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+ARTIFACT_TTL_SECONDS = int(os.getenv("ESSAY_ARTIFACT_TTL", "900"))
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Per-job output directories live under ARTIFACT_ROOT and are removed once they expire
+ARTIFACT_ROOT = os.getenv("ESSAY_ARTIFACT_ROOT", os.path.join(tempfile.gettempdir(), "college_essay_jobs"))
+JOB_TTL_SECONDS = int(os.getenv("ESSAY_JOB_TTL", "3600"))
+ARTIFACT_QUOTA_BYTES = int(os.getenv("ESSAY_ARTIFACT_QUOTA_MB", "512")) * 1024 * 1024
+GC_INTERVAL_SECONDS = 60
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+
+class QuotaExceededError(Exception):
+    """Raised when the artifact root is full and no finished job can be evicted."""
+
+
+@dataclass
+class Job:
+    job_id: str
+    root: str
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    def path(self, name: str) -> str:
+        """Path of a file inside this job's private directory."""
+        return os.path.join(self.root, name)
+
+
+class ArtifactStore:
+    """Gives every essay job its own directory, with TTL garbage collection and a disk quota."""
+
+    def __init__(self, root: str = ARTIFACT_ROOT, ttl: int = JOB_TTL_SECONDS, quota_bytes: int = ARTIFACT_QUOTA_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def create_job(self) -> Job:
+        """Allocate a fresh job directory, collecting garbage and enforcing the quota first."""
+        with self._lock:
+            if time.monotonic() - self._last_gc > GC_INTERVAL_SECONDS:
+                self._collect_garbage()
+            self._enforce_quota()
+            job_id = secrets.token_hex(8)
+            job = Job(job_id=job_id, root=os.path.join(self.root, job_id))
+            os.makedirs(job.root)
+            self._jobs[job_id] = job
+            return job
+
+    def get_job(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def resume_job(self, job_id: str) -> Job | None:
+        """
+        Reactivate an existing job, including one left on disk by an earlier process,
+        so its directory is not collected while the job runs again.
+        """
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            root = os.path.join(self.root, job_id)
+            if job is None:
+                if not os.path.isdir(root):
+                    return None
+                job = self._jobs[job_id] = Job(job_id=job_id, root=root)
+            job.finished_at = None
+            os.utime(root)  # the TTL counts from the last run
+            return job
+
+    def finish_job(self, job: Job):
+        """Mark a job as done so its directory becomes eligible for eviction."""
+        job.finished_at = time.time()
+
+    def collect_garbage(self):
+        with self._lock:
+            self._collect_garbage()
+
+    def disk_usage(self) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def _is_active(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        return job is not None and job.finished_at is None
+
+    def _finished_job_dirs(self) -> list[tuple[float, str]]:
+        """(mtime, job_id) for every job directory not owned by a running job, oldest first."""
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not self._is_active(entry.name):
+                entries.append((entry.stat().st_mtime, entry.name))
+        return sorted(entries)
+
+    def _remove(self, job_id: str):
+        shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+        self._jobs.pop(job_id, None)
+
+    def _collect_garbage(self):
+        # Directories left over from earlier processes are picked up here too
+        cutoff = time.time() - self.ttl
+        for mtime, job_id in self._finished_job_dirs():
+            if mtime < cutoff:
+                self._remove(job_id)
+        self._last_gc = time.monotonic()
+
+    def _enforce_quota(self):
+        usage = self.disk_usage()
+        if usage < self.quota_bytes:
+            return
+        for _, job_id in self._finished_job_dirs():
+            self._remove(job_id)
+            usage = self.disk_usage()
+            if usage < self.quota_bytes:
+                return
+        raise QuotaExceededError(f"Artifact store is full ({usage} bytes used, quota {self.quota_bytes})")
+
+
+@dataclass
+class Artifact:
+    path: str
+    media_type: str
+    filename: str
+    expires_at: float
+
+
+class ArtifactRegistry:
+    """Hands out short-lived ids for generated files so they can be downloaded outside the SSE stream."""
+
+    def __init__(self, ttl: int = ARTIFACT_TTL_SECONDS):
+        self.ttl = ttl
+        self._artifacts: dict[str, Artifact] = {}
+
+    def register(self, path: str, media_type: str = "application/pdf", filename: str | None = None) -> str:
+        """Register a file on disk and return the id clients use to download it."""
+        self.purge_expired()
+        artifact_id = secrets.token_urlsafe(16)
+        self._artifacts[artifact_id] = Artifact(
+            path=path,
+            media_type=media_type,
+            filename=filename or os.path.basename(path),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        return artifact_id
+
+    def get(self, artifact_id: str) -> Artifact | None:
+        artifact = self._artifacts.get(artifact_id)
+        if artifact is None:
+            return None
+        if artifact.expires_at < time.monotonic() or not os.path.exists(artifact.path):
+            self._artifacts.pop(artifact_id, None)
+            return None
+        return artifact
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for artifact_id in [k for k, a in self._artifacts.items() if a.expires_at < now]:
+            del self._artifacts[artifact_id]
+
+
+def _iter_file(path: str, start: int, end: int):
+    """Yield the bytes in [start, end] from disk in CHUNK_SIZE pieces."""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """Parse a single `bytes=` range. Returns None when the range can't be satisfied."""
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def file_response(request: Request, artifact: Artifact) -> Response:
+    """Serve an artifact from disk with ETag revalidation and single-range support."""
+    stat = os.stat(artifact.path)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=" + str(ARTIFACT_TTL_SECONDS),
+        "Content-Disposition": f'inline; filename="{artifact.filename}"',
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _iter_file(artifact.path, start, end),
+            status_code=206,
+            media_type=artifact.media_type,
+            headers=headers,
+        )
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        _iter_file(artifact.path, 0, size - 1),
+        media_type=artifact.media_type,
+        headers=headers,
+    )
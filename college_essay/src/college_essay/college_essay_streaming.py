@@ -1,15 +1,26 @@
 import os
-import base64
 import shutil
 import asyncio
 import time
-import markdown
-from weasyprint import HTML # Add this import
-from fastapi import FastAPI, Query, File, UploadFile
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import APIRouter, FastAPI, Query, File, UploadFile, Request, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from crew import CollegeEssay
+from functools import lru_cache
 from tools.file_converter import FileConverter
+from artifacts import ArtifactRegistry, ArtifactStore, QuotaExceededError, file_response
+from renderer import RendererService
+from essay_memory import MEMORY_MODES
+from essay_pipeline import JobStoppingError, PipelineManager, parse_last_event_id
+from settings import settings
+from sse import SSEStreams
+
+try:
+    # Slow-request profiling and the loop watchdog come with bakasura_flow; standalone the service runs without them
+    from bakasura_flow.debug import include_debug_routers
+    from bakasura_flow.loop_watchdog import router as loop_watchdog_router
+    from bakasura_flow.profiler import ProfilerMiddleware
+except ImportError:
+    ProfilerMiddleware = include_debug_routers = loop_watchdog_router = None
 
 # Initialize FastAPI App and Configure CORS
 app = FastAPI()
@@ -19,148 +30,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges"],
 )
+if ProfilerMiddleware is not None:
+    app.add_middleware(ProfilerMiddleware)
+
+# Routes live on a router so the gateway can mount them next to the other services
+router = APIRouter()
 # Set up upload directory for resume files
 UPLOAD_DIR = "college_essay/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-class StreamingCollegeEssayCrewRunner(CollegeEssay):
-    def __init__(self, model,input_file):
-        super().__init__(model, input_file)
-
-    def get_file_content(self, file_path):
-        """Read content from a file using FileConverter."""
-        try:
-            return FileConverter.convert_to_text(file_path)
-        except Exception as e:
-            raise ValueError(f"Error reading file: {str(e)}")
-    
-    def convert_to_pdf(self, input_file, output_file):
-        """Convert markdown to PDF using WeasyPrint."""
-        try:
-            # Read markdown content
-            with open(input_file, 'r', encoding='utf-8') as f:
-                markdown_content = f.read()
-            
-            # Convert markdown to HTML with extensions
-            html_content = markdown.markdown(markdown_content, extensions=['extra'])
-            
-            # Enhanced HTML template with better styling
-            full_html = f"""
-                <!DOCTYPE html>
-                <html>
-                    <head>
-                        <meta charset="UTF-8">
-                        <style>
-                            @page {{
-                                margin: 1in;
-                                size: letter;
-                            }}
-                            body {{
-                                font-family: 'Arial', sans-serif;
-                                line-height: 1.6;
-                                font-size: 12pt;
-                                margin: 0;
-                                padding: 0;
-                            }}
-                            h1 {{
-                                color: #2c3e50;
-                                font-size: 18pt;
-                                margin-bottom: 1em;
-                            }}
-                            h2 {{
-                                color: #34495e;
-                                font-size: 16pt;
-                                margin-top: 1.5em;
-                            }}
-                            p {{
-                                margin-bottom: 1em;
-                                text-align: justify;
-                            }}
-                            .content {{
-                                max-width: 8.5in;
-                                margin: 0 auto;
-                                padding: 1em;
-                            }}
-                        </style>
-                    </head>
-                    <body>
-                        <div class="content">
-                            {html_content}
-                        </div>
-                    </body>
-                </html>
-            """
-            
-            # Convert HTML to PDF
-            pdf_document = HTML(string=full_html)
-            pdf_document.write_pdf(output_file)
-            
-            if not os.path.exists(output_file):
-                raise Exception("PDF file was not created")
-                
-            return "PDF conversion successful"
-        except Exception as e:
-            return f"Conversion failed: {str(e)}"
-
-async def college_essay_stream(program: str, student: str, college: str, resume_file_path: str, model: str):
+# Generated PDFs are served by id from /artifacts instead of inline in the SSE stream
+artifacts = ArtifactRegistry()
+# Each essay run gets its own directory so concurrent jobs never share output paths
+job_store = ArtifactStore()
+# Warm WeasyPrint workers; rendering never runs on the event loop
+renderer = RendererService()
+# Keep-alives, per-connection backpressure and a cap on open event streams
+streams = SSEStreams()
+
+@router.on_event("startup")
+async def start_renderer():
+    await renderer.warm_up()
+
+@router.on_event("shutdown")
+async def stop_renderer():
+    await pipelines.shutdown()
+    renderer.shutdown()
+
+@lru_cache(maxsize=None)
+def _crew_runner_class():
     """
-    Generator function to stream the college essay creation process.
-    Yields status updates and the final PDF content.
+    Build the crew runner class on first use. Importing crew pulls in crewai and the
+    provider SDKs, which would otherwise all load before the app could serve anything.
     """
-    output_file = student.replace(" ", "-") + "-essay"
-    crew_runner = StreamingCollegeEssayCrewRunner(model,output_file)
-    
-   
-    # Load file content
-    file_content = crew_runner.get_file_content(resume_file_path)
-    yield f"data: File content loaded. Length: {len(file_content)} characters\n\n"
-    
-    # Prepare inputs
-    inputs = {
-        'file_content': file_content,
-        'program': program,
-        'output_essay': "essay",
-        'college': college,
-        'student': student,
-        'model': model
-    }
-    
-    # Stream input information
-    for input_key, input_value in inputs.items():
-        yield f"data: Input: {input_key} - {input_value[:50]}...\n\n"
-        await asyncio.sleep(0.1)
-    
-    # Execute crew tasks with error handling
-    yield "data: Starting crew execution...\n\n"
-    custom_crew = crew_runner.crew()
-
-    for agent in custom_crew.agents:
-        yield f"data: Agent role:{agent.role} is starting work\n\n"
-        yield f"data: Agent goal: {agent.goal} is starting work\n\n"
-        yield f"data: Agent backstory:{agent.backstory} is starting work\n\n"
-        await asyncio.sleep(0.5)
-  
-    # uncomment the line below to train the crew
-    #custom_crew.train(inputs=inputs,n_iterations=1, filename='training.pkl')
-    #custom_crew.test(n_iterations=1, openai_model_name='gpt-4o')
-    result = custom_crew.kickoff(inputs=inputs)
-    yield f"data: Crew execution completed. Result: {result}\n\n"
-         # Convert essay to PDF
-    input_file = "/home/albert/Documents/crewaiprojects/" + output_file + ".md"
-    output_file = f"/home/albert/Documents/crewaiprojects/"+ output_file +".pdf"
-    yield f"data: Converting essay to PDF: {input_file} -> {output_file}\n\n"
-    pdf_result = crew_runner.convert_to_pdf(input_file, output_file)
-    yield f"data: PDF Conversion Result: {pdf_result}\n\n"
-
-    # Stream PDF content
-    with open(output_file, "rb") as pdf_file:
-        pdf_content = pdf_file.read()
-        pdf_base64 = base64.b64encode(pdf_content).decode('utf-8')
-        yield f"data: PDF_CONTENT:{pdf_base64}\n\n"
-    yield "data: Streaming completed\n\n"
-
-@app.post("/upload_resume")
+    from crew import CollegeEssay
+
+    class StreamingCollegeEssayCrewRunner(CollegeEssay):
+        def __init__(self, model,input_file, memory=None):
+            super().__init__(model, input_file, memory)
+
+        def get_file_content(self, file_path):
+            """Read content from a file using FileConverter."""
+            try:
+                return FileConverter.convert_to_text(file_path)
+            except Exception as e:
+                raise ValueError(f"Error reading file: {str(e)}")
+
+    return StreamingCollegeEssayCrewRunner
+
+def _check_model(model: str):
+    """Raise ValueError for a model name the registry cannot serve. Imports crewai on first use."""
+    from model_registry import model_registry
+    model_registry.spec(model)
+
+pipelines = PipelineManager(job_store, lambda *args: _crew_runner_class()(*args), renderer, artifacts,
+                            settings.abandon_after_seconds)
+
+@router.post("/upload_resume")
 async def upload_resume(file: UploadFile = File(...)):
     """
     Endpoint to handle resume file uploads.
@@ -171,21 +99,91 @@ async def upload_resume(file: UploadFile = File(...)):
         shutil.copyfileobj(file.file, buffer)
     return JSONResponse(content={"file_path": file_path})
 
-@app.get("/stream_college_essay")
+@router.get("/stream_college_essay")
 async def stream_college_essay(
+    request: Request,
     program: str = Query(..., description="Program name"),
     student: str = Query(..., description="Student name"),
     college: str = Query(..., description="College name"),
     resumeFilePath: str = Query(..., description="Path to uploaded resume file"),
-    model: str = Query(..., description="Selected language model")):
+    model: str = Query(..., description="Selected language model"),
+    memory: str | None = Query(None, description="Crew memory: off, ephemeral or persistent"),
+    job_id: str | None = Query(None, description="Resume this job instead of starting a new one")):
     """
     Endpoint to stream the college essay generation process.
     Returns a StreamingResponse with real-time updates.
+
+    The essay runs as a background job, so a dropped connection doesn't stop it at
+    once. A client reconnecting with Last-Event-ID (EventSource does this
+    automatically) or retrying with job_id gets the events it missed; a failed job
+    resumes from its last completed stage. A job nobody reconnects to within
+    ESSAY_ABANDON_AFTER_SECONDS is cancelled, so it stops spending LLM tokens.
+    """
+    if memory is not None and memory not in MEMORY_MODES:
+        raise HTTPException(status_code=400, detail=f"memory must be one of {', '.join(MEMORY_MODES)}")
+    try:
+        await asyncio.to_thread(_check_model, model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Before any job starts: a rejected client must not leave an unwatched job behind.
+    # The slot is taken now, so concurrent requests cannot all pass the cap
+    slot = streams.reserve()
+    try:
+        last_job_id, after = parse_last_event_id(request.headers.get("last-event-id"))
+        if job_id and job_id != last_job_id:
+            after = 0
+        job_id = job_id or last_job_id
+        if job_id:
+            try:
+                pipeline = pipelines.resume(job_id)
+            except JobStoppingError as e:
+                raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "5"})
+            if pipeline is None:
+                raise HTTPException(status_code=404, detail="Job not found or expired")
+        else:
+            try:
+                pipeline = pipelines.start({
+                    "program": program,
+                    "student": student,
+                    "college": college,
+                    "resume_file_path": resumeFilePath,
+                    "model": model,
+                    "memory": memory,
+                })
+            except QuotaExceededError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+        return streams.response(request, slot, pipeline.log.follow(after), on_open=pipeline.attach,
+                                on_close=pipeline.detach)
+    except BaseException:
+        slot.release()
+        raise
+
+@router.get("/artifacts/{artifact_id}")
+async def download_artifact(artifact_id: str, request: Request):
     """
-    return StreamingResponse(
-        college_essay_stream(program, student, college, resumeFilePath, model),
-        media_type="text/event-stream"
-    )
+    Endpoint to download a generated artifact such as the essay PDF.
+    Supports Range requests and ETag revalidation, streaming the file from disk.
+    """
+    artifact = artifacts.get(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Artifact not found or expired")
+    return file_response(request, artifact)
+
+@router.get("/streams/stats")
+async def stream_stats():
+    """Open event streams, and how many were rejected at the cap or dropped for not reading."""
+    return streams.stats()
+
+@router.get("/models/stats")
+async def model_stats():
+    """Per-model call counts and latencies, for tuning the model registry's routing."""
+    from model_registry import model_registry
+    return model_registry.stats()
+
+app.include_router(router)
+if loop_watchdog_router is not None:
+    app.include_router(loop_watchdog_router)
+    include_debug_routers(app)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,73 +1,34 @@
 from crewai import Agent, Crew, Process, Task, LLM
-from crewai.project import CrewBase, agent, crew, task
-from crewai_tools import FileReadTool
+from crewai.project import CrewBase, agent, crew, task, after_kickoff, before_kickoff
 import os
-from tools.txt_PDF_tool import PDFConversionTool
-from crewai_tools import FileWriterTool
-
-try:
-    import google.generativeai as genai
-except ImportError:
-    print("Warning: google-generativeai not found. Gemini models will not be available.")
-    genai = None
-
-
 import sys
 import warnings
 from datetime import datetime
-from pydantic import BaseModel, validator, ValidationError
-import re
-
-def count_sentences(text: str) -> int:
-    # Naively count sentences splitting on period, exclamation or question mark.
-    sentences = re.split(r'[.!?]+', text)
-    return len([s for s in sentences if s.strip()])
-
-class CollegeEssayModel(BaseModel):
-    heading: str
-    opening_paragraph: str
-    body_paragraphs: list[str]
-    closing_paragraph: str
-
-    @validator('heading')
-    def check_heading(cls, v):
-        words = v.split()
-        if len(words) < 4:
-            raise ValueError("Heading must be at least 4 words")
-        return v
-
-    @validator('opening_paragraph')
-    def check_opening_paragraph(cls, v):
-        sentence_count = count_sentences(v)
-        if sentence_count < 2 or sentence_count > 3:
-            raise ValueError("Opening paragraph must have 2-3 sentences")
-        return v
-
-    @validator('body_paragraphs')
-    def check_body_paragraphs(cls, v):
-        if not (2 <= len(v) <= 3):
-            raise ValueError("There must be 2-3 body paragraphs")
-        for paragraph in v:
-            if count_sentences(paragraph) < 3:
-                raise ValueError("Each body paragraph must have at least 3 sentences")
-        return v
-
-    @validator('closing_paragraph')
-    def check_closing_paragraph(cls, v):
-        sentence_count = count_sentences(v)
-        if sentence_count < 2 or sentence_count > 3:
-            raise ValueError("Closing paragraph must have 2-3 sentences")
-        return v
+from functools import partial
+from crewai.tasks.task_output import TaskOutput
+from essay_memory import EssayMemory
+from model_registry import model_registry
+from essay_structure import CollegeEssayModel, EssayDraft, EssayStreamValidator, parse_draft, repair_essay, render_markdown
+from tracing import instrument_crewai
+
+# Crew kickoffs, tasks, agents and tool calls show up as spans under the essay's trace
+instrument_crewai()
 
 @CrewBase
 class CollegeEssay():
 	"""This is the optimal crew for generating a college essay version 2 and can use
 	any openAI and other models to generate the essay"""
 
-	def __init__(self, model, output_file):
+	def __init__(self, model, output_file, memory=None):
+		# output_file is a path prefix inside the job's artifact directory, without extension
 		self.model = model
 		self.output_file = output_file
-		self.llm = self._set_llm()
+		# memory: "off", "ephemeral" or "persistent"; defaults to settings.memory_mode
+		self.memory = EssayMemory(memory, run_id=output_file)
+		# Drafting runs on a fast model, critique on a stronger one from the same provider
+		self.llm = self._set_llm("draft")
+		self.critic_llm = self._set_llm("critic")
+		self.inputs = {}
 
 	# def _set_llm(self):
 	# 	if self.model in ['gpt-4o', 'gpt-3.5-turbo', 'claude-2', 'o1-preview', 'o1-mini', 'groq_llm']:
@@ -75,67 +36,54 @@ class CollegeEssay():
 	# 	else:
 	# 		return LLM(model="ollama/" + self.model, base_url="http://localhost:11434")
 	
-	def _set_llm(self):
-		"""Sets the correct LLM instance based on the model selected."""
-		if self.model.startswith("groq"):
-			# Instantiate Groq LLM
-			groq_api_key=os.getenv("GROQ_API_KEY")
-			return LLM(
-				model="groq/llama-3.3-70b-versatile",
-                #model="deepseek-r1-distill-llama-70b",        
-				temperature=0.7,
-				api_key=groq_api_key,
-				base_url="https://api.groq.com/openai/v1"
-			)
-		elif self.model in ['gpt-4o', 'gpt-3.5-turbo', 'claude-2', 'o1-preview', 'o1-mini']:
-			# Assuming OpenAI or Claude models are handled elsewhere
-			return self.model  
-		else:
-			# Default to Ollama for local models
-			return LLM(model="ollama/" + self.model, base_url="http://localhost:11434")
+	def _set_llm(self, role):
+		"""Shared LLM client for an agent role, picked by the model registry (see settings.py)."""
+		return model_registry.route(self.model, role)
+
+	@before_kickoff
+	def remember_inputs(self, inputs):
+		self.inputs = inputs or {}
+		self.memory.scope_to_student(self.inputs.get("student"))
+		return inputs
+
+	@after_kickoff
+	def flush_memory(self, result):
+		self.memory.flush()
+		return result
+
 	@agent
 	def essay_generator(self) -> Agent:
-		# The json_output parameter automatically enforces the CollegeEssayModel.
-		# Ensure your LLM returns valid JSON matching:
-		# {
-		#   "opening_paragraph": <str>,
-		#   "body_paragraphs": [<str>, ...],
-		#   "closing_paragraph": <str>
-		# }
 		return Agent(
 			config=self.agents_config['essay_generator'],
-			llm=self.llm,
+			# Streams the draft and re-prompts as soon as a paragraph is out of spec
+			llm=self.llm.with_stream_check(EssayStreamValidator),
 			verbose=True
 		)
-		
-	# Optionally, you can further enforce validation like so:
-	# result = self.essay_generator().execute_task(...) 
-	# validated_output = CollegeEssayModel.parse_obj(result)
 
 	@agent
 	def critic_reviewer(self) -> Agent:
 		return Agent(
 			config=self.agents_config['critic_reviewer'],
-			llm=self.llm,
+			llm=self.critic_llm,
 			allow_delegation=True,
 			verbose=True,
-			tools=[FileReadTool(), FileWriterTool()],  # Make sure it reads the essay and updates it
+			# The draft arrives as task context, so no file round trips are needed
     )
-	@agent
-	def markdown(self) -> Agent:
-		return Agent(
-			config=self.agents_config['markdown'],
-			verbose=True,
-		)
 	# To learn more about structured task outputs, 
 	# task dependencies, and task callbacks, check out the documentation:
 	# https://docs.crewai.com/concepts/tasks#overview-of-a-task
 	@task
 	def essay_task(self) -> Task:
+		# Structured output: the draft is validated before the critic sees it, and only
+		# failing fields are re-prompted instead of paying for another full pass
 		return Task(
 			config=self.tasks_config['essay_task'],
 			allow_delegation=True,
-			output_file= self.output_file+ ".md",
+			output_pydantic=EssayDraft,
+			guardrail=self.repair_draft,
+			max_retries=1,
+			callback=partial(self.save_checkpoint, "draft"),
+			# No output_file: the draft is handed to critic_task in memory as context
 			verbose=True,
 
 		)
@@ -145,17 +93,22 @@ class CollegeEssay():
 	def critic_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['critic_task'],
-			output_file= self.output_file+ ".md", # Ensure critic writes back to the essay file
+			output_pydantic=EssayDraft,
+			callback=partial(self.save_checkpoint, "critique"),
 			allow_delegation=True,
 			verbose=True,
 		)
-	@task
-	def markdown_task(self) -> Task:
-		return Task(
-			config=self.tasks_config['markdown_task'],
-			output_file= self.output_file+ ".md",
-			verbose=True
-		)
+
+	def repair_draft(self, task_output):
+		"""Task guardrail: validate the draft and repair only the fields that are out of spec."""
+		try:
+			draft = task_output.pydantic or parse_draft(task_output.raw)
+		except ValueError as e:
+			return (False, f"Return the essay as JSON matching the EssayDraft schema: {e}")
+		draft, errors = repair_essay(self.llm, draft, self.inputs)
+		if errors:
+			return (False, "Fix these problems: " + "; ".join(f"{k}: {v}" for k, v in errors.items()))
+		return (True, draft.model_dump_json())
 
 	@crew
 	def crew(self) -> Crew:
@@ -167,11 +120,58 @@ class CollegeEssay():
 			agents=[self.essay_generator(), self.critic_reviewer()], 
 			tasks=[self.essay_task(), self.critic_task()],
 			process=Process.sequential,  # Ensure the essay is written before critique
-			memory=True,
-			verbose=True
+			verbose=True,
+			**self.memory.crew_kwargs()
 			
 			# process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
 		)
+	def critique_crew(self, draft_json) -> Crew:
+		"""Crew that runs only the critic, on a draft checkpointed by an earlier run."""
+		essay_task = self.essay_task()
+		essay_task.output = TaskOutput(
+			description=essay_task.description,
+			raw=draft_json,
+			pydantic=parse_draft(draft_json),
+			agent=self.essay_generator().role,
+		)
+		critic_task = self.critic_task()
+		critic_task.context = [essay_task]
+		return Crew(
+			agents=[self.critic_reviewer()],
+			tasks=[critic_task],
+			process=Process.sequential,
+			before_kickoff_callbacks=[self.remember_inputs],
+			after_kickoff_callbacks=[self.flush_memory],
+			verbose=True,
+			**self.memory.crew_kwargs()
+		)
+
+	def checkpoint_path(self, stage) -> str:
+		"""Where a pipeline stage ("draft", "critique", "markdown" or "pdf") keeps its output."""
+		extension = {"markdown": ".md", "pdf": ".pdf"}.get(stage, f".{stage}.json")
+		return self.output_file + extension
+
+	def save_checkpoint(self, stage, task_output):
+		"""Task callback: keep each task's output so a failed run can resume after the last finished task."""
+		_write_atomic(self.checkpoint_path(stage), task_output.raw)
+
+	def write_markdown(self, result) -> str:
+		"""Validate the final essay, repair it if needed and render it to <output_file>.md.
+		`result` is the crew output or the raw JSON of a checkpointed critique."""
+		draft = getattr(result, "pydantic", None) or parse_draft(getattr(result, "raw", result))
+		draft, _ = repair_essay(self.llm, draft, self.inputs)
+		markdown_file = self.checkpoint_path("markdown")
+		_write_atomic(markdown_file, render_markdown(draft))
+		return markdown_file
+
 	def convert_to_pdf(self,input_file, output_file):
+		from tools.txt_PDF_tool import PDFConversionTool
 		pdf_tool = PDFConversionTool(input_file_path=input_file, output_file_path=output_file)
-		return pdf_tool._run()
\ No newline at end of file
+		return pdf_tool._run()
+
+
+def _write_atomic(path, text):
+	tmp = f"{path}.tmp"
+	with open(tmp, "w", encoding="utf-8") as f:
+		f.write(text)
+	os.replace(tmp, path)
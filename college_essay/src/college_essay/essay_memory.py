@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import threading
+import uuid
+from functools import lru_cache
+
+from settings import settings
+from tracing import traced
+
+MEMORY_MODES = ("off", "ephemeral", "persistent")
+WORD = re.compile(r"[a-z0-9']+")
+
+
+class EphemeralStorage:
+    """Short-term or entity memory for a single run: kept in process, no embeddings, no disk.
+    Search ranks items by how many of the query's words they contain."""
+
+    def __init__(self):
+        self._items: list[dict] = []
+        self._lock = threading.Lock()
+
+    @traced("memory.save")
+    def save(self, value, metadata):
+        text = str(value)
+        with self._lock:
+            self._items.append({
+                "id": str(len(self._items)),
+                "context": text,
+                "metadata": metadata or {},
+                "words": set(WORD.findall(text.lower())),
+            })
+
+    @traced("memory.search")
+    def search(self, query, limit=3, filter=None, score_threshold=0.35):
+        words = set(WORD.findall(str(query).lower()))
+        if not words:
+            return []
+        with self._lock:
+            scored = [(len(words & item["words"]) / len(words), item) for item in self._items]
+        scored = [(score, item) for score, item in scored if score > 0]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [
+            {"id": item["id"], "context": item["context"], "metadata": item["metadata"], "score": score}
+            for score, item in scored[:limit]
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._items.clear()
+
+
+class EphemeralLTMStorage:
+    """In-process stand-in for crewai's long-term SQLite storage, with the same save/load shape."""
+
+    def __init__(self):
+        self._rows: list[dict] = []
+        self._lock = threading.Lock()
+
+    @traced("memory.save")
+    def save(self, task_description, metadata, datetime, score):
+        with self._lock:
+            self._rows.append({"task_description": task_description, "metadata": metadata,
+                               "datetime": datetime, "score": score})
+
+    @traced("memory.load")
+    def load(self, task_description, latest_n):
+        with self._lock:
+            rows = [r for r in self._rows if r["task_description"] == task_description]
+        rows.sort(key=lambda r: (-float(r["datetime"]), r["score"]))
+        return [{"metadata": r["metadata"], "datetime": r["datetime"], "score": r["score"]} for r in rows[:latest_n]]
+
+    def reset(self):
+        with self._lock:
+            self._rows.clear()
+
+
+@lru_cache(maxsize=None)
+def shared_embedder():
+    """One local embedding model per process (chromadb's bundled ONNX MiniLM), shared by every run."""
+    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+    return DefaultEmbeddingFunction()
+
+
+@lru_cache(maxsize=None)
+def _chroma_client():
+    import chromadb
+    os.makedirs(settings.memory_dir, exist_ok=True)
+    return chromadb.PersistentClient(path=settings.memory_dir)
+
+
+def _chroma_metadata(metadata: dict) -> dict:
+    # Chroma only stores scalar metadata values
+    clean = {}
+    for key, value in (metadata or {}).items():
+        if value is None:
+            continue
+        clean[key] = value if isinstance(value, (str, int, float, bool)) else json.dumps(value, default=str)
+    return clean
+
+
+def _where(scope: dict) -> dict | None:
+    if not scope:
+        return None
+    if len(scope) == 1:
+        return dict(scope)
+    return {"$and": [{key: value} for key, value in scope.items()]}
+
+
+class BatchedEmbeddingStorage:
+    """
+    Persistent vector memory that embeds writes in batches with the shared local embedder.
+
+    Saves are buffered and flushed as one embedding call when `batch_size` items are
+    pending, before any search (so a run always reads its own writes) and when the
+    crew finishes. Items carry the `scope` metadata and searches are filtered on it,
+    so one student's essay never shows up in another's context.
+    """
+
+    def __init__(self, collection: str, scope: dict, batch_size: int = settings.memory_batch_size):
+        self.collection = _chroma_client().get_or_create_collection(
+            collection, embedding_function=shared_embedder(), metadata={"hnsw:space": "cosine"}
+        )
+        self.scope = scope
+        self.batch_size = batch_size
+        self._pending: list[tuple[str, dict]] = []
+        self._lock = threading.Lock()
+
+    @traced("memory.save")
+    def save(self, value, metadata):
+        with self._lock:
+            self._pending.append((str(value), {**_chroma_metadata(metadata), **self.scope}))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    @traced("memory.flush")
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self.collection.add(
+                ids=[uuid.uuid4().hex for _ in pending],
+                documents=[text for text, _ in pending],
+                metadatas=[metadata for _, metadata in pending],
+            )
+
+    @traced("memory.search")
+    def search(self, query, limit=3, filter=None, score_threshold=0.35):
+        self.flush()
+        response = self.collection.query(query_texts=[str(query)], n_results=limit, where=_where(self.scope))
+        results = []
+        for item_id, document, metadata, distance in zip(
+            response["ids"][0], response["documents"][0], response["metadatas"][0], response["distances"][0]
+        ):
+            score = 1 - distance  # cosine similarity
+            if score >= score_threshold:
+                results.append({"id": item_id, "context": document, "metadata": metadata, "score": score})
+        return results
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+        self.collection.delete(where=_where(self.scope))
+
+
+class EssayMemory:
+    """
+    Memory configuration for one essay run.
+
+    - "off": no memory; no embedding calls, no disk writes.
+    - "ephemeral": short-term, entity and long-term memory kept in process for the run.
+    - "persistent": vector memory on disk under settings.memory_dir, embedded locally in batches.
+      Short-term memory is scoped to the run, entity memory to the student.
+    """
+
+    def __init__(self, mode: str | None = None, run_id: str | None = None):
+        mode = mode or settings.memory_mode
+        if mode not in MEMORY_MODES:
+            raise ValueError(f"memory must be one of {', '.join(MEMORY_MODES)}")
+        self.mode = mode
+        self.run_scope = {"run": run_id or uuid.uuid4().hex}
+        self.entity_scope = dict(self.run_scope)
+        self._storages: list = []
+
+    def scope_to_student(self, student: str | None):
+        """Share entity memory across runs for the same student (persistent mode)."""
+        if student:
+            self.entity_scope.clear()
+            self.entity_scope["student"] = student.strip().lower()
+
+    def crew_kwargs(self) -> dict:
+        """Keyword arguments for Crew(...)."""
+        if self.mode == "off":
+            return {"memory": False}
+
+        from crewai.memory import EntityMemory, LongTermMemory, ShortTermMemory
+
+        if self.mode == "ephemeral":
+            short_term, entities, long_term = EphemeralStorage(), EphemeralStorage(), EphemeralLTMStorage()
+            long_term_memory = LongTermMemory(storage=long_term)
+        else:
+            short_term = BatchedEmbeddingStorage("essay_short_term", self.run_scope)
+            entities = BatchedEmbeddingStorage("essay_entities", self.entity_scope)
+            long_term_memory = LongTermMemory(path=os.path.join(settings.memory_dir, "long_term_memory.db"))
+        self._storages = [short_term, entities]
+        return {
+            "memory": True,
+            "short_term_memory": ShortTermMemory(storage=short_term),
+            "entity_memory": EntityMemory(storage=entities),
+            "long_term_memory": long_term_memory,
+        }
+
+    def flush(self):
+        """Write out any batched embeddings; call when the crew finishes."""
+        for storage in self._storages:
+            if hasattr(storage, "flush"):
+                storage.flush()
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import os
+import threading
+from logging import getLogger
+from typing import Callable
+
+from artifacts import ArtifactRegistry, ArtifactStore, Job
+from renderer import RendererService
+from tracing import span
+
+logger = getLogger(__name__)
+
+STAGES = ("draft", "critique", "markdown", "pdf")
+
+
+class JobStoppingError(RuntimeError):
+    """The job was cancelled, but its crew thread is still finishing its current LLM call."""
+
+
+class EventLog:
+    """
+    Status events of one job, numbered from 1 and appended to events.jsonl in the job
+    directory. Any number of SSE clients can follow the log, each from the last
+    event id it saw, so a reconnecting client gets exactly the events it missed.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self.path = job.path("events.jsonl")
+        self.events: list[str] = []
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.events = [json.loads(line) for line in f if line.strip()]
+        self.closed = False
+        self._changed = asyncio.Condition()
+
+    async def append(self, data: str):
+        self.events.append(data)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(data) + "\n")
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def close(self):
+        self.closed = True
+        async with self._changed:
+            self._changed.notify_all()
+
+    def format(self, index: int) -> str:
+        # Event ids carry the job id, so EventSource's automatic Last-Event-ID header is
+        # enough to find the job again after a reconnect
+        lines = self.events[index].splitlines() or [""]
+        return f"id: {self.job.job_id}:{index + 1}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
+
+    async def follow(self, after: int = 0):
+        """Yield SSE messages for every event after id `after`, then new ones until the log closes."""
+        index = after
+        while True:
+            while index < len(self.events):
+                yield self.format(index)
+                index += 1
+            if self.closed:
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.closed)
+
+
+def parse_last_event_id(value: str | None) -> tuple[str | None, int]:
+    """Split a "<job_id>:<n>" event id into its parts; (None, 0) when absent or malformed."""
+    job_id, _, index = (value or "").partition(":")
+    if not job_id or not index.isdigit():
+        return None, 0
+    return job_id, int(index)
+
+
+class EssayPipeline:
+    """
+    One essay job, run as a background task that does not depend on any client connection.
+
+    Each stage checkpoints its output in the job directory: the draft and the critique
+    through task callbacks in the crew, then the markdown and the PDF. A rerun of the
+    same job skips every stage whose checkpoint exists, so a failed critique or a
+    crashed process costs only the stages that had not finished.
+
+    With `abandon_after` set, a job that no SSE client has followed for that many
+    seconds is cancelled: its crew run stops at its next LLM call, and a retry
+    resumes it from its checkpoints like any failed job. Until the crew's thread has
+    exited the job stays `busy`, so it is neither started again nor collected.
+    """
+
+    def __init__(self, job: Job, request: dict, runner_factory: Callable, renderer: RendererService,
+                 artifacts: ArtifactRegistry, on_finish: Callable[[Job], None], abandon_after: float | None = None):
+        self.job = job
+        self.request = request
+        self.runner_factory = runner_factory
+        self.renderer = renderer
+        self.artifacts = artifacts
+        self.on_finish = on_finish
+        self.log = EventLog(job)
+        self.failed = False
+        self.task: asyncio.Task | None = None
+        self.abandon_after = abandon_after
+        self.abandoned = False
+        self.followers = 0
+        # Read by the LLM clients in the crew's thread, which task cancellation does not reach
+        self.stop = threading.Event()
+        self._abandon_timer: asyncio.TimerHandle | None = None
+        # The blocking call in progress; cancelling the task does not stop it
+        self._thread: asyncio.Future | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    @property
+    def stopping(self) -> bool:
+        """Cancelled, with a blocking call of the job still running in its thread."""
+        return not self.running and self._thread is not None and not self._thread.done()
+
+    @property
+    def busy(self) -> bool:
+        return self.running or self.stopping
+
+    async def _in_thread(self, fn, *args, **kwargs):
+        """asyncio.to_thread(), keeping track of the call so the job stays busy until it returns."""
+        self._thread = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+        return await asyncio.shield(self._thread)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+        self._watch_followers()
+
+    def attach(self):
+        """An SSE client started following the log."""
+        self.followers += 1
+        self._watch_followers()
+
+    def detach(self):
+        """An SSE client went away."""
+        self.followers -= 1
+        self._watch_followers()
+
+    def _watch_followers(self):
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        if self.abandon_after is not None and self.followers == 0 and self.running:
+            self._abandon_timer = asyncio.get_running_loop().call_later(self.abandon_after, self._abandon)
+
+    def _abandon(self):
+        self._abandon_timer = None
+        if self.followers == 0 and self.running:
+            logger.info(f"Essay job {self.job.job_id} has had no client for {self.abandon_after}s; cancelling it")
+            self.abandoned = True
+            self.stop.set()
+            self.task.cancel()
+
+    async def _run(self):
+        try:
+            # One span per run; file conversion, crew tasks, agents, LLM calls, memory and
+            # rendering nest under it
+            with span("college_essay_stream", job_id=self.job.job_id, model=self.request["model"],
+                      memory=self.request.get("memory") or "default"):
+                await self._stages()
+        except asyncio.CancelledError:
+            self.failed = True
+            self.stop.set()
+            if self.abandoned:
+                await self.log.append(f"Cancelled: no client for {self.abandon_after}s. "
+                                      "Retry to resume from the last completed stage.")
+            raise
+        except Exception as e:
+            logger.exception(f"Essay job {self.job.job_id} failed")
+            self.failed = True
+            await self.log.append(f"Error: {e}. Retry to resume from the last completed stage.")
+        finally:
+            await self.log.close()
+            if self._thread is not None and not self._thread.done():
+                # Release the job to quota GC only once its thread stops writing to it
+                self._thread.add_done_callback(self._thread_stopped)
+            else:
+                self.on_finish(self.job)
+
+    def _thread_stopped(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.info(f"Cancelled essay job {self.job.job_id} stopped: {future.exception()}")
+        self.on_finish(self.job)
+
+    @staticmethod
+    def _critique_crew(crew_runner):
+        with open(crew_runner.checkpoint_path("draft"), "r", encoding="utf-8") as f:
+            return crew_runner.critique_crew(f.read())
+
+    async def _stages(self):
+        emit = self.log.append
+        r = self.request
+        output_file = self.job.path(r["student"].replace(" ", "-") + "-essay")
+        # Building the runner imports crewai on first use, and the crew reads its config; both block
+        crew_runner = await self._in_thread(self.runner_factory, r["model"], output_file, r.get("memory"))
+        # Loaded with the crew by runner_factory; copied into the kickoff thread by to_thread
+        from model_registry import stop_requested
+        stop_requested.set(self.stop)
+        done = [stage for stage in STAGES if os.path.exists(crew_runner.checkpoint_path(stage))]
+        await emit(f"Job id: {self.job.job_id}")
+        if done:
+            await emit(f"Resuming job; completed stages: {', '.join(done)}")
+
+        # Load file content
+        file_content = await self._in_thread(crew_runner.get_file_content, r["resume_file_path"])
+        await emit(f"File content loaded. Length: {len(file_content)} characters")
+        inputs = {
+            'file_content': file_content,
+            'program': r["program"],
+            'output_essay': "essay",
+            'college': r["college"],
+            'student': r["student"],
+            'model': r["model"]
+        }
+        crew_runner.remember_inputs(inputs)
+
+        if "critique" in done:
+            with open(crew_runner.checkpoint_path("critique"), "r", encoding="utf-8") as f:
+                result = f.read()
+        else:
+            for input_key, input_value in inputs.items():
+                await emit(f"Input: {input_key} - {input_value[:50]}...")
+            await emit("Starting crew execution...")
+            if "draft" in done:
+                custom_crew = await self._in_thread(self._critique_crew, crew_runner)
+                await emit("Using the saved draft; running the critic only")
+            else:
+                custom_crew = await self._in_thread(crew_runner.crew)
+            for agent in custom_crew.agents:
+                await emit(f"Agent role:{agent.role} is starting work")
+                await emit(f"Agent goal: {agent.goal} is starting work")
+                await emit(f"Agent backstory:{agent.backstory} is starting work")
+            result = await self._in_thread(custom_crew.kickoff, inputs=inputs)
+            await emit(f"Crew execution completed. Result: {result}")
+
+        # Render the validated essay to markdown deterministically, then convert to PDF
+        markdown_file = crew_runner.checkpoint_path("markdown")
+        if "markdown" not in done:
+            with span("essay.write_markdown"):
+                await self._in_thread(crew_runner.write_markdown, result)
+        pdf_file = crew_runner.checkpoint_path("pdf")
+        if "pdf" not in done:
+            await emit(f"Converting essay to PDF: {markdown_file} -> {pdf_file}")
+            # Render to a temporary name so a half-written PDF never counts as a checkpoint
+            pdf_result = await self.renderer.render_file(markdown_file, pdf_file + ".tmp")
+            if os.path.exists(pdf_file + ".tmp"):
+                os.replace(pdf_file + ".tmp", pdf_file)
+            await emit(f"PDF Conversion Result: {pdf_result}")
+            if not os.path.exists(pdf_file):
+                raise RuntimeError(pdf_result)
+
+        # Hand out a download id; the PDF bytes are fetched separately from /artifacts
+        if os.path.exists(pdf_file):
+            artifact_id = self.artifacts.register(pdf_file, media_type="application/pdf")
+            await emit(f"PDF_ARTIFACT:{artifact_id}")
+        await emit("Streaming completed")
+
+
+class PipelineManager:
+    """Starts essay jobs and finds them again, in memory or on disk, when a client reconnects or retries."""
+
+    def __init__(self, job_store: ArtifactStore, runner_factory: Callable, renderer: RendererService,
+                 artifacts: ArtifactRegistry, abandon_after: float | None = None):
+        self.job_store = job_store
+        self.runner_factory = runner_factory
+        self.renderer = renderer
+        self.artifacts = artifacts
+        self.abandon_after = abandon_after
+        self._pipelines: dict[str, EssayPipeline] = {}
+
+    def _start(self, job: Job, request: dict) -> EssayPipeline:
+        pipeline = EssayPipeline(job, request, self.runner_factory, self.renderer, self.artifacts, self._finished,
+                                 self.abandon_after)
+        self._pipelines[job.job_id] = pipeline
+        pipeline.start()
+        return pipeline
+
+    def _finished(self, job: Job):
+        self.job_store.finish_job(job)
+
+    def start(self, request: dict) -> EssayPipeline:
+        """Create a job for a new request and start it. Raises QuotaExceededError when the store is full."""
+        # Forget finished pipelines whose job directories have been collected
+        self._pipelines = {
+            job_id: p for job_id, p in self._pipelines.items() if p.busy or os.path.isdir(p.job.root)
+        }
+        job = self.job_store.create_job()
+        with open(job.path("request.json"), "w", encoding="utf-8") as f:
+            json.dump(request, f)
+        return self._start(job, request)
+
+    def resume(self, job_id: str) -> EssayPipeline | None:
+        """
+        The pipeline for job_id. A running or successfully finished one is returned as is,
+        so the client just replays its events; a failed or unknown one (e.g. after a
+        restart) is started again from its last checkpoint. None if the job is gone.
+        Raises JobStoppingError while a cancelled run's crew thread is still working.
+        """
+        pipeline = self._pipelines.get(job_id)
+        if pipeline is not None and pipeline.stopping:
+            raise JobStoppingError(f"Job {job_id} is still stopping its previous run, retry shortly")
+        if pipeline is not None and (pipeline.running or not pipeline.failed):
+            return pipeline
+        job = self.job_store.resume_job(job_id)
+        if job is None or not os.path.exists(job.path("request.json")):
+            return None
+        with open(job.path("request.json"), "r", encoding="utf-8") as f:
+            request = json.load(f)
+        return self._start(job, request)
+
+    async def shutdown(self):
+        tasks = [p.task for p in self._pipelines.values() if p.running]
+        for pipeline in self._pipelines.values():
+            pipeline.stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
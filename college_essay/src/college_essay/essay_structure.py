@@ -0,0 +1,225 @@
+import json
+import re
+from dataclasses import dataclass
+
+from pydantic import BaseModel, validator, ValidationError
+
+from text_stats import count_sentences, count_words
+
+MAX_REPAIR_ATTEMPTS = 2
+JSON_BLOCK = re.compile(r"\{.*\}", re.DOTALL)
+# A JSON string's contents, complete (up to its closing quote) or still arriving
+_STRING = r'"((?:[^"\\]|\\.)*)'
+FIELD_DONE = re.compile(r'"(heading|opening_paragraph|closing_paragraph)"\s*:\s*' + _STRING + '"')
+FIELD_OPEN = re.compile(r'"(opening_paragraph|closing_paragraph)"\s*:\s*' + _STRING + r'\\?$')
+BODY_START = re.compile(r'"body_paragraphs"\s*:\s*\[')
+BODY_ITEM = re.compile(r'\s*' + _STRING + r'"\s*([,\]])')
+
+
+class EssayDraft(BaseModel):
+    """Shape the LLM is asked to return. Kept free of validators so crewai never
+    falls back to an extra conversion call when a draft is slightly out of spec."""
+    heading: str
+    opening_paragraph: str
+    body_paragraphs: list[str]
+    closing_paragraph: str
+
+
+class CollegeEssayModel(EssayDraft):
+    @validator('heading')
+    def check_heading(cls, v):
+        if count_words(v) < 4:
+            raise ValueError("Heading must be at least 4 words")
+        return v
+
+    @validator('opening_paragraph')
+    def check_opening_paragraph(cls, v):
+        sentence_count = count_sentences(v)
+        if sentence_count < 2 or sentence_count > 3:
+            raise ValueError("Opening paragraph must have 2-3 sentences")
+        return v
+
+    @validator('body_paragraphs')
+    def check_body_paragraphs(cls, v):
+        if not (2 <= len(v) <= 3):
+            raise ValueError("There must be 2-3 body paragraphs")
+        for paragraph in v:
+            if count_sentences(paragraph) < 3:
+                raise ValueError("Each body paragraph must have at least 3 sentences")
+        return v
+
+    @validator('closing_paragraph')
+    def check_closing_paragraph(cls, v):
+        sentence_count = count_sentences(v)
+        if sentence_count < 2 or sentence_count > 3:
+            raise ValueError("Closing paragraph must have 2-3 sentences")
+        return v
+
+
+def parse_draft(raw: str) -> EssayDraft:
+    """Parse an LLM reply into an EssayDraft, tolerating code fences and surrounding prose."""
+    match = JSON_BLOCK.search(raw)
+    if match is None:
+        raise ValueError("No JSON object found in essay output")
+    return EssayDraft.model_validate_json(match.group(0))
+
+
+def validate_essay(draft: EssayDraft) -> tuple[CollegeEssayModel | None, dict[str, str]]:
+    """Validate a draft against CollegeEssayModel, returning the model or the failing fields."""
+    try:
+        return CollegeEssayModel(**draft.model_dump()), {}
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors():
+            errors.setdefault(str(error["loc"][0]), error["msg"].removeprefix("Value error, "))
+        return None, errors
+
+
+@dataclass(frozen=True)
+class Violation:
+    field: str
+    message: str
+
+
+class EssayOutOfSpec(ValueError):
+    """Raised by EssayStreamValidator when a field of the draft can no longer meet the essay spec."""
+
+    def __init__(self, violation: Violation):
+        super().__init__(f"{violation.field}: {violation.message}")
+        self.violation = violation
+
+
+def _unescape(raw: str) -> str:
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return raw
+
+
+class EssayStreamValidator:
+    """
+    Checks an EssayDraft against CollegeEssayModel's rules while its JSON is still streaming in.
+
+    Feed it the chunks of the LLM's reply. Every field is checked as soon as its
+    string is complete, and the opening and closing paragraphs are also checked while
+    they arrive, since their sentence count only grows. The first violation is kept in
+    `violation` and raised as EssayOutOfSpec, so the caller can stop the generation and
+    re-prompt instead of paying for the rest of an essay that will fail validation.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.violation: Violation | None = None
+        self._checked: set[str] = set()
+        self._body_checked = 0
+
+    def feed(self, chunk: str):
+        """Consume the next chunk of generated text."""
+        if self.violation is not None:
+            raise EssayOutOfSpec(self.violation)
+        self.text += chunk
+        # Fields only complete on a quote, and sentences only end on a terminator
+        if '"' in chunk:
+            self._check_fields()
+            self._check_body()
+        if any(c in chunk for c in ".!?"):
+            self._check_in_progress()
+
+    def _fail(self, field: str, message: str):
+        self.violation = Violation(field, message)
+        raise EssayOutOfSpec(self.violation)
+
+    def _check_fields(self):
+        for match in FIELD_DONE.finditer(self.text):
+            field, value = match.group(1), _unescape(match.group(2))
+            if field in self._checked:
+                continue
+            self._checked.add(field)
+            if field == "heading":
+                if count_words(value) < 4:
+                    self._fail(field, "Heading must be at least 4 words")
+            elif not 2 <= count_sentences(value) <= 3:
+                name = "Opening" if field == "opening_paragraph" else "Closing"
+                self._fail(field, f"{name} paragraph must have 2-3 sentences")
+
+    def _check_body(self):
+        start = BODY_START.search(self.text)
+        if start is None:
+            return
+        pos, items, closed = start.end(), [], False
+        while not closed:
+            match = BODY_ITEM.match(self.text, pos)
+            if match is None:
+                break
+            items.append(_unescape(match.group(1)))
+            pos, closed = match.end(), match.group(2) == "]"
+        for paragraph in items[self._body_checked:]:
+            self._body_checked += 1
+            if self._body_checked > 3:
+                self._fail("body_paragraphs", "There must be 2-3 body paragraphs")
+            if count_sentences(paragraph) < 3:
+                self._fail("body_paragraphs", "Each body paragraph must have at least 3 sentences")
+        if closed and len(items) < 2:
+            self._fail("body_paragraphs", "There must be 2-3 body paragraphs")
+
+    def _check_in_progress(self):
+        match = FIELD_OPEN.search(self.text)
+        if match is None:
+            return
+        value = _unescape(match.group(2))
+        complete = count_sentences(value)
+        if not value.rstrip().endswith((".", "!", "?", '"', "'", "’", "”", ")", "]")):
+            complete -= 1  # the last sentence is still being generated
+        if complete > 3:
+            name = "Opening" if match.group(1) == "opening_paragraph" else "Closing"
+            self._fail(match.group(1), f"{name} paragraph must have 2-3 sentences")
+
+
+def _repair_prompt(draft: EssayDraft, field: str, problem: str, inputs: dict) -> str:
+    current = json.dumps(getattr(draft, field), ensure_ascii=False)
+    return f"""You are fixing one part of a college application essay for {inputs.get('student', 'the student')}.
+
+The full essay, for context:
+{render_markdown(draft)}
+
+Only rewrite the "{field}" field. It currently is:
+{current}
+
+Problem: {problem}
+
+Keep the same voice and facts. Return only a JSON object of the form {{"{field}": ...}} with the same type as the current value."""
+
+
+def repair_essay(llm, draft: EssayDraft, inputs: dict, max_attempts: int = MAX_REPAIR_ATTEMPTS) -> tuple[EssayDraft, dict[str, str]]:
+    """
+    Re-prompt for just the fields that fail validation, at most max_attempts rounds.
+    Returns the (possibly still invalid) draft and any remaining errors.
+    """
+    _, errors = validate_essay(draft)
+    for _ in range(max_attempts):
+        if not errors:
+            break
+        values = draft.model_dump()
+        for field, problem in errors.items():
+            reply = llm.call([{"role": "user", "content": _repair_prompt(draft, field, problem, inputs)}])
+            match = JSON_BLOCK.search(reply or "")
+            if match is None:
+                continue
+            try:
+                values[field] = json.loads(match.group(0))[field]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+        try:
+            draft = EssayDraft(**values)
+        except ValidationError:
+            pass  # a repair changed a field's type; keep the previous draft
+        _, errors = validate_essay(draft)
+    return draft, errors
+
+
+def render_markdown(essay: EssayDraft) -> str:
+    """Deterministic markdown layout for an essay; replaces the old markdown agent."""
+    parts = [f"# {essay.heading.strip().lstrip('#').strip()}", essay.opening_paragraph.strip()]
+    parts.extend(paragraph.strip() for paragraph in essay.body_paragraphs)
+    parts.append(essay.closing_paragraph.strip())
+    return "\n\n".join(parts) + "\n"
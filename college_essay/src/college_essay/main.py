@@ -1,10 +1,21 @@
 #!/usr/bin/env python
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
 import sys
+import threading
+import time
 import warnings
-
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-from college_essay.crew import CollegeEssay
+# crew.py and its helpers use flat imports, so run with this folder on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from essay_memory import MEMORY_MODES
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
@@ -13,42 +24,195 @@ warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 # Replace with inputs you want to test with, it will automatically
 # interpolate any tasks and agents information
 
+MANIFEST_FIELDS = ("student", "program", "college", "resume")
+# One essay per student, program and college; these name its output files
+ESSAY_KEY = ("student", "program", "college")
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")
+
+
+def load_manifest(path: str) -> list[dict]:
+    """
+    Read essay jobs from a CSV (with a header row), JSON list or JSON Lines file.
+    Each row needs student, program, college and resume; model and memory are optional.
+    Resume paths are relative to the manifest's folder.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        elif path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for i, row in enumerate(rows, 1):
+        missing = [field for field in MANIFEST_FIELDS if not row.get(field)]
+        if missing:
+            raise ValueError(f"Manifest row {i} is missing {', '.join(missing)}")
+        row["resume"] = os.path.join(base, row["resume"])
+    return rows
+
+
+def essay_key(row: dict) -> tuple[str, ...]:
+    return tuple(row[k].strip() for k in ESSAY_KEY)
+
+
+def output_prefix(output_dir: str, row: dict) -> str:
+    # The slug drops non-ASCII characters, so the hash keeps e.g. two names in another script apart
+    digest = hashlib.sha1("\0".join(essay_key(row)).encode("utf-8")).hexdigest()[:8]
+    parts = [_slug(row[k]) for k in ESSAY_KEY]
+    return os.path.join(output_dir, "-".join([*filter(None, parts), digest, "essay"]))
+
+
+def dedupe(rows: list[dict]) -> tuple[list[dict], int]:
+    """The manifest's rows with repeats of an essay dropped, keeping the first; and how many were dropped."""
+    seen = set()
+    unique = []
+    for row in rows:
+        key = essay_key(row)
+        if key not in seen:
+            seen.add(key)
+            unique.append(row)
+    return unique, len(rows) - len(unique)
+
+
+def is_complete(prefix: str) -> bool:
+    # The marker is written last, so a run interrupted halfway is redone
+    return os.path.exists(prefix + ".done.json") and os.path.exists(prefix + ".pdf")
+
+
+class EssayBatch:
+    """Runs every essay in a manifest exactly once, `workers` at a time."""
+
+    def __init__(self, output_dir: str, model: str, workers: int = 2, memory: str | None = "off",
+                 force: bool = False):
+        self.output_dir = output_dir
+        self.model = model
+        self.workers = workers
+        self.memory = memory
+        self.force = force
+        self._renderer = None
+        self._render_lock = threading.Lock()
+
+    def _render_pdf(self, markdown_file: str, pdf_file: str):
+        # One warm renderer for the batch; WeasyPrint documents are rendered one at a time
+        with self._render_lock:
+            if self._renderer is None:
+                from renderer import PDFRenderer
+                self._renderer = PDFRenderer()
+            self._renderer.render_file(markdown_file, pdf_file)
+
+    def run_one(self, row: dict) -> dict:
+        prefix = output_prefix(self.output_dir, row)
+        record = {"student": row["student"], "program": row["program"], "college": row["college"],
+                  "pdf": prefix + ".pdf"}
+        if not self.force and is_complete(prefix):
+            return {**record, "status": "skipped"}
+
+        from crew import CollegeEssay
+        from tools.file_converter import FileConverter
+
+        start = time.perf_counter()
+        try:
+            essay = CollegeEssay(row.get("model") or self.model, prefix, row.get("memory") or self.memory)
+            inputs = {
+                "file_content": FileConverter.convert_to_text(row["resume"]),
+                "program": row["program"],
+                "output_essay": "essay",
+                "college": row["college"],
+                "student": row["student"],
+                "model": row.get("model") or self.model,
+            }
+            result = essay.crew().kickoff(inputs=inputs)
+            markdown_file = essay.write_markdown(result)
+            self._render_pdf(markdown_file, prefix + ".pdf")
+        except Exception as e:
+            return {**record, "status": "failed", "seconds": time.perf_counter() - start, "error": str(e)}
+        record.update(status="completed", seconds=time.perf_counter() - start)
+        with open(prefix + ".done.json", "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        return record
+
+    def run(self, rows: list[dict]) -> dict:
+        os.makedirs(self.output_dir, exist_ok=True)
+        started_at = datetime.now()
+        start = time.perf_counter()
+        essays = []
+        # Two runs of one essay would write the same files at the same time
+        rows, duplicates = dedupe(rows)
+        if duplicates:
+            print(f"Skipping {duplicates} duplicate manifest row(s)")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="essay") as executor:
+            futures = [executor.submit(self.run_one, row) for row in rows]
+            for future in as_completed(futures):
+                record = future.result()
+                essays.append(record)
+                print(f"[{record['status']}] {record['student']} - {record['college']}"
+                      + (f" ({record['seconds']:.1f}s)" if "seconds" in record else "")
+                      + (f": {record['error']}" if "error" in record else ""))
+        wall = time.perf_counter() - start
+        completed = [e for e in essays if e["status"] == "completed"]
+        seconds = [e["seconds"] for e in completed]
+        return {
+            "started_at": started_at.isoformat(),
+            "wall_seconds": wall,
+            "workers": self.workers,
+            "model": self.model,
+            "completed": len(completed),
+            "skipped": sum(e["status"] == "skipped" for e in essays),
+            "failed": sum(e["status"] == "failed" for e in essays),
+            "duplicates": duplicates,
+            "essays_per_minute": len(completed) / wall * 60 if wall else 0.0,
+            "mean_essay_seconds": sum(seconds) / len(seconds) if seconds else None,
+            "essays": essays,
+        }
+
+
 def run():
     """
-    Run the crew.
+    Generate essays for every row of a manifest.
+
+        college_essay --manifest students.csv --output-dir essays --model gpt-4o --workers 4
     """
-    crew = CollegeEssay()
-    file_content = crew.get_file_content()
-    inputs = {
-        'file_content': file_content,
-        'program': 'Business',
-        'output_essay': 'essay',
-        'student': 'Rika Pinto',
-    }
-    for input in inputs:
-        print((input, inputs[input]))
-    CollegeEssay().crew().kickoff(inputs=inputs)
-    # Convert the generated essay to PDF
-    input_file = "/home/albert/Documents/college_essay_version2/essay.md"  # This should match the output_file in essay_task
-    output_file = "/home/albert/Documents/college_essay_version2/essay.pdf"
-    crew.convert_to_pdf(input_file, output_file)
-    try:
-        CollegeEssay().crew().kickoff(inputs=inputs)
-    except Exception as e:
-        raise Exception(f"An error occurred while running the crew: {e}")
-    
+    parser = argparse.ArgumentParser(description="Generate college essays in batch from a manifest.")
+    parser.add_argument("--manifest", required=True, help="CSV, JSON or JSONL with student, program, college, resume")
+    parser.add_argument("--output-dir", default="essays")
+    parser.add_argument("--model", default="groq/llama-3.3-70b-versatile")
+    parser.add_argument("--workers", type=int, default=2, help="Essays generated in parallel")
+    parser.add_argument("--memory", default="off", choices=MEMORY_MODES)
+    parser.add_argument("--force", action="store_true", help="Regenerate essays that are already complete")
+    parser.add_argument("--summary", help="Summary file (default <output-dir>/summary.json)")
+    args = parser.parse_args()
+
+    batch = EssayBatch(args.output_dir, args.model, workers=args.workers, memory=args.memory, force=args.force)
+    summary = batch.run(load_manifest(args.manifest))
+    summary_file = args.summary or os.path.join(args.output_dir, "summary.json")
+    with open(summary_file, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"{summary['completed']} completed, {summary['skipped']} skipped, {summary['failed']} failed "
+          f"in {summary['wall_seconds']:.1f}s ({summary['essays_per_minute']:.2f} essays/min). Summary: {summary_file}")
+    if summary["failed"]:
+        sys.exit(1)
+
+
 def train():
     """
     Train the crew for a given number of iterations.
     """
+    from crew import CollegeEssay
+
     inputs = {
         "topic": "AI LLMs"
     }
     try:
-        CollegeEssay().crew().train(n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs)
+        CollegeEssay("groq", os.path.join("tmp", "training-essay")).crew().train(
+            n_iterations=int(sys.argv[1]), filename=sys.argv[2], inputs=inputs)
 
     except Exception as e:
         raise Exception(f"An error occurred while training the crew: {e}")
 
 
-
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,313 @@
+import copy
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import partial
+from logging import getLogger
+from pathlib import Path
+from typing import Callable
+
+from crewai import LLM
+
+from settings import ModelSpec, settings
+from tracing import span
+
+try:
+    # Under the bakasura gateway every service's LLM calls go through one scheduler,
+    # and are recorded or replayed with the other services' fixtures
+    from bakasura_flow.llm_replay import crew_request, llm_recorder
+    from bakasura_flow.scheduler import llm_scheduler
+except ImportError:
+    llm_scheduler = llm_recorder = None
+
+logger = getLogger(__name__)
+
+ROLE_TIERS = {"draft": "fast", "critic": "strong"}
+
+# Set by the essay pipeline for its crew run (asyncio.to_thread copies it into the kickoff
+# thread): once the event is set, the run's remaining LLM calls fail instead of spending tokens
+stop_requested: ContextVar[threading.Event | None] = ContextVar("stop_requested", default=None)
+
+
+# The stream check of the call in progress in this thread; crewai emits the stream's
+# chunk events synchronously in the calling thread
+_stream_check: ContextVar = ContextVar("stream_check", default=None)
+_chunk_events: bool | None = None
+_chunk_events_lock = threading.Lock()
+
+
+class CallCancelled(RuntimeError):
+    """The essay job this call belongs to was cancelled."""
+
+
+def _on_chunk(source, event):
+    check = _stream_check.get()
+    if check is not None:
+        check.feed(event.chunk)
+
+
+def _watch_chunk_events() -> bool:
+    """Subscribe to crewai's stream chunk events once; False when this crewai has none."""
+    global _chunk_events
+    with _chunk_events_lock:
+        if _chunk_events is None:
+            try:
+                from crewai.utilities.events import LLMStreamChunkEvent, crewai_event_bus
+            except ImportError:
+                logger.info("crewai has no stream chunk events; drafts are validated once complete")
+                _chunk_events = False
+            else:
+                crewai_event_bus.on(LLMStreamChunkEvent)(_on_chunk)
+                _chunk_events = True
+        return _chunk_events
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    errors: int = 0
+    consecutive_errors: int = 0
+    early_stops: int = 0
+    ewma_seconds: float | None = None
+    last_seconds: float | None = None
+    in_flight: int = 0
+    total_seconds: float = field(default=0.0, repr=False)
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "consecutive_errors": self.consecutive_errors,
+            "early_stops": self.early_stops,
+            "in_flight": self.in_flight,
+            "ewma_seconds": self.ewma_seconds,
+            "last_seconds": self.last_seconds,
+            "mean_seconds": self.total_seconds / self.calls if self.calls else None,
+        }
+
+
+class TrackedLLM(LLM):
+    """An LLM shared by every crew: caps in-flight requests and reports each call's latency."""
+
+    def __init__(self, registry: "ModelRegistry", name: str, spec: ModelSpec, **kwargs):
+        super().__init__(**kwargs)
+        self.registry = registry
+        self.name = name
+        self.spec = spec
+        self._slots = threading.BoundedSemaphore(spec.max_concurrency)
+        self.stream_check: Callable | None = None
+
+    def with_stream_check(self, factory: Callable) -> "TrackedLLM":
+        """
+        A copy of this client that streams its replies into `factory()`, an object with
+        `feed(chunk)`, `violation` and `text`. When feed() finds a violation the generation
+        stops and is re-prompted with the problem, at most `settings.stream_restarts`
+        times. The copy shares the client's request slots and stats.
+        """
+        if not settings.stream_validation or not _watch_chunk_events():
+            return self
+        client = copy.copy(self)
+        client.stream = True
+        client.stream_check = factory
+        return client
+
+    def call(self, messages, *args, **kwargs):
+        stop = stop_requested.get()
+        if stop is not None and stop.is_set():
+            raise CallCancelled(f"{self.name}: essay job cancelled")
+        if self.stream_check is None:
+            return self._slotted(messages, *args, **kwargs)
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        for restart in range(settings.stream_restarts + 1):
+            # The last attempt runs unchecked; the task's guardrail repairs what is left
+            check = self.stream_check() if restart < settings.stream_restarts else None
+            token = _stream_check.set(check)
+            try:
+                result = self._slotted(messages, *args, **kwargs)
+            except Exception:
+                if check is None or check.violation is None:
+                    raise
+                result = None
+            finally:
+                _stream_check.reset(token)
+            if check is None or check.violation is None:
+                return result
+            violation = check.violation
+            self.registry.stopped_early(self.name, violation)
+            messages = [*messages, {"role": "assistant", "content": check.text}, {"role": "user", "content": (
+                f"Stop. The {violation.field} is out of spec: {violation.message}. "
+                "Write your complete answer again from the start, with this fixed."
+            )}]
+
+    def _slotted(self, messages, *args, **kwargs):
+        with span("llm.call", model=self.name):
+            # The model's own slot first: a call waiting on a busy model must not hold a
+            # shared scheduler slot that calls to other models could use
+            if not self._slots.acquire(timeout=self.spec.timeout):
+                raise TimeoutError(f"{self.name}: no free request slot after {self.spec.timeout}s")
+            try:
+                if llm_scheduler is not None:
+                    with llm_scheduler.slot():
+                        return self._call(messages, *args, **kwargs)
+                return self._call(messages, *args, **kwargs)
+            finally:
+                self._slots.release()
+
+    def _call(self, messages, *args, **kwargs):
+        self.registry.started(self.name)
+        start = time.perf_counter()
+        ok = False
+        try:
+            if llm_recorder is not None:
+                result = llm_recorder.call("crew", crew_request(self, messages),
+                                           partial(super().call, messages, *args, **kwargs))
+            else:
+                result = super().call(messages, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            # A reply stopped early for being out of spec is not the model failing
+            check = _stream_check.get()
+            ok = ok or (check is not None and check.violation is not None)
+            self.registry.finished(self.name, time.perf_counter() - start, ok)
+
+
+class ModelRegistry:
+    """
+    Pre-built, process-wide LLM clients keyed by the model names the UI offers.
+
+    `route(requested, role)` picks the client for an agent: within the requested
+    model's group, drafting goes to the "fast" tier and critique to the "strong"
+    tier, choosing the lowest recent latency when a tier has several models. A failed
+    call counts as taking the model's full timeout, so a model that keeps failing is
+    routed around; a model with no calls yet scores the average of the measured
+    models whose last call succeeded, or best if none did.
+    Decisions and call latencies are appended to `settings.routing_log`.
+    """
+
+    def __init__(self, specs: dict[str, ModelSpec] = settings.models, routing_enabled: bool = settings.routing_enabled,
+                 alpha: float = settings.latency_ewma_alpha, log_path: str | None = settings.routing_log):
+        self.specs = dict(specs)
+        self.routing_enabled = routing_enabled
+        self.alpha = alpha
+        self.log_path = Path(log_path) if log_path else None
+        self._clients: dict[str, TrackedLLM] = {}
+        self._stats: dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def spec(self, name: str) -> ModelSpec:
+        """The spec for a model name the UI sent; raises ValueError when none fits."""
+        if name in self.specs:
+            return self.specs[name]
+        if name.startswith("groq"):
+            # Any groq/... name the UI sends maps onto the configured groq models
+            spec = next((s for s in self.specs.values() if s.group == "groq" and s.tier == "strong"), None)
+            if spec is None:
+                raise ValueError(f"Unknown model {name!r}: no strong groq model is configured in ESSAY_MODELS")
+            return spec
+        # Anything unknown is a local Ollama model, in a group of its own
+        return ModelSpec(model=f"ollama/{name}", group=f"ollama/{name}", base_url=settings.ollama_base_url,
+                         max_concurrency=settings.ollama_max_concurrency, timeout=settings.ollama_timeout)
+
+    def get(self, name: str) -> TrackedLLM:
+        """The shared client for a model name, built on first use."""
+        return self._client(self.spec(name))
+
+    def _client(self, spec: ModelSpec) -> TrackedLLM:
+        with self._lock:
+            client = self._clients.get(spec.model)
+            if client is None:
+                kwargs = {"model": spec.model, "timeout": spec.timeout}
+                if spec.temperature is not None:
+                    kwargs["temperature"] = spec.temperature
+                if spec.max_tokens is not None:
+                    kwargs["max_tokens"] = spec.max_tokens
+                if spec.base_url:
+                    kwargs["base_url"] = spec.base_url
+                if spec.api_key_env:
+                    kwargs["api_key"] = os.getenv(spec.api_key_env)
+                client = self._clients[spec.model] = TrackedLLM(self, spec.model, spec, **kwargs)
+                self._stats.setdefault(spec.model, ModelStats())
+            return client
+
+    def route(self, requested: str, role: str) -> TrackedLLM:
+        """Pick the client for an agent role ("draft" or "critic")."""
+        spec = self.spec(requested)
+        chosen = spec
+        candidates = [spec]
+        if self.routing_enabled and role in ROLE_TIERS:
+            tier = ROLE_TIERS[role]
+            candidates = [s for s in self.specs.values() if s.group == spec.group and s.tier == tier] or [spec]
+        scores = self._scores(candidates)
+        if len(candidates) > 1:
+            # Ties keep the requested model
+            chosen = min(candidates, key=lambda s: (scores[s.model], s.model != spec.model))
+        self._record({
+            "event": "route",
+            "requested": requested,
+            "role": role,
+            "chosen": chosen.model,
+            "candidates": scores,
+        })
+        return self._client(chosen)
+
+    def _scores(self, candidates: list[ModelSpec]) -> dict[str, float]:
+        """Latency EWMA per candidate; unmeasured ones get the mean of the working measured ones."""
+        with self._lock:
+            stats = {s.model: self._stats[s.model] for s in candidates
+                     if s.model in self._stats and self._stats[s.model].ewma_seconds is not None}
+        measured = {model: s.ewma_seconds for model, s in stats.items()}
+        working = [s.ewma_seconds for s in stats.values() if not s.consecutive_errors]
+        neutral = sum(working) / len(working) if working else 0.0
+        return {s.model: measured.get(s.model, neutral) for s in candidates}
+
+    def started(self, model: str):
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).in_flight += 1
+
+    def finished(self, model: str, seconds: float, ok: bool):
+        client = self._clients.get(model)
+        # A failure costs the caller a retry, so it weighs like a call that ran into its timeout
+        sample = seconds if ok or client is None else max(seconds, client.spec.timeout)
+        with self._lock:
+            stats = self._stats.setdefault(model, ModelStats())
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.errors += not ok
+            stats.consecutive_errors = 0 if ok else stats.consecutive_errors + 1
+            stats.total_seconds += seconds
+            stats.last_seconds = seconds
+            previous = stats.ewma_seconds
+            stats.ewma_seconds = sample if previous is None else self.alpha * sample + (1 - self.alpha) * previous
+        self._record({"event": "call", "model": model, "seconds": round(seconds, 3), "ok": ok})
+
+    def stopped_early(self, model: str, violation):
+        """A streamed reply was cut off because the part generated so far was already out of spec."""
+        with self._lock:
+            self._stats.setdefault(model, ModelStats()).early_stops += 1
+        logger.info(f"{model}: stopped a reply early, {violation.field}: {violation.message}")
+        self._record({"event": "early_stop", "model": model, "field": violation.field, "message": violation.message})
+
+    def _record(self, entry: dict):
+        if self.log_path is None:
+            return
+        entry["ts"] = time.time()
+        try:
+            with self._log_lock:
+                self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write model routing log: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {model: stats.snapshot() for model, stats in self._stats.items()}
+
+
+model_registry = ModelRegistry()
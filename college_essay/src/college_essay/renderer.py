@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from tracing import record_span, span
+
+RENDER_WORKERS = int(os.getenv("ESSAY_RENDER_WORKERS", "2"))
+
+ESSAY_CSS = """
+@page {
+    margin: 1in;
+    size: letter;
+}
+body {
+    font-family: 'Arial', sans-serif;
+    line-height: 1.6;
+    font-size: 12pt;
+    margin: 0;
+    padding: 0;
+}
+h1 {
+    color: #2c3e50;
+    font-size: 18pt;
+    margin-bottom: 1em;
+}
+h2 {
+    color: #34495e;
+    font-size: 16pt;
+    margin-top: 1.5em;
+}
+p {
+    margin-bottom: 1em;
+    text-align: justify;
+}
+.content {
+    max-width: 8.5in;
+    margin: 0 auto;
+    padding: 1em;
+}
+"""
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+    <head><meta charset="UTF-8"></head>
+    <body><div class="content">{body}</div></body>
+</html>"""
+
+
+class PDFRenderer:
+    """Markdown to PDF renderer that keeps the parsed stylesheet, fonts and markdown parser warm."""
+
+    def __init__(self, css: str = ESSAY_CSS):
+        # WeasyPrint and markdown are imported here, in the worker processes, not at app startup
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.font_config = FontConfiguration()
+        self.stylesheet = CSS(string=css, font_config=self.font_config)
+        # WeasyPrint reuses loaded images/resources across documents through this dict
+        self.resource_cache = {}
+        self._local = threading.local()
+
+    def _markdown(self) -> "markdown.Markdown":
+        # markdown.Markdown instances are not thread-safe, so keep one per thread
+        md = getattr(self._local, "md", None)
+        if md is None:
+            import markdown
+            md = self._local.md = markdown.Markdown(extensions=["extra"])
+        return md
+
+    def markdown_to_html(self, text: str) -> str:
+        md = self._markdown()
+        md.reset()
+        return md.convert(text)
+
+    def render(self, markdown_text: str, output_file: str) -> dict[str, tuple[int, int]]:
+        """Render markdown text to a PDF file. Returns when each phase started and ended, in Unix nanoseconds."""
+        from weasyprint import HTML
+
+        started = time.time_ns()
+        html = HTML_TEMPLATE.format(body=self.markdown_to_html(markdown_text))
+        converted = time.time_ns()
+        HTML(string=html).write_pdf(
+            output_file,
+            stylesheets=[self.stylesheet],
+            font_config=self.font_config,
+            cache=self.resource_cache,
+        )
+        return {"pdf.markdown_to_html": (started, converted), "pdf.weasyprint": (converted, time.time_ns())}
+
+    def render_file(self, input_file: str, output_file: str) -> dict[str, tuple[int, int]]:
+        with open(input_file, "r", encoding="utf-8") as f:
+            return self.render(f.read(), output_file)
+
+
+# Each pool worker process builds its own warm renderer once, in the initializer
+_worker_renderer: PDFRenderer | None = None
+
+
+def _init_worker():
+    global _worker_renderer
+    _worker_renderer = PDFRenderer()
+
+
+def _render_file_in_worker(input_file: str, output_file: str) -> dict[str, tuple[int, int]]:
+    return _worker_renderer.render_file(input_file, output_file)
+
+
+def _ping_worker():
+    return os.getpid()
+
+
+class RendererService:
+    """Runs PDF rendering in a pool of worker processes, off the event loop."""
+
+    def __init__(self, workers: int = RENDER_WORKERS):
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor
+
+    async def warm_up(self):
+        """Start every worker so the first essay doesn't pay for stylesheet parsing."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, _ping_worker) for _ in range(self.workers)])
+
+    async def render_file(self, input_file: str, output_file: str) -> str:
+        """Convert a markdown file to PDF, returning a status message like the old convert_to_pdf."""
+        loop = asyncio.get_running_loop()
+        try:
+            with span("pdf.render", workers=self.workers) as render_span:
+                phases = await loop.run_in_executor(self.executor, _render_file_in_worker, input_file, output_file)
+                # The worker process timed its phases; they become child spans here
+                for name, (start_ns, end_ns) in phases.items():
+                    record_span(name, start_ns, end_ns, parent=render_span)
+            if not os.path.exists(output_file):
+                raise Exception("PDF file was not created")
+            return "PDF conversion successful"
+        except Exception as e:
+            return f"Conversion failed: {str(e)}"
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
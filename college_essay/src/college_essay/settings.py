@@ -0,0 +1,58 @@
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings
+
+
+class ModelSpec(BaseModel):
+    """One entry of the model registry. `group` holds models that share credentials,
+    so routing never switches a request to a provider the user didn't pick."""
+    model: str
+    group: str
+    tier: str = "strong"  # "fast" models draft, "strong" models critique
+    base_url: str | None = None
+    api_key_env: str | None = None
+    temperature: float | None = 0.7
+    max_tokens: int | None = 4096
+    timeout: float = 120.0  # seconds, per request
+    max_concurrency: int = 4  # in-flight requests per model, across all essays
+
+
+DEFAULT_MODELS = {
+    "groq/llama-3.3-70b-versatile": ModelSpec(
+        model="groq/llama-3.3-70b-versatile", group="groq", tier="strong",
+        base_url="https://api.groq.com/openai/v1", api_key_env="GROQ_API_KEY"),
+    "groq/llama-3.1-8b-instant": ModelSpec(
+        model="groq/llama-3.1-8b-instant", group="groq", tier="fast",
+        base_url="https://api.groq.com/openai/v1", api_key_env="GROQ_API_KEY"),
+    "gpt-4o": ModelSpec(model="gpt-4o", group="openai", tier="strong", max_concurrency=8),
+    "gpt-4o-mini": ModelSpec(model="gpt-4o-mini", group="openai", tier="fast", max_concurrency=8),
+    "gpt-3.5-turbo": ModelSpec(model="gpt-3.5-turbo", group="openai", tier="fast", max_concurrency=8),
+    # Reasoning models reject temperature and are slow, so they are only used when picked
+    "o1-preview": ModelSpec(model="o1-preview", group="o1-preview", temperature=None, max_tokens=None, timeout=300),
+    "o1-mini": ModelSpec(model="o1-mini", group="o1-mini", temperature=None, max_tokens=None, timeout=300),
+    "claude-2": ModelSpec(model="claude-2", group="anthropic", api_key_env="ANTHROPIC_API_KEY"),
+}
+
+
+class Settings(BaseSettings):
+    models: dict[str, ModelSpec] = DEFAULT_MODELS  # ESSAY_MODELS, as JSON
+    routing_enabled: bool = True  # draft on the fastest "fast" model, critique on a "strong" one
+    latency_ewma_alpha: float = 0.3  # weight of the newest call in the per-model latency average
+    routing_log: str | None = "tmp/model_routing.jsonl"  # routing decisions and call latencies
+    ollama_base_url: str = "http://localhost:11434"
+    ollama_max_concurrency: int = 1  # a local server runs one generation at a time
+    ollama_timeout: float = 600.0
+    memory_mode: str = "ephemeral"  # "off", "ephemeral" or "persistent"; can be set per run
+    memory_dir: str = "tmp/essay_memory"  # persistent mode only
+    memory_batch_size: int = 16  # memory items embedded per call in persistent mode
+    sse_max_streams: int = 200  # open event streams per server; more get a 503
+    sse_heartbeat_seconds: float = 15.0  # keep-alive comment interval on a quiet stream
+    sse_send_buffer: int = 64  # events queued per connection ahead of a slow client
+    sse_send_timeout: float = 60.0  # a client that takes no event for this long is dropped
+    stream_validation: bool = True  # stream drafts and stop as soon as a field is out of spec
+    stream_restarts: int = 1  # early stops per draft call before the rest is left to the repair prompts
+    abandon_after_seconds: float | None = 30.0  # cancel a job no client has followed for this long; None never does
+
+    class Config:
+        env_prefix = "ESSAY_"
+
+settings = Settings()
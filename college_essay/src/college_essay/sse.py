@@ -0,0 +1,141 @@
+import asyncio
+from logging import getLogger
+from typing import AsyncIterator, Callable
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from settings import settings
+
+logger = getLogger(__name__)
+
+HEADERS = {
+    "Cache-Control": "no-cache",
+    # Tell nginx-style proxies not to buffer the stream, or events arrive in bursts
+    "X-Accel-Buffering": "no",
+}
+KEEP_ALIVE = ": keep-alive\n\n"
+_END = object()
+
+
+class StreamSlot:
+    """One of the server's `max_streams` stream slots, held from reserve() until the stream ends."""
+
+    def __init__(self, streams: "SSEStreams"):
+        self.streams = streams
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.streams.open -= 1
+
+
+class SSEResponse(StreamingResponse):
+    """
+    A StreamingResponse that gives up on a client whose socket has not taken a message
+    for `send_timeout` seconds, and frees its stream slot however it ends.
+
+    A client that stops reading blocks the server's send() on the transport's
+    drain, inside the body iterator's yield, so the timeout has to be on the send.
+    """
+
+    def __init__(self, streams: "SSEStreams", slot: StreamSlot, content: AsyncIterator[str]):
+        super().__init__(content, media_type="text/event-stream", headers=HEADERS)
+        self.streams = streams
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        async def send_with_timeout(message):
+            await asyncio.wait_for(send(message), self.streams.send_timeout)
+
+        try:
+            await super().__call__(scope, receive, send_with_timeout)
+        except asyncio.TimeoutError:
+            self.streams.dropped += 1
+            logger.info(f"Dropped an SSE client that took nothing for {self.streams.send_timeout}s")
+        finally:
+            # Runs the stream's own cleanup (on_close) now, not whenever the generator is collected
+            await self.body_iterator.aclose()
+            self.slot.release()
+
+
+class SSEStreams:
+    """
+    Server-Sent Events responses with keep-alives, backpressure and a cap on open streams.
+
+    Each stream pulls its messages from the source into a queue of at most
+    `send_buffer` messages, so a client that reads slowly holds back the source
+    instead of growing memory. A client whose connection has not accepted a message
+    for `send_timeout` seconds is dropped; it can reconnect with Last-Event-ID. While
+    the source is quiet a keep-alive comment goes out every `heartbeat` seconds, so
+    proxies don't close the connection as idle. The stream ends when the client
+    disconnects, and `on_close` runs either way, e.g. to stop work nobody is
+    waiting for.
+    """
+
+    def __init__(self, max_streams: int = settings.sse_max_streams, heartbeat: float = settings.sse_heartbeat_seconds,
+                 send_buffer: int = settings.sse_send_buffer, send_timeout: float = settings.sse_send_timeout):
+        self.max_streams = max_streams
+        self.heartbeat = heartbeat
+        self.send_buffer = send_buffer
+        self.send_timeout = send_timeout
+        self.open = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def reserve(self) -> StreamSlot:
+        """
+        Take a stream slot, or raise 503 when all `max_streams` are taken; call before
+        starting any work. Pass the slot to response(), or release() it if no response follows.
+        """
+        if self.open >= self.max_streams:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many open streams, retry later",
+                                headers={"Retry-After": str(int(self.heartbeat))})
+        self.open += 1
+        return StreamSlot(self)
+
+    def response(self, request: Request, slot: StreamSlot, source: AsyncIterator[str],
+                 on_open: Callable[[], None] | None = None,
+                 on_close: Callable[[], None] | None = None) -> StreamingResponse:
+        """Stream the SSE messages of `source` to the client in the reserved slot."""
+        return SSEResponse(self, slot, self._stream(request, source, on_open, on_close))
+
+    async def _fill(self, source: AsyncIterator[str], queue: asyncio.Queue):
+        try:
+            async for message in source:
+                await queue.put(message)
+        except Exception:
+            logger.exception("SSE source failed; closing the stream")
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        await queue.put(_END)
+
+    async def _stream(self, request: Request, source: AsyncIterator[str], on_open, on_close):
+        queue = asyncio.Queue(maxsize=self.send_buffer)
+        filler = asyncio.create_task(self._fill(source, queue))
+        if on_open is not None:
+            on_open()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield KEEP_ALIVE
+                    continue
+                if message is _END:
+                    return
+                yield message
+        finally:
+            # Reached on the source's end, a disconnect, or a dropped client (SSEResponse closes the generator)
+            filler.cancel()
+            if on_close is not None:
+                on_close()
+
+    def stats(self) -> dict:
+        return {"open": self.open, "max_streams": self.max_streams, "rejected": self.rejected, "dropped": self.dropped}
@@ -0,0 +1,84 @@
+import re
+
+# A sentence ends at a run of terminators (optionally followed by closing quotes or
+# brackets) that is followed by whitespace or the end of the text. Decimals such as
+# "3.5" never match because the period is not followed by whitespace.
+SENTENCE_END = re.compile(r"[.!?]+[\"'’”)\]]*(?=\s|$)")
+WORD = re.compile(r"[^\W_]+(?:['’.-][^\W_]+)*")
+
+# Titles come before a name, so they never end a sentence
+TITLES = frozenset({"mr", "mrs", "ms", "dr", "prof", "mt", "st"})
+# These can end a sentence ("...moved to the U.S."), so they only hold one together when
+# the next word starts with a lowercase letter or a digit, as in "No. 1" or "Mar. 5"
+ABBREVIATIONS = frozenset({
+    "sr", "jr", "vs", "etc", "e.g", "i.e", "inc", "ltd", "co", "corp", "no", "fig", "approx",
+    "dept", "univ", "ave", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept",
+    "oct", "nov", "dec", "a.m", "p.m", "u.s", "u.k", "ph.d", "b.a", "b.s", "m.a", "m.s",
+})
+OPENERS = "(\"'“‘["
+INITIAL = re.compile(r"[A-Z]\.")
+# A capitalized word that does not end the sentence itself, e.g. "Kennedy" or "Kennedy,"
+NAME = re.compile(r"[A-Z][a-z'’-]+[,;:]?")
+
+
+def _word_before(text: str, end: int) -> tuple[str, int]:
+    start = end
+    while start > 0 and not text[start - 1].isspace():
+        start -= 1
+    return text[start:end].lstrip(OPENERS), start
+
+
+def _words_after(text: str, start: int, count: int) -> list[str]:
+    words = [w.lstrip(OPENERS) for w in text[start:start + 100].split()[:count]]
+    return words + [""] * (count - len(words))
+
+
+def _is_initial(text: str, word: str, start: int, next_start: int) -> bool:
+    """
+    A single letter before a name: "J. Smith", "John F. Kennedy", "J. R. R. Tolkien".
+    Not "I got an A.", "Plan A. Plan B." (the next word is followed by another letter
+    ending a sentence) or "I. Am. Here." (the next word ends a sentence itself).
+    """
+    following, after = _words_after(text, next_start, 2)
+    if following[:1].islower() or following[:1].isdigit():
+        return True
+    previous, _ = _word_before(text, start - 1) if start > 0 else ("", 0)
+    if not word.isupper() or not (not previous or previous[:1].isupper() or previous[-1:] in ".!?"):
+        return False
+    if INITIAL.fullmatch(following):
+        return True
+    return NAME.fullmatch(following) is not None and INITIAL.fullmatch(after) is None
+
+
+def _is_abbreviation(text: str, end: int, next_start: int) -> bool:
+    """Whether the period at `end` belongs to an abbreviation or an initial rather than ending a sentence."""
+    word, start = _word_before(text, end)
+    lowered = word.lower()
+    if lowered in TITLES:
+        return True
+    if len(word) == 1 and word.isalpha():
+        return _is_initial(text, word, start, next_start)
+    following = text[next_start:].lstrip().lstrip(OPENERS)[:1]
+    return lowered in ABBREVIATIONS and (following.islower() or following.isdigit())
+
+
+def count_sentences(text: str) -> int:
+    """Count sentences without materializing them, skipping abbreviations and decimals."""
+    count = 0
+    last_end = 0
+    length = len(text)
+    for match in SENTENCE_END.finditer(text):
+        start, end = match.span()
+        if end < length and text[start] == "." and end - start == 1 and _is_abbreviation(text, start, end):
+            continue
+        if text[last_end:start].strip():
+            count += 1
+        last_end = end
+    if text[last_end:].strip():
+        count += 1  # trailing sentence without a terminator
+    return count
+
+
+def count_words(text: str) -> int:
+    return sum(1 for _ in WORD.finditer(text))
+
@@ -1,10 +1,11 @@
-from PyPDF2 import PdfReader
 import os
-import docx2txt
+
+from tracing import traced
 
 
 class FileConverter:
     @staticmethod
+    @traced("file.convert")
     def convert_to_text(file_path: str) -> str:
         """Convert PDF or DOCX files to plain text."""
         file_extension = os.path.splitext(file_path)[1].lower()
@@ -22,6 +23,7 @@ class FileConverter:
     @staticmethod
     def _pdf_to_text(pdf_path: str) -> str:
         """Extract text from PDF file."""
+        from PyPDF2 import PdfReader
         reader = PdfReader(pdf_path)
         text = ""
         for page in reader.pages:
@@ -31,5 +33,6 @@ class FileConverter:
     @staticmethod
     def _docx_to_text(docx_path: str) -> str:
         """Extract text from DOCX file using docx2txt."""
+        import docx2txt
         text = docx2txt.process(docx_path)
         return text
\ No newline at end of file
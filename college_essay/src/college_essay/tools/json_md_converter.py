@@ -1,6 +1,7 @@
-import json
 from crewai_tools import tool
 
+from tools.json_stream import convert_file
+
 @tool
 def json_to_markdown(json_file: str, output_md: str) -> str:
     """
@@ -14,35 +15,8 @@ def json_to_markdown(json_file: str, output_md: str) -> str:
         str: Confirmation message with the output file path.
     """
     try:
-        with open(json_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        md_content = "# Converted JSON to Markdown\n\n"
-
-        def parse_json(data, indent=0):
-            """Recursively parses JSON data into Markdown format."""
-            md = ""
-            for key, value in data.items():
-                prefix = "#" * (indent + 2)  # Dynamic heading levels
-                if isinstance(value, dict):
-                    md += f"\n{prefix} {key}\n"
-                    md += parse_json(value, indent + 1)
-                elif isinstance(value, list):
-                    md += f"\n{prefix} {key}\n"
-                    for item in value:
-                        if isinstance(item, dict):
-                            md += parse_json(item, indent + 1)
-                        else:
-                            md += f"- {item}\n"
-                else:
-                    md += f"**{key}:** {value}\n\n"
-            return md
-
-        md_content += parse_json(data)
-
-        # Write to Markdown file
-        with open(output_md, "w", encoding="utf-8") as md_file:
-            md_file.write(md_content)
+        # Parsed and written incrementally, so memory stays flat however large the file is
+        convert_file(json_file, output_md)
 
         return f"✅ JSON converted to Markdown successfully: {output_md}"
 
@@ -0,0 +1,188 @@
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+NUMBER = re.compile(r"-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+# Read greedily first: a valid prefix like "2" of "2.5" could otherwise end at a chunk boundary
+NUMBER_CHARS = re.compile(r"[-+0-9.eE]+")
+LITERAL = re.compile(r"true|false|null")
+LITERALS = {"true": True, "false": False, "null": None}
+
+START_MAP, MAP_KEY, END_MAP, START_ARRAY, END_ARRAY, VALUE = range(6)
+# What the parser accepts next
+(EXPECT_VALUE, EXPECT_VALUE_OR_CLOSE, EXPECT_KEY, EXPECT_KEY_OR_CLOSE, EXPECT_COLON,
+ EXPECT_COMMA_OR_CLOSE, EXPECT_END) = range(7)
+
+
+class JsonTokenizer:
+    """
+    Incremental JSON parser over a text file object, read `chunk_size` characters at a time.
+
+    `events()` yields (event, value) pairs: START_MAP, MAP_KEY (the key), END_MAP,
+    START_ARRAY, END_ARRAY and VALUE (a str, True/False/None, or a number's source
+    text). Nesting is tracked on an explicit stack, so depth is not limited by recursion.
+    """
+
+    def __init__(self, fp, chunk_size: int = CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character, or "" at the end of input."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def _token(self, pattern: re.Pattern) -> str:
+        # A match that reaches the end of the buffer may continue in the next chunk
+        while True:
+            match = pattern.match(self.buf, self.pos)
+            if match is not None and (match.end() < len(self.buf) or self.eof):
+                break
+            if not self._more():
+                match = pattern.match(self.buf, self.pos)
+                break
+        if match is None:
+            raise ValueError(f"Invalid JSON near {self.buf[self.pos:self.pos + 20]!r}")
+        self.pos = match.end()
+        return match.group(0)
+
+    def _unexpected(self, c: str):
+        raise ValueError(f"Unexpected {c!r} in JSON near {self.buf[self.pos:self.pos + 20]!r}")
+
+    def events(self):
+        """
+        Yield the events of one JSON value, checking the grammar as json.load does: what
+        may come next (a key, a colon, a value, a comma or a closing bracket) is tracked
+        per open container, and anything after the root value is an error.
+        """
+        stack = []
+        expect = EXPECT_VALUE
+        while True:
+            c = self._peek()
+            if not c:
+                if expect != EXPECT_END:
+                    raise ValueError("Unexpected end of JSON")
+                return
+            if expect == EXPECT_END:
+                raise ValueError(f"Extra data after the JSON value: {self.buf[self.pos:self.pos + 20]!r}")
+            if c in "}]":
+                kind = "map" if c == "}" else "array"
+                closable = EXPECT_KEY_OR_CLOSE if kind == "map" else EXPECT_VALUE_OR_CLOSE
+                if not stack or stack[-1] != kind or expect not in (closable, EXPECT_COMMA_OR_CLOSE):
+                    self._unexpected(c)
+                self.pos += 1
+                stack.pop()
+                expect = EXPECT_COMMA_OR_CLOSE if stack else EXPECT_END
+                yield (END_MAP if kind == "map" else END_ARRAY), None
+            elif c == ",":
+                if expect != EXPECT_COMMA_OR_CLOSE:
+                    self._unexpected(c)
+                self.pos += 1
+                expect = EXPECT_KEY if stack[-1] == "map" else EXPECT_VALUE
+            elif c == ":":
+                if expect != EXPECT_COLON:
+                    self._unexpected(c)
+                self.pos += 1
+                expect = EXPECT_VALUE
+            elif c == '"' and expect in (EXPECT_KEY, EXPECT_KEY_OR_CLOSE):
+                token = self._token(STRING)
+                expect = EXPECT_COLON
+                yield MAP_KEY, json.loads(token) if "\\" in token else token[1:-1]
+            elif expect not in (EXPECT_VALUE, EXPECT_VALUE_OR_CLOSE):
+                self._unexpected(c)
+            elif c == "{":
+                self.pos += 1
+                stack.append("map")
+                expect = EXPECT_KEY_OR_CLOSE
+                yield START_MAP, None
+            elif c == "[":
+                self.pos += 1
+                stack.append("array")
+                expect = EXPECT_VALUE_OR_CLOSE
+                yield START_ARRAY, None
+            else:
+                if c == '"':
+                    token = self._token(STRING)
+                    value = json.loads(token) if "\\" in token else token[1:-1]
+                elif c == "-" or c.isdigit():
+                    value = self._token(NUMBER_CHARS)
+                    if NUMBER.fullmatch(value) is None:
+                        raise ValueError(f"Invalid number {value!r} in JSON")
+                elif c in "tfn":
+                    value = LITERALS[self._token(LITERAL)]
+                else:
+                    self._unexpected(c)
+                expect = EXPECT_COMMA_OR_CLOSE if stack else EXPECT_END
+                yield VALUE, value
+
+
+def _heading(indent: int) -> str:
+    # Markdown stops at six heading levels; deeper objects reuse the last one
+    return "#" * min(indent + 2, 6)
+
+
+def write_markdown(fp, out, chunk_size: int = CHUNK_SIZE, title: str = "Converted JSON to Markdown"):
+    """
+    Convert the JSON read from `fp` to markdown written to `out`, one event at a time.
+
+    Object keys become headings (one level deeper per nesting level) when their value
+    is an object or array, and `**key:** value` lines otherwise. Array items are
+    bullets, indented for nested arrays. Top-level arrays and scalars are written too.
+    """
+    out.write(f"# {title}\n\n")
+    # One frame per open container: [kind, indent for child objects, pending key, bullet depth]
+    frames = []
+    for event, value in JsonTokenizer(fp, chunk_size).events():
+        frame = frames[-1] if frames else None
+        if event == MAP_KEY:
+            frame[2] = value
+        elif event == VALUE:
+            text = value if isinstance(value, str) else str(value)
+            if frame is None:
+                out.write(f"{text}\n")
+            elif frame[0] == "map":
+                out.write(f"**{frame[2]}:** {text}\n\n")
+            else:
+                out.write(f"{'  ' * frame[3]}- {text}\n")
+        elif event == START_MAP or event == START_ARRAY:
+            kind = "map" if event == START_MAP else "array"
+            if frame is None:
+                frames.append([kind, 0, None, 0])
+            elif frame[0] == "map":
+                out.write(f"\n{_heading(frame[1])} {frame[2]}\n")
+                frames.append([kind, frame[1] + 1, None, 0])
+            elif kind == "map":
+                frames.append([kind, frame[1], None, 0])
+            else:
+                frames.append([kind, frame[1], None, frame[3] + 1])
+        else:
+            frames.pop()
+
+
+def convert_file(json_file: str, output_md: str, chunk_size: int = CHUNK_SIZE):
+    """Stream `json_file` to `output_md` through a large write buffer."""
+    with open(json_file, "r", encoding="utf-8") as fp, \
+            open(output_md, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as out:
+        write_markdown(fp, out, chunk_size)
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+try:
+    # Under the bakasura gateway essay spans join the gateway's request traces and exporters
+    from bakasura_flow.tracing import instrument_crewai, record_span, span, traced
+except ImportError:
+    # Standalone, without bakasura_flow: tracing is a no-op
+
+    @contextmanager
+    def span(name, **attributes):
+        yield None
+
+    def traced(name=None):
+        return lambda fn: fn
+
+    def record_span(name, start_ns, end_ns, parent=None, **attributes):
+        return None
+
+    def instrument_crewai():
+        pass